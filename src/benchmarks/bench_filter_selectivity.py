@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+过滤选择度基准测试
+比较三种 category 字段布局下，带过滤条件的向量搜索和标量查询的延迟随选择度的变化:
+- plain:          普通 VARCHAR 字段，无标量索引
+- scalar_index:   category 上建 INVERTED 标量索引
+- partition_key:  category 作为 Partition Key，并建 INVERTED 标量索引
+
+每个 category 取值覆盖的数据比例 (选择度) 由 --selectivities 指定，剩余数据归入 "other"。
+
+用法:
+    python src/benchmarks/bench_filter_selectivity.py --rows 100000 --queries 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from pymilvus import FieldSchema, CollectionSchema, DataType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from milvus_connection import get_client, get_config, close_pool
+from milvus_bulk import INSERT_FIRST, bulk_load
+from milvus_wait import wait_for_dropped, wait_for_loaded
+
+COLLECTION_NAME = "bench_filter_selectivity"
+INDEX_NAME = "bench_filter_vector_index"
+LAYOUTS = ("plain", "scalar_index", "partition_key")
+NUM_PARTITIONS = 16
+
+
+def build_schema(dim, layout):
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=64,
+                    is_partition_key=(layout == "partition_key")),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    return CollectionSchema(fields=fields, description="filter selectivity benchmark")
+
+
+def build_index_params(client, layout):
+    index_params = client.prepare_index_params()
+    index_params.add_index(
+        field_name="embedding",
+        index_type="HNSW",
+        metric_type="COSINE",
+        params={"M": 16, "efConstruction": 200},
+        index_name=INDEX_NAME,
+    )
+    if layout != "plain":
+        index_params.add_index(field_name="category", index_type="INVERTED", index_name="category_index")
+    return index_params
+
+
+def assign_categories(num_rows, selectivities, rng):
+    """按选择度给每行分配 category，返回打乱顺序后的 category 列表"""
+    categories = []
+    for fraction in selectivities:
+        categories.extend([f"sel_{fraction}"] * max(1, int(num_rows * fraction)))
+    categories.extend(["other"] * (num_rows - len(categories)))
+    categories = np.array(categories[:num_rows])
+    rng.shuffle(categories)
+    return categories
+
+
+def synthetic_rows(categories, dim, rng):
+    chunk = 10000
+    for start in range(0, len(categories), chunk):
+        block = categories[start:start + chunk]
+        vectors = rng.standard_normal((len(block), dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for category, vector in zip(block, vectors):
+            yield {"category": str(category), "embedding": vector}
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def measure(func, repeats):
+    """返回 (p50, p95) 毫秒"""
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), percentile(latencies, 0.95)
+
+
+def run_layout(client, layout, args, selectivities):
+    rng = np.random.default_rng(0)
+    categories = assign_categories(args.rows, selectivities, rng)
+    bulk_load(
+        client, COLLECTION_NAME, build_schema(args.dim, layout), build_index_params(client, layout), INDEX_NAME,
+        synthetic_rows(categories, args.dim, rng), args.dim, num_rows=args.rows, order=INSERT_FIRST,
+        num_partitions=NUM_PARTITIONS if layout == "partition_key" else None,
+    )
+    client.load_collection(collection_name=COLLECTION_NAME)
+    wait_for_loaded(client, COLLECTION_NAME)
+
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    results = []
+    for fraction in selectivities:
+        expr = f'category == "sel_{fraction}"'
+        query_iter = iter(queries)
+        search_p50, search_p95 = measure(lambda: client.search(
+            collection_name=COLLECTION_NAME, data=[next(query_iter).tolist()], filter=expr, limit=10,
+            anns_field="embedding", search_params={"metric_type": "COSINE", "params": {"ef": 64}},
+        ), args.queries)
+        query_p50, query_p95 = measure(lambda: client.query(
+            collection_name=COLLECTION_NAME, filter=expr, output_fields=["count(*)"],
+        ), args.queries)
+        results.append((layout, fraction, search_p50, search_p95, query_p50, query_p95))
+
+    client.drop_collection(collection_name=COLLECTION_NAME)
+    wait_for_dropped(client, COLLECTION_NAME)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="数据行数")
+    parser.add_argument("--dim", type=int, default=128, help="向量维度")
+    parser.add_argument("--queries", type=int, default=50, help="每个选择度的查询次数")
+    parser.add_argument("--selectivities", default="0.5,0.1,0.01,0.001", help="逗号分隔的选择度列表")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="逗号分隔的布局列表")
+    parser.add_argument("--output", help="把 Markdown 结果额外写入该文件")
+    args = parser.parse_args()
+
+    selectivities = [float(s) for s in args.selectivities.split(",")]
+    client = get_client()
+    print(f"Milvus: {get_config().uri}")
+    lines = [
+        "| layout | selectivity | search p50 (ms) | search p95 (ms) | query p50 (ms) | query p95 (ms) |",
+        "|---|---:|---:|---:|---:|---:|",
+    ]
+    try:
+        for layout in args.layouts.split(","):
+            for row in run_layout(client, layout, args, selectivities):
+                line = "| {} | {} | {:.2f} | {:.2f} | {:.2f} | {:.2f} |".format(*row)
+                print(line)
+                lines.append(line)
+    finally:
+        close_pool()
+
+    table = "\n".join(lines)
+    print("\n" + table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
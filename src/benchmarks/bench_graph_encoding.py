@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸图响应编码基准测试
+在合成的人脸图 (默认 1k 与 10k 节点，128 维向量) 上比较各种响应编码的序列化耗时和响应大小:
+- pydantic: 原实现，为每个节点构造 FaceNode 模型，经 jsonable_encoder + json 序列化
+- json / orjson / msgpack × 向量编码 none / list / base64
+
+图像数据默认为空 (--image-bytes 0)，只比较向量和边的开销；实际响应中每个节点还包含 Base64 图像。
+
+用法:
+    python src/benchmarks/bench_graph_encoding.py --nodes 1000,10000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "face"))
+import graph_encoding
+from graph_encoding import (
+    VECTORS_NONE, VECTORS_LIST, VECTORS_BASE64, JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE,
+    build_graph_payload, serialize,
+)
+
+DIM = 128
+
+
+class LegacyFaceNode(BaseModel):
+    """原接口的节点模型 (vector 为浮点数列表)，作为对照"""
+    id: str
+    name: str
+    image_path: str
+    image_data: str
+    vector: List[float]
+
+
+class LegacyFaceEdge(BaseModel):
+    source: str
+    target: str
+    similarity: float
+
+
+class LegacyFaceGraph(BaseModel):
+    nodes: List[LegacyFaceNode]
+    edges: List[LegacyFaceEdge]
+
+
+def synthetic_graph(num_nodes, edges_per_node, image_bytes, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((num_nodes, DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = np.arange(1, num_nodes + 1)
+    names = [f"person_{i}" for i in range(num_nodes)]
+    paths = [f"image/person_{i}.jpg" for i in range(num_nodes)]
+    image_data = ["A" * image_bytes] * num_nodes
+    targets = rng.integers(0, num_nodes, size=(num_nodes, edges_per_node))
+    edges = [(ids[i], ids[j], float(rng.random())) for i in range(num_nodes) for j in targets[i]]
+    return ids, names, paths, image_data, vectors, edges
+
+
+def encode_legacy(ids, names, paths, image_data, vectors, edges):
+    nodes = [
+        LegacyFaceNode(id=str(face_id), name=names[i], image_path=paths[i], image_data=image_data[i],
+                       vector=vectors[i].tolist())
+        for i, face_id in enumerate(ids)
+    ]
+    graph = LegacyFaceGraph(
+        nodes=nodes,
+        edges=[LegacyFaceEdge(source=str(s), target=str(t), similarity=sim) for s, t, sim in edges],
+    )
+    return json.dumps(jsonable_encoder(graph)).encode("utf-8")
+
+
+def encode_fast(graph, vector_encoding, fmt):
+    binary = fmt == "msgpack"
+    payload = build_graph_payload(*graph, vector_encoding=vector_encoding, binary=binary)
+    if fmt == "json":
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return serialize(payload, MSGPACK_MEDIA_TYPE if binary else JSON_MEDIA_TYPE)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", default="1000,10000", help="逗号分隔的节点数列表")
+    parser.add_argument("--edges-per-node", type=int, default=10, help="每个节点的边数")
+    parser.add_argument("--image-bytes", type=int, default=0, help="每个节点的 Base64 图像大小 (字节)")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快一次")
+    parser.add_argument("--output", help="把 Markdown 结果额外写入该文件")
+    args = parser.parse_args()
+
+    formats = ["json"]
+    if graph_encoding.orjson is not None:
+        formats.append("orjson")
+    if graph_encoding.msgpack is not None:
+        formats.append("msgpack")
+
+    lines = [
+        "| nodes | edges | encoder | vectors | serialize (ms) | size (KB) |",
+        "|---:|---:|---|---|---:|---:|",
+    ]
+    for num_nodes in [int(n) for n in args.nodes.split(",")]:
+        graph = synthetic_graph(num_nodes, args.edges_per_node, args.image_bytes)
+        num_edges = len(graph[5])
+        cases = [("pydantic", VECTORS_LIST, lambda: encode_legacy(*graph))]
+        for fmt in formats:
+            for vector_encoding in (VECTORS_LIST, VECTORS_BASE64, VECTORS_NONE):
+                cases.append((fmt, vector_encoding,
+                              lambda fmt=fmt, ve=vector_encoding: encode_fast(graph, ve, fmt)))
+        for encoder, vector_encoding, func in cases:
+            ms, size = best_of(func, args.repeat)
+            line = f"| {num_nodes} | {num_edges} | {encoder} | {vector_encoding} | {ms:.1f} | {size / 1024:.0f} |"
+            print(line)
+            lines.append(line)
+
+    table = "\n".join(lines)
+    print("\n" + table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+两阶段身份搜索基准测试
+比较直接搜索全部照片 (flat) 与先按身份中心向量选出候选人、再只在候选人照片中搜索 (two_stage) 的
+延迟和召回率。合成数据每个人一个随机中心，每张照片为中心加噪声；name 为 Partition Key，
+与 face_vectorization.py 的人脸集合相同。
+
+recall@k: 结果与精确暴力搜索 top-k 的重合比例；top1 正确率: 第一个结果属于查询的真实人物的比例。
+
+用法:
+    python src/benchmarks/bench_identity_search.py --people 2000 --photos-per-person 50 --shortlist 5,20,50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from pymilvus import FieldSchema, CollectionSchema, DataType
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "face"))
+from face_config import NAME_FIELD_NAME, EMBEDDING_FIELD_NAME, NUM_PARTITIONS
+from face_identity import replace_identities, two_stage_search
+from milvus_connection import get_client, get_config, close_pool
+from milvus_cache import SearchCache
+from milvus_reader import read_all
+from milvus_bulk import INSERT_FIRST, bulk_load
+from milvus_wait import wait_for_dropped, wait_for_loaded
+
+COLLECTION_NAME = "bench_identity_faces"
+IDENTITY_COLLECTION_NAME = "bench_identity_centroids"
+INDEX_NAME = "bench_identity_vector_index"
+
+
+def build_schema(dim):
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name=NAME_FIELD_NAME, dtype=DataType.VARCHAR, max_length=64, is_partition_key=True),
+        FieldSchema(name=EMBEDDING_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    return CollectionSchema(fields=fields, description="identity search benchmark")
+
+
+def build_index_params(client):
+    index_params = client.prepare_index_params()
+    index_params.add_index(
+        field_name=EMBEDDING_FIELD_NAME,
+        index_type="HNSW",
+        metric_type="COSINE",
+        params={"M": 16, "efConstruction": 200},
+        index_name=INDEX_NAME,
+    )
+    # 与人脸集合相同，name 上建 INVERTED 标量索引
+    index_params.add_index(field_name=NAME_FIELD_NAME, index_type="INVERTED", index_name="bench_identity_name_index")
+    return index_params
+
+
+def synthetic_gallery(people, photos_per_person, dim, noise, rng):
+    """返回 (names, vectors, centers)，向量已 L2 归一化"""
+    centers = rng.standard_normal((people, dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    person = np.repeat(np.arange(people), photos_per_person)
+    vectors = centers[person] + noise * rng.standard_normal((len(person), dim), dtype=np.float32) / np.sqrt(dim)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return [f"person_{p}" for p in person], vectors, centers
+
+
+def measure(func, queries):
+    """对每个查询向量调用一次 func，返回 (结果列表, p50, p95 毫秒)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(func(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    ordered = sorted(latencies)
+    return results, statistics.median(latencies), ordered[int(round(0.95 * (len(ordered) - 1)))]
+
+
+def score(results, truth, query_people, names, top_k):
+    """返回 (recall@k, top1 正确率)"""
+    recall = np.mean([len({hit["id"] for hit in hits[:top_k]} & set(expected)) / top_k
+                      for hits, expected in zip(results, truth)])
+    top1 = np.mean([bool(hits) and hits[0]["entity"][NAME_FIELD_NAME] == f"person_{p}"
+                    for hits, p in zip(results, query_people)])
+    return recall, top1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--people", type=int, default=2000, help="人数")
+    parser.add_argument("--photos-per-person", type=int, default=50, help="每人的照片数量")
+    parser.add_argument("--dim", type=int, default=128, help="向量维度")
+    parser.add_argument("--noise", type=float, default=0.8, help="照片相对人物中心的噪声 (向量范数的倍数)")
+    parser.add_argument("--queries", type=int, default=200, help="查询次数")
+    parser.add_argument("--top-k", type=int, default=10, help="每次返回的照片数量")
+    parser.add_argument("--shortlist", default="5,20,50", help="逗号分隔的候选人数量列表")
+    parser.add_argument("--output", help="把 Markdown 结果额外写入该文件")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    names, vectors, centers = synthetic_gallery(args.people, args.photos_per_person, args.dim, args.noise, rng)
+    client = get_client()
+    print(f"Milvus: {get_config().uri}，{len(names)} 张照片，{args.people} 人")
+    # 不使用搜索结果缓存，每次查询都访问服务端
+    cache = SearchCache(max_entries=0)
+    try:
+        bulk_load(
+            client, COLLECTION_NAME, build_schema(args.dim), build_index_params(client), INDEX_NAME,
+            ({NAME_FIELD_NAME: name, EMBEDDING_FIELD_NAME: vector} for name, vector in zip(names, vectors)),
+            args.dim, num_rows=len(names), order=INSERT_FIRST, num_partitions=NUM_PARTITIONS,
+        )
+        client.load_collection(collection_name=COLLECTION_NAME)
+        wait_for_loaded(client, COLLECTION_NAME)
+        start = time.perf_counter()
+        replace_identities(client, names, vectors, collection_name=IDENTITY_COLLECTION_NAME)
+        print(f"身份索引: {time.perf_counter() - start:.2f}s")
+
+        # 查询为同一批人物的新照片
+        query_people = rng.integers(args.people, size=args.queries)
+        queries = centers[query_people] + args.noise * rng.standard_normal(
+            (args.queries, args.dim), dtype=np.float32) / np.sqrt(args.dim)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        # 主键由 auto_id 生成，先读出全部主键与向量计算精确结果
+        stored = read_all(client, COLLECTION_NAME, vector_field=EMBEDDING_FIELD_NAME, id_field="id")
+        truth = [stored.ids[np.argsort(-(stored.vectors @ q))[:args.top_k]].tolist() for q in queries]
+
+        search_params = {"metric_type": "COSINE", "params": {"ef": max(128, args.top_k)}}
+        lines = [
+            "| method | shortlist | p50 (ms) | p95 (ms) | recall@{} | top1 正确率 |".format(args.top_k),
+            "|---|---:|---:|---:|---:|---:|",
+        ]
+        results, p50, p95 = measure(lambda q: client.search(
+            collection_name=COLLECTION_NAME, data=[q.tolist()], limit=args.top_k, anns_field=EMBEDDING_FIELD_NAME,
+            search_params=search_params, output_fields=[NAME_FIELD_NAME])[0], queries)
+        recall, top1 = score(results, truth, query_people, names, args.top_k)
+        lines.append(f"| flat | - | {p50:.2f} | {p95:.2f} | {recall:.3f} | {top1:.3f} |")
+        print(lines[-1])
+        for shortlist in [int(s) for s in args.shortlist.split(",")]:
+            results, p50, p95 = measure(lambda q: two_stage_search(
+                client, [q.tolist()], limit=args.top_k, shortlist=shortlist, search_params=search_params,
+                output_fields=[NAME_FIELD_NAME], collection_name=COLLECTION_NAME,
+                identity_collection=IDENTITY_COLLECTION_NAME, cache=cache)[0], queries)
+            recall, top1 = score(results, truth, query_people, names, args.top_k)
+            lines.append(f"| two_stage | {shortlist} | {p50:.2f} | {p95:.2f} | {recall:.3f} | {top1:.3f} |")
+            print(lines[-1])
+    finally:
+        for name in (COLLECTION_NAME, IDENTITY_COLLECTION_NAME):
+            if client.has_collection(name):
+                client.drop_collection(collection_name=name)
+                wait_for_dropped(client, name)
+        close_pool()
+
+    table = "\n".join(lines)
+    print("\n" + table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
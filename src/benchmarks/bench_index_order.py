@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+索引构建顺序基准测试
+在合成数据 (默认 128 维与 1024 维) 上比较 index_first 与 insert_first 两种顺序的
+创建、插入、flush、索引构建 (已索引行数达到插入行数) 耗时，以及之后加载并完成第一次搜索的耗时
+(部署推迟构建索引时会体现在这一列)，并输出 Markdown 表格。
+在目标服务上出现交叉点时，用 MILVUS_BULK_INDEX_FIRST_MAX_ELEMENTS 设置 milvus_bulk 的阈值。
+
+用法:
+    python src/benchmarks/bench_index_order.py --rows 10000,100000 --dims 128,1024
+    python src/benchmarks/bench_index_order.py --output index_order.md
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from pymilvus import FieldSchema, CollectionSchema, DataType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from milvus_connection import get_client, get_config, close_pool
+from milvus_bulk import INDEX_FIRST, INSERT_FIRST, bulk_load, choose_build_order
+from milvus_wait import wait_for_dropped, wait_for_loaded
+
+COLLECTION_NAME = "bench_index_order"
+INDEX_NAME = "bench_index_order_index"
+
+
+def build_schema(dim):
+    fields = [
+        FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
+    ]
+    return CollectionSchema(fields=fields, description="index order benchmark")
+
+
+def build_index_params(client):
+    index_params = client.prepare_index_params()
+    index_params.add_index(
+        field_name="embedding",
+        index_type="HNSW",
+        metric_type="COSINE",
+        params={"M": 16, "efConstruction": 200},
+        index_name=INDEX_NAME,
+    )
+    return index_params
+
+
+def synthetic_rows(num_rows, dim, seed):
+    """生成 L2 归一化的随机向量，逐行产出，避免一次性构造全部 Python 列表"""
+    rng = np.random.default_rng(seed)
+    chunk = 10000
+    for start in range(0, num_rows, chunk):
+        vectors = rng.standard_normal((min(chunk, num_rows - start), dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        for vector in vectors:
+            yield {"embedding": vector}
+
+
+def first_search_seconds(client, dim):
+    """加载集合并完成第一次搜索的耗时"""
+    start = time.perf_counter()
+    client.load_collection(collection_name=COLLECTION_NAME)
+    wait_for_loaded(client, COLLECTION_NAME)
+    client.search(collection_name=COLLECTION_NAME, data=[[1.0] * dim], anns_field="embedding", limit=10,
+                  search_params={"metric_type": "COSINE", "params": {"ef": 64}})
+    return time.perf_counter() - start
+
+
+def run_case(client, num_rows, dim, order, seed):
+    report = bulk_load(
+        client, COLLECTION_NAME, build_schema(dim), build_index_params(client), INDEX_NAME,
+        synthetic_rows(num_rows, dim, seed), dim, num_rows=num_rows, order=order,
+    )
+    ready_seconds = first_search_seconds(client, dim)
+    client.drop_collection(collection_name=COLLECTION_NAME)
+    wait_for_dropped(client, COLLECTION_NAME)
+    return report, ready_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000", help="逗号分隔的行数列表")
+    parser.add_argument("--dims", default="128,1024", help="逗号分隔的向量维度列表")
+    parser.add_argument("--repeat", type=int, default=1, help="每个组合重复次数，取最快一次")
+    parser.add_argument("--output", help="把 Markdown 结果额外写入该文件")
+    args = parser.parse_args()
+
+    client = get_client()
+    print(f"Milvus: {get_config().uri}")
+    lines = [
+        "| dim | rows | order | create (s) | insert (s) | flush (s) | index (s) | total (s) | load+search (s) | auto 选择 |",
+        "|---:|---:|---|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    try:
+        for dim in [int(d) for d in args.dims.split(",")]:
+            for num_rows in [int(r) for r in args.rows.split(",")]:
+                for order in (INDEX_FIRST, INSERT_FIRST):
+                    runs = [run_case(client, num_rows, dim, order, seed) for seed in range(args.repeat)]
+                    best, ready = min(runs, key=lambda run: run[0].total_seconds + run[1])
+                    line = (f"| {dim} | {num_rows} | {order} | {best.create_seconds:.2f} | "
+                            f"{best.insert_seconds:.2f} | {best.flush_seconds:.2f} | {best.index_seconds:.2f} | "
+                            f"{best.total_seconds:.2f} | {ready:.2f} | {choose_build_order(num_rows, dim)} |")
+                    print(line)
+                    lines.append(line)
+    finally:
+        close_pool()
+
+    table = "\n".join(lines)
+    print("\n" + table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+进程内的 MilvusClient 替身
+数据保存在 NumPy 矩阵中，实现人脸 API 用到的接口 (describe_collection、load_collection、get_load_state、
+get_collection_stats、query_iterator、query、get、search)，用于在没有 Milvus 服务的机器上做负载测试。
+
+过滤表达式只支持与 Python 语法相近的子集: 比较、and / or / not、in [...]、is null / is not null，
+例如 face_config.REPRESENTATIVES_FILTER。搜索为精确的暴力搜索 (COSINE / IP / L2)，支持 offset 和范围搜索 (radius / range_filter)。
+"""
+
+import re
+import time
+
+import numpy as np
+from pymilvus.client.types import LoadState
+
+DIM = 128
+
+
+def _compile_filter(expr):
+    """把过滤表达式转换为可以按行求值的 Python 代码，空表达式返回 None"""
+    if not expr or not expr.strip():
+        return None
+    python = re.sub(r"\bis\s+not\s+null\b", "is not None", expr, flags=re.IGNORECASE)
+    python = re.sub(r"\bis\s+null\b", "is None", python, flags=re.IGNORECASE)
+    python = python.replace("&&", " and ").replace("||", " or ")
+    python = re.sub(r"\b(AND|OR|NOT)\b", lambda m: m.group(1).lower(), python)
+    try:
+        return compile(python, "<filter>", "eval")
+    except SyntaxError as e:
+        raise NotImplementedError(f"FakeMilvusClient 不支持的过滤表达式: {expr}") from e
+
+
+class _FakeCollection:
+    def __init__(self, rows, id_field, vector_field, dim):
+        self.id_field = id_field
+        self.vector_field = vector_field
+        self.dim = dim
+        self.ids = np.array([row[id_field] for row in rows], dtype=np.int64)
+        self.vectors = np.array([row[vector_field] for row in rows], dtype=np.float32).reshape(-1, dim)
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        self.unit_vectors = self.vectors / np.where(norms == 0, 1, norms)
+        self.scalar_fields = [name for name in (rows[0] if rows else {}) if name not in (id_field, vector_field)]
+        self.columns = {name: [row.get(name) for row in rows] for name in self.scalar_fields}
+        self.row_of = {face_id: i for i, face_id in enumerate(self.ids.tolist())}
+        self.loaded = False
+        self.properties = {}
+
+    def row(self, i, output_fields, strict_float32=False):
+        entity = {self.id_field: int(self.ids[i])}
+        for name in output_fields or []:
+            if name == self.vector_field:
+                entity[name] = self.vectors[i] if strict_float32 else self.vectors[i].tolist()
+            elif name in self.columns:
+                entity[name] = self.columns[name][i]
+        return entity
+
+    def matching_rows(self, expr):
+        code = _compile_filter(expr)
+        if code is None:
+            return np.arange(len(self.ids))
+        matches = []
+        for i in range(len(self.ids)):
+            namespace = {name: values[i] for name, values in self.columns.items()}
+            namespace[self.id_field] = int(self.ids[i])
+            if eval(code, {"__builtins__": {}}, namespace):
+                matches.append(i)
+        return np.array(matches, dtype=np.int64)
+
+
+class _FakeQueryIterator:
+    def __init__(self, collection, rows, batch_size, output_fields):
+        self.collection = collection
+        self.rows = rows
+        self.batch_size = batch_size
+        self.output_fields = output_fields
+        self.offset = 0
+
+    def next(self):
+        batch = self.rows[self.offset:self.offset + self.batch_size]
+        self.offset += len(batch)
+        return [self.collection.row(i, self.output_fields) for i in batch]
+
+    def close(self):
+        pass
+
+
+class FakeMilvusClient:
+    """
+    MilvusClient 的进程内替身
+
+    参数:
+        latency: 每次调用额外等待的秒数，模拟与 Milvus 服务之间的网络往返 (同步阻塞，与真实客户端一致)
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._collections = {}
+
+    def add_collection(self, collection_name, rows, id_field="id", vector_field="embedding", dim=DIM):
+        """创建集合并写入 rows (每行一个 dict，需要包含主键和向量字段)"""
+        self._collections[collection_name] = _FakeCollection(rows, id_field, vector_field, dim)
+
+    def _get(self, collection_name):
+        if self.latency:
+            time.sleep(self.latency)
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            raise ValueError(f"collection not found: {collection_name}")
+        return collection
+
+    def has_collection(self, collection_name, **kwargs):
+        return collection_name in self._collections
+
+    def list_collections(self, **kwargs):
+        return list(self._collections)
+
+    def describe_collection(self, collection_name, **kwargs):
+        collection = self._get(collection_name)
+        fields = [{"name": collection.id_field, "is_primary": True},
+                  {"name": collection.vector_field, "params": {"dim": collection.dim}}]
+        fields += [{"name": name} for name in collection.scalar_fields]
+        return {"collection_name": collection_name, "fields": fields, "properties": dict(collection.properties)}
+
+    def get_collection_stats(self, collection_name, **kwargs):
+        return {"row_count": len(self._get(collection_name).ids)}
+
+    def alter_collection_properties(self, collection_name, properties, **kwargs):
+        self._get(collection_name).properties.update(properties)
+
+    def load_collection(self, collection_name, **kwargs):
+        self._get(collection_name).loaded = True
+
+    def release_collection(self, collection_name, **kwargs):
+        self._get(collection_name).loaded = False
+
+    def get_load_state(self, collection_name, **kwargs):
+        collection = self._collections.get(collection_name)
+        if collection is None:
+            return {"state": LoadState.NotExist}
+        return {"state": LoadState.Loaded if collection.loaded else LoadState.NotLoad}
+
+    def query_iterator(self, collection_name, batch_size=1000, limit=-1, filter="", output_fields=None, **kwargs):
+        collection = self._get(collection_name)
+        rows = collection.matching_rows(filter)
+        if limit is not None and limit >= 0:
+            rows = rows[:limit]
+        return _FakeQueryIterator(collection, rows, batch_size, output_fields)
+
+    def query(self, collection_name, filter="", output_fields=None, limit=None, ids=None, **kwargs):
+        collection = self._get(collection_name)
+        if ids is not None:
+            rows = np.array([collection.row_of[i] for i in ids if i in collection.row_of], dtype=np.int64)
+        else:
+            rows = collection.matching_rows(filter)
+        if output_fields == ["count(*)"]:
+            return [{"count(*)": len(rows)}]
+        if limit is not None:
+            # 与 iterator 模式的 query 一致: 带 limit 时返回主键最小的 limit 行
+            rows = rows[np.argsort(collection.ids[rows], kind="stable")][:limit]
+        return [collection.row(i, output_fields) for i in rows]
+
+    def get(self, collection_name, ids, output_fields=None, strict_float32=False, **kwargs):
+        collection = self._get(collection_name)
+        ids = ids if isinstance(ids, list) else [ids]
+        return [collection.row(collection.row_of[i], output_fields, strict_float32)
+                for i in ids if i in collection.row_of]
+
+    def search(self, collection_name, data, anns_field=None, search_params=None, limit=10, filter="",
+               output_fields=None, offset=0, **kwargs):
+        collection = self._get(collection_name)
+        search_params = search_params or kwargs.get("param") or {}
+        metric = search_params.get("metric_type", "COSINE").upper()
+        radius = search_params.get("params", {}).get("radius")
+        range_filter = search_params.get("params", {}).get("range_filter")
+        candidates = collection.matching_rows(filter)
+        queries = np.asarray(data, dtype=np.float32).reshape(-1, collection.dim)
+        if metric == "COSINE":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            scores = (queries / np.where(norms == 0, 1, norms)) @ collection.unit_vectors[candidates].T
+        elif metric == "IP":
+            scores = queries @ collection.vectors[candidates].T
+        else:
+            # L2: 距离越小越相似，按负距离排序
+            diff = queries[:, None, :] - collection.vectors[candidates][None, :, :]
+            scores = -np.square(diff).sum(axis=2)
+
+        # 范围搜索: 与 Milvus 相同，相似度 (L2 为负距离) 在 (radius, range_filter] 之内
+        in_range = np.ones_like(scores, dtype=bool)
+        if radius is not None:
+            in_range &= scores > (radius if metric != "L2" else -radius)
+        if range_filter is not None:
+            in_range &= scores <= (range_filter if metric != "L2" else -range_filter)
+
+        results = []
+        k = min(offset + limit, len(candidates))
+        for row_scores, row_in_range in zip(scores, in_range):
+            top = np.argpartition(-row_scores, k - 1)[:k] if k else np.array([], dtype=np.int64)
+            if radius is not None or range_filter is not None:
+                top = np.flatnonzero(row_in_range)
+            top = top[np.argsort(-row_scores[top], kind="stable")][offset:offset + limit]
+            hits = []
+            for j in top.tolist():
+                i = int(candidates[j])
+                distance = float(row_scores[j]) if metric != "L2" else float(-row_scores[j])
+                entity = collection.row(i, output_fields)
+                entity.pop(collection.id_field)
+                hits.append({"id": int(collection.ids[i]), "distance": distance, "entity": entity})
+            results.append(hits)
+        return results
+
+    def close(self):
+        pass
+
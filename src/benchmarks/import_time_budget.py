@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+API 启动导入耗时检查
+在新的解释器中用 python -X importtime 导入目标模块，输出累计耗时最高的依赖，
+并检查:
+- 总导入耗时不超过预算 (--budget-ms)
+- 没有导入只在人脸编码时才需要的重量级模块 (cv2、face_recognition、dlib 等)
+任一检查失败时以非零状态退出，可以放在 CI 或部署前执行。
+
+用法:
+    python src/benchmarks/import_time_budget.py
+    python src/benchmarks/import_time_budget.py --module main --budget-ms 2000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+FACE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "face")
+
+# API 启动时导入 face_api 的预算 (毫秒)。
+# 实测值见 benchmarks/results/import_time_face_api.md，预算在实测值基础上留出余量
+DEFAULT_BUDGET_MS = 1500
+FORBIDDEN_MODULES = ("cv2", "face_recognition", "dlib", "tqdm")
+
+
+def measure(module, cwd=FACE_DIR):
+    """
+    在子进程中导入模块并解析 -X importtime 输出
+
+    返回:
+        (records, loaded): records 为 [(模块名, 自身耗时us, 累计耗时us, 嵌套层级)]，
+        loaded 为导入后 sys.modules 中的全部模块名
+    """
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, capture_output=True, text=True, check=True,
+    )
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # 名称前有一个分隔空格，之后每层嵌套缩进两个空格
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        records.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return records, set(result.stdout.split())
+
+
+def module_tree(records, module):
+    """
+    返回目标模块本身的记录及其直接依赖 (嵌套层级 1)
+    importtime 按导入完成的顺序输出，目标模块的依赖紧挨在它前面
+    """
+    index = max(i for i, r in enumerate(records) if r[0] == module and r[3] == 0)
+    direct = []
+    for record in reversed(records[:index]):
+        if record[3] == 0:
+            break
+        if record[3] == 1:
+            direct.append(record)
+    return records[index], direct
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="face_api", help="要导入的模块 (在 src/face 目录下执行)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="总导入耗时预算 (毫秒)")
+    parser.add_argument("--top", type=int, default=15, help="输出累计耗时最高的 N 个依赖")
+    parser.add_argument("--repeat", type=int, default=3, help="重复测量次数，取最快一次")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.repeat):
+        records, loaded = measure(args.module)
+        runs.append((module_tree(records, args.module), loaded))
+    ((target, direct), loaded) = min(runs, key=lambda run: run[0][0][2])
+    total_ms = target[2] / 1000
+
+    # 只列出目标模块的直接依赖，避免重复计入
+    direct = sorted(direct, key=lambda r: r[2], reverse=True)
+    print("| module | cumulative (ms) | self (ms) |")
+    print("|---|---:|---:|")
+    for name, self_us, cumulative_us, _ in direct[:args.top]:
+        print(f"| {name} | {cumulative_us / 1000:.1f} | {self_us / 1000:.1f} |")
+
+    ok = True
+    print(f"\n导入 {args.module} 总耗时 {total_ms:.1f} ms (预算 {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        print("超出预算")
+        ok = False
+    heavy = [m for m in FORBIDDEN_MODULES if m in loaded]
+    if heavy:
+        print(f"启动时导入了重量级模块: {', '.join(heavy)}")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
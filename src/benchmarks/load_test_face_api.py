@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸 API 负载测试
+用 httpx 异步客户端按固定速率发送可配置比例的请求，在每个并发等级下统计吞吐量、p50/p95/p99 延迟和错误率。
+
+两种目标:
+- 默认: 进程内运行 face_api 应用 (即 main.py 挂载在 /api 下的子应用)，Milvus 由 FakeMilvusClient 代替，
+  预先写入合成的 128 维人脸，不需要任何外部服务
+- --url: 对已经启动的服务发送请求，例如 --url http://localhost:8000/api
+
+请求类型 (--mix 中的名称):
+    search  POST /face-search，查询向量为合成人脸加噪声
+    graph   GET  /face-graph?vectors=none
+    stream  GET  /face-graph/stream?vectors=none (读取完整的 NDJSON 流)
+    nodes   GET  /face-graph/nodes (第一页)
+    edges   GET  /face-graph/edges (第一页)
+
+--rate 为每个并发等级的目标总速率 (请求/秒)，按计划时间发送；延迟从计划发送时间算起，
+服务变慢导致的排队时间也计入延迟 (避免 coordinated omission)。--rate 0 时每个并发连接收到响应后立即发送下一个请求。
+
+用法:
+    python src/benchmarks/load_test_face_api.py --concurrency 1,4,16 --rate 50 --duration 10
+    python src/benchmarks/load_test_face_api.py --mix search=8,graph=1,nodes=1 --faces 2000
+    python src/benchmarks/load_test_face_api.py --url http://localhost:8000/api --rate 0
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+import httpx
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCHMARKS_DIR), "face"))
+sys.path.insert(0, BENCHMARKS_DIR)
+from face_config import (
+    COLLECTION_NAME, ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME, CLUSTER_FIELD_NAME,
+    EMBEDDING_DIM,
+)
+from fake_milvus import FakeMilvusClient
+
+REQUEST_KINDS = ("search", "graph", "stream", "nodes", "edges")
+DEFAULT_MIX = "search=8,graph=1,nodes=1"
+# 搜索查询向量的噪声 (相对于人物中心)，与合成照片的噪声相同
+QUERY_NOISE = 0.3
+
+
+@dataclass
+class Sample:
+    """一次请求的结果"""
+    kind: str
+    latency: float
+    ok: bool
+
+
+def parse_mix(text):
+    """解析 "search=8,graph=1" 形式的请求比例"""
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise argparse.ArgumentTypeError(f"未知的请求类型: {kind} (可选 {', '.join(REQUEST_KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def synthetic_faces(num_people, photos_per_person, image_path, seed=0):
+    """
+    生成合成人脸: 每个人一个随机中心，每张照片为中心加噪声后 L2 归一化
+
+    返回:
+        (rows, centers)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_people, EMBEDDING_DIM)).astype(np.float32)
+    rows = []
+    for i in range(num_people * photos_per_person):
+        person = i % num_people
+        vector = centers[person] + QUERY_NOISE * rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+        rows.append({
+            ID_FIELD_NAME: i + 1,
+            NAME_FIELD_NAME: f"person_{person}",
+            PATH_FIELD_NAME: image_path,
+            CLUSTER_FIELD_NAME: None,
+            EMBEDDING_FIELD_NAME: vector / np.linalg.norm(vector),
+        })
+    return rows, centers
+
+
+def build_in_process_app(num_faces, photos_per_person, image_bytes, latency_ms):
+    """
+    构建进程内的 face_api 应用，连接替换为写入合成人脸的 FakeMilvusClient
+
+    返回:
+        (app, centers, image_file)
+    """
+    import face_api
+
+    # 所有人脸共用一个占位图像文件，仍然会按节点读取和编码
+    image_file = tempfile.NamedTemporaryFile(suffix=".jpg", delete=False)
+    image_file.write(os.urandom(image_bytes))
+    image_file.close()
+
+    num_people = max(1, num_faces // photos_per_person)
+    rows, centers = synthetic_faces(num_people, photos_per_person, image_file.name)
+    client = FakeMilvusClient(latency=latency_ms / 1000)
+    client.add_collection(COLLECTION_NAME, rows, id_field=ID_FIELD_NAME, vector_field=EMBEDDING_FIELD_NAME,
+                          dim=EMBEDDING_DIM)
+    # ASGITransport 不执行 lifespan，直接设置 lifespan 中建立的连接
+    face_api.app.state.client = client
+    return face_api.app, centers, image_file.name
+
+
+class RequestFactory:
+    """按请求类型生成请求参数"""
+
+    def __init__(self, centers, similarity_threshold, top_k, seed=0):
+        self.centers = centers
+        self.similarity_threshold = similarity_threshold
+        self.top_k = top_k
+        self.rng = np.random.default_rng(seed)
+
+    def query_vector(self):
+        if self.centers is not None:
+            center = self.centers[self.rng.integers(len(self.centers))]
+        else:
+            center = self.rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+        vector = center + QUERY_NOISE * self.rng.standard_normal(EMBEDDING_DIM)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def build(self, kind):
+        """返回 (method, path, params, json)"""
+        threshold = {"similarity_threshold": self.similarity_threshold}
+        if kind == "search":
+            return "POST", "/face-search", None, {"vector": self.query_vector(), "top_k": self.top_k}
+        if kind == "graph":
+            return "GET", "/face-graph", {"vectors": "none", **threshold}, None
+        if kind == "stream":
+            return "GET", "/face-graph/stream", {"vectors": "none", **threshold}, None
+        if kind == "nodes":
+            return "GET", "/face-graph/nodes", {"vectors": "none", "limit": 200}, None
+        return "GET", "/face-graph/edges", {"limit": 2000, **threshold}, None
+
+
+async def send(http, factory, kind):
+    method, path, params, body = factory.build(kind)
+    async with http.stream(method, path, params=params, json=body) as response:
+        # 读完响应体 (流式接口的耗时包括整个流)
+        async for _ in response.aiter_raw():
+            pass
+        return response.status_code < 400
+
+
+async def run_level(http, factory, mix, concurrency, rate, duration, seed=0):
+    """
+    在一个并发等级下运行 duration 秒
+
+    返回:
+        (samples, elapsed)
+    """
+    kinds = list(mix)
+    weights = np.array([mix[kind] for kind in kinds])
+    rng = np.random.default_rng(seed)
+    schedule = [kinds[i] for i in rng.choice(len(kinds), size=max(1, int(rate * duration) if rate else 100000),
+                                              p=weights / weights.sum())]
+    counter = itertools.count()
+    samples = []
+    start = time.perf_counter()
+
+    async def worker():
+        while True:
+            index = next(counter)
+            if index >= len(schedule):
+                return
+            if rate:
+                planned = start + index / rate
+                delay = planned - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                planned = time.perf_counter()
+                if planned - start >= duration:
+                    return
+            kind = schedule[index]
+            try:
+                ok = await send(http, factory, kind)
+            except httpx.HTTPError:
+                ok = False
+            samples.append(Sample(kind, time.perf_counter() - planned, ok))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """返回 (请求数, 吞吐量, p50, p95, p99 (毫秒), 错误率)"""
+    latencies = np.array([s.latency for s in samples]) * 1000
+    errors = sum(not s.ok for s in samples)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+    return len(samples), len(samples) / elapsed if elapsed else 0.0, p50, p95, p99, errors / max(len(samples), 1)
+
+
+def format_row(level, kind, stats):
+    count, throughput, p50, p95, p99, error_rate = stats
+    return (f"| {level} | {kind} | {count} | {throughput:.1f} | {p50:.1f} | {p95:.1f} | {p99:.1f} | "
+            f"{error_rate:.1%} |")
+
+
+async def run(args):
+    mix = args.mix
+    centers = None
+    image_file = None
+    if args.url:
+        transport = None
+        base_url = args.url.rstrip("/")
+    else:
+        app, centers, image_file = build_in_process_app(args.faces, args.photos_per_person, args.image_bytes,
+                                                        args.fake_latency_ms)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+    factory = RequestFactory(centers, args.similarity_threshold, args.top_k)
+
+    lines = [
+        "| concurrency | request | requests | throughput (req/s) | p50 (ms) | p95 (ms) | p99 (ms) | errors |",
+        "|---:|---|---:|---:|---:|---:|---:|---:|",
+    ]
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout,
+                                     limits=limits) as http:
+            # 预热: 每种请求发送一次 (首次请求会读取人脸库、拟合布局)
+            for kind in mix:
+                await send(http, factory, kind)
+            for level in args.concurrency:
+                samples, elapsed = await run_level(http, factory, mix, level, args.rate, args.duration)
+                first = len(lines)
+                lines.append(format_row(level, "**all**", summarize(samples, elapsed)))
+                by_kind = defaultdict(list)
+                for sample in samples:
+                    by_kind[sample.kind].append(sample)
+                for kind in mix:
+                    if by_kind[kind]:
+                        lines.append(format_row(level, kind, summarize(by_kind[kind], elapsed)))
+                print("\n".join(lines[first:]), flush=True)
+    finally:
+        if image_file:
+            os.unlink(image_file)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="已启动服务的 API 地址 (例如 http://localhost:8000/api)，默认进程内测试")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        type=lambda s: [int(x) for x in s.split(",")], help="并发等级列表")
+    parser.add_argument("--rate", type=float, default=50, help="每个并发等级的目标总速率 (请求/秒)，0 表示不限速")
+    parser.add_argument("--duration", type=float, default=10, help="每个并发等级的持续时间 (秒)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="请求类型及比例")
+    parser.add_argument("--similarity-threshold", type=float, default=0.7, help="图接口的相似度阈值")
+    parser.add_argument("--top-k", type=int, default=10, help="搜索返回的结果数量")
+    parser.add_argument("--timeout", type=float, default=60, help="单个请求的超时 (秒)，超时计为错误")
+    parser.add_argument("--faces", type=int, default=1000, help="进程内测试: 合成人脸数量")
+    parser.add_argument("--photos-per-person", type=int, default=5, help="进程内测试: 每个人的照片数量")
+    parser.add_argument("--image-bytes", type=int, default=8192, help="进程内测试: 每张人脸图像的字节数")
+    parser.add_argument("--fake-latency-ms", type=float, default=1.0,
+                        help="进程内测试: 每次 Milvus 调用附加的延迟 (毫秒)，模拟网络往返")
+    parser.add_argument("--output", help="把 Markdown 表格写入该文件")
+    args = parser.parse_args()
+
+    # 负载测试时只保留警告以上的日志
+    logging.basicConfig(level=logging.WARNING)
+    table = asyncio.run(run(args))
+    print()
+    print(table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
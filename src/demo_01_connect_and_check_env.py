@@ -1,23 +1,24 @@
 # demo_01_connect_and_check_env.py
-from pymilvus import MilvusClient, __version__ as pymilvus_version
-import time
+from pymilvus import __version__ as pymilvus_version
+from milvus_connection import get_client, get_config, close_pool
+from milvus_wait import wait_for_server
+from profiling import install_profiling
 
-print(f"PyMilvus version: {pymilvus_version}")
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+print(f"PyMilvus version: {pymilvus_version}")
 
 client = None
 try:
     # 连接到 Milvus 服务
-    # 使用 host 和 port 指定 Milvus 服务的地址
-    print(f"\nAttempting to connect to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}...")
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
+    # 服务地址来自环境变量 (MILVUS_URI 或 MILVUS_HOST/MILVUS_PORT)，连接由共享连接池管理
+    print(f"\nAttempting to connect to Milvus service at {get_config().uri}...")
+    client = get_client()
 
     # 可以通过 list_collections() 来确认连接是否成功
-    # 如果服务刚刚启动可能需要一点时间才能响应
-    time.sleep(2) # 等待 Milvus 服务完全就绪
+    # 如果服务刚刚启动可能需要一点时间才能响应，轮询直到服务就绪
+    wait_for_server(client)
 
     collections = client.list_collections()
     print(f"\nSuccessfully connected to Milvus service.")
@@ -30,7 +31,7 @@ except Exception as e:
 finally:
     # 在 demo 结束时关闭客户端连接
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 1 finished.")
\ No newline at end of file
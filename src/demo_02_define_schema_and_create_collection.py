@@ -1,19 +1,25 @@
 # demo_02_define_schema_and_create_collection.py
-from pymilvus import MilvusClient, FieldSchema, CollectionSchema, DataType
+from pymilvus import FieldSchema, CollectionSchema, DataType
+from milvus_connection import get_client, get_config, close_pool
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称
 COLLECTION_NAME = "document_embeddings_demo"
 # 向量维度 (与 demo_03, demo_05, demo_06 保持一致)
 VECTOR_DIM = 8
+# 将 category 声明为 Partition Key: Milvus 按 category 的哈希把实体分到不同分区，
+# 过滤条件为 category == / in [...] 时，搜索和查询只访问匹配的分区
+CATEGORY_AS_PARTITION_KEY = True
+# Partition Key 使用的分区数量
+NUM_PARTITIONS = 16
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 如果 Collection 已存在，先删除以便重新创建 (用于演示目的)
     if client.has_collection(collection_name=COLLECTION_NAME):
@@ -25,8 +31,9 @@ try:
     fields = [
         # 主键字段：doc_id，整型，自动生成 ID
         FieldSchema(name="doc_id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-        # 标量字段：category，字符串类型，用于过滤
-        FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=256),
+        # 标量字段：category，字符串类型，用于过滤 (可作为 Partition Key)
+        FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=256,
+                    is_partition_key=CATEGORY_AS_PARTITION_KEY),
         # 向量字段：embedding，浮点向量，指定维度
         FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=VECTOR_DIM)
     ]
@@ -36,7 +43,10 @@ try:
 
     # 3. 创建 Collection
     print(f"\nAttempting to create collection '{COLLECTION_NAME}'...")
-    client.create_collection(collection_name=COLLECTION_NAME, schema=schema)
+    if CATEGORY_AS_PARTITION_KEY:
+        client.create_collection(collection_name=COLLECTION_NAME, schema=schema, num_partitions=NUM_PARTITIONS)
+    else:
+        client.create_collection(collection_name=COLLECTION_NAME, schema=schema)
 
     print(f"Collection '{COLLECTION_NAME}' created successfully with schema:")
     print(schema)
@@ -46,7 +56,7 @@ except Exception as e:
 
 finally:
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 2 finished.")
\ No newline at end of file
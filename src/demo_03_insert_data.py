@@ -1,11 +1,13 @@
 # demo_03_insert_data.py
 import random
-import time
-from pymilvus import MilvusClient
+from milvus_connection import get_client, get_config, close_pool
+from pymilvus.client.types import LoadState
+from milvus_consistency import insert_with_token, read_options
+from milvus_wait import get_load_state
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称 (与 demo_02 保持一致)
 COLLECTION_NAME = "document_embeddings_demo"
@@ -14,8 +16,8 @@ VECTOR_DIM = 8
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 检查 Collection 是否存在
     if not client.has_collection(collection_name=COLLECTION_NAME):
@@ -69,24 +71,25 @@ try:
 
     print(f"\nAttempting to insert {len(entities)} entities into '{COLLECTION_NAME}'...")
 
-    # 插入数据
-    insert_result = client.insert(collection_name=COLLECTION_NAME, data=entities)
+    # 插入数据，同时得到这次写入的令牌 (写入时间戳)
+    insert_result, write_token = insert_with_token(client, COLLECTION_NAME, entities)
 
     print("Insert result:", insert_result)
     # 插入结果包含自动生成的 ID
+    print("Write token:", write_token.encode())
 
-    # 刷新数据，使其可被搜索和查询
-    # 在 Milvus 中，插入的数据首先进入内存缓冲区，flush 操作将其持久化并使其可查询
-    print("\nFlushing data...")
-    client.flush(collection_name=COLLECTION_NAME)
-    print("Flush complete.")
-
-    # 等待数据实际写入
-    time.sleep(2) # 根据服务负载可能需要调整等待时间
-
-    # 获取 Collection 状态，查看 Entity 数量
-    stats = client.get_collection_stats(collection_name=COLLECTION_NAME)
-    print(f"\nCollection '{COLLECTION_NAME}' stats after insert and flush: {stats}")
+    # 不需要 flush: 插入的数据在 growing segment 中已经可以被搜索和查询，
+    # 带上写入令牌的读请求由服务端等到这次写入可见后再执行 (flush 只负责持久化，由服务端自动完成)
+    # 写入令牌可以传给后续步骤，或者在同一进程中使用 Session 一致性级别
+    if get_load_state(client, COLLECTION_NAME) == LoadState.Loaded:
+        count = client.query(
+            collection_name=COLLECTION_NAME, filter="", output_fields=["count(*)"],
+            **read_options(token=write_token),
+        )
+        print(f"\nCollection '{COLLECTION_NAME}' entity count after insert: {count[0]['count(*)']}")
+    else:
+        # 查询需要先加载集合 (demo_05)，加载后新插入的数据即可被搜索
+        print(f"\nCollection '{COLLECTION_NAME}' is not loaded yet; the new entities are searchable once demo_05 loads it.")
 
 
 except Exception as e:
@@ -94,7 +97,7 @@ except Exception as e:
 
 finally:
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 3 finished.")
\ No newline at end of file
@@ -1,9 +1,10 @@
 # demo_04_create_index.py
-from pymilvus import MilvusClient
+from milvus_connection import get_client, get_config, close_pool
+from milvus_index import build_index_async
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称 (与 demo_02 保持一致)
 COLLECTION_NAME = "document_embeddings_demo"
@@ -11,11 +12,18 @@ COLLECTION_NAME = "document_embeddings_demo"
 VECTOR_FIELD_NAME = "embedding"
 # 索引名称 (可以自定义)
 INDEX_NAME = "my_vector_index"
+# 标量字段名称 (与 demo_02 保持一致)
+CATEGORY_FIELD_NAME = "category"
+# 标量索引名称
+SCALAR_INDEX_NAME = "category_index"
+# 标量索引类型: INVERTED 适用于各种取值数量；category 取值很少，
+# 在支持的 Milvus 版本 (2.4.5+) 上也可以改用更省内存的 BITMAP
+SCALAR_INDEX_TYPE = "INVERTED"
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 检查 Collection 是否存在
     if not client.has_collection(collection_name=COLLECTION_NAME):
@@ -32,6 +40,12 @@ try:
     except Exception as e:
         # describe_index 在索引不存在时会抛异常，这里忽略
         pass
+    try:
+        if client.describe_index(collection_name=COLLECTION_NAME, index_name=SCALAR_INDEX_NAME):
+             print(f"\nIndex '{SCALAR_INDEX_NAME}' already exists. Dropping it.")
+             client.drop_index(collection_name=COLLECTION_NAME, index_name=SCALAR_INDEX_NAME)
+    except Exception as e:
+        pass
 
 
     # 1. 定义索引参数
@@ -79,15 +93,29 @@ try:
 
     # 2. 创建索引
     print(f"\nAttempting to create index '{INDEX_NAME}' on field '{VECTOR_FIELD_NAME}'...")
-    # index_name 参数在 create_index 中是可选的，如果 index_params 中已指定则会使用它
-    client.create_index(collection_name=COLLECTION_NAME, index_params=index_params)
-
-    print(f"Index creation request sent for '{INDEX_NAME}'.")
+    # 索引在后台构建，期间按 describe_index 的已索引行数/总行数打印进度
+    # 大集合构建耗时较长，这里可以先做其它工作，需要时再调用 wait()
+    index_build = build_index_async(client, COLLECTION_NAME, index_params, INDEX_NAME)
+    index_build.wait()
+
+    print(f"Index '{INDEX_NAME}' built.")
+
+    # 3. 为过滤字段创建标量索引
+    # 过滤条件 (如 demo_06 的 category == "Technology") 不再需要逐行扫描 category 字段
+    scalar_index_params = client.prepare_index_params()
+    scalar_index_params.add_index(
+        field_name=CATEGORY_FIELD_NAME,
+        index_type=SCALAR_INDEX_TYPE,
+        index_name=SCALAR_INDEX_NAME
+    )
+    print(f"\nAttempting to create {SCALAR_INDEX_TYPE} index '{SCALAR_INDEX_NAME}' on field '{CATEGORY_FIELD_NAME}'...")
+    build_index_async(client, COLLECTION_NAME, scalar_index_params, SCALAR_INDEX_NAME).wait()
+    print(f"Index '{SCALAR_INDEX_NAME}' built.")
 
-    # 可以描述索引信息来确认
-    index_desc = client.describe_index(collection_name=COLLECTION_NAME, index_name=INDEX_NAME)
+    # 可以描述索引信息来确认 (向量索引和标量索引)
     print("\nIndex description:")
-    print(index_desc)
+    for index_name in client.list_indexes(collection_name=COLLECTION_NAME):
+        print(client.describe_index(collection_name=COLLECTION_NAME, index_name=index_name))
 
 
 except Exception as e:
@@ -95,7 +123,7 @@ except Exception as e:
 
 finally:
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 4 finished.")
\ No newline at end of file
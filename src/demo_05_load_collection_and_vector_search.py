@@ -1,11 +1,11 @@
 # demo_05_load_collection_and_vector_search.py
 import random
-import time
-from pymilvus import MilvusClient
+from milvus_connection import get_client, get_config, close_pool
+from milvus_wait import wait_for_loaded
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称 (与 demo_02 保持一致)
 COLLECTION_NAME = "document_embeddings_demo"
@@ -16,8 +16,8 @@ VECTOR_DIM = 8
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 检查 Collection 是否存在
     if not client.has_collection(collection_name=COLLECTION_NAME):
@@ -31,9 +31,9 @@ try:
     client.load_collection(collection_name=COLLECTION_NAME, repeatedly_load=False)
     print(f"Collection '{COLLECTION_NAME}' loaded or already loaded.")
 
-    # 等待短暂时间，确保集合加载完成
+    # 轮询加载状态，确保集合加载完成
     print("Waiting for collection to load...")
-    time.sleep(2)
+    wait_for_loaded(client, COLLECTION_NAME)
     print("Collection loading complete.")
 
 
@@ -74,7 +74,7 @@ finally:
     # print(f"Collection '{COLLECTION_NAME}' released.")
 
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 5 finished.")
\ No newline at end of file
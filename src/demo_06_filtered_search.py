@@ -1,11 +1,11 @@
 # demo_06_filtered_search.py
 import random
-import time
-from pymilvus import MilvusClient
+from milvus_connection import get_client, get_config, close_pool
+from milvus_wait import wait_for_loaded
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称 (与 demo_02 保持一致)
 COLLECTION_NAME = "document_embeddings_demo"
@@ -16,8 +16,8 @@ VECTOR_DIM = 8
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 检查 Collection 是否存在
     if not client.has_collection(collection_name=COLLECTION_NAME):
@@ -28,7 +28,7 @@ try:
     print(f"\nLoading collection '{COLLECTION_NAME}' into memory...")
     client.load_collection(collection_name=COLLECTION_NAME, repeatedly_load=False)
     print(f"Collection '{COLLECTION_NAME}' loaded or already loaded.")
-    time.sleep(2)
+    wait_for_loaded(client, COLLECTION_NAME)
     print("Collection loading complete.")
 
 
@@ -38,6 +38,8 @@ try:
 
     # 2. 执行带过滤条件的向量搜索 (Filtered Search)
     # filter 参数是一个布尔表达式，使用标量字段进行过滤
+    # category 是 Partition Key (见 demo_02)，等值过滤只会访问匹配的分区，
+    # 分区内再通过 category 的标量索引 (见 demo_04) 过滤
     print("\nPerforming filtered vector search (category == 'Technology')...")
 
     search_results_filtered = client.search(
@@ -70,7 +72,7 @@ try:
     print("\nQuery results:")
     if query_results:
         for entity in query_results:
-            print(f"  ID: {hit}")
+            print(f"  ID: {entity['doc_id']}, Category: {entity['category']}")
     else:
          print("  No entities found matching the query filter.")
 
@@ -85,7 +87,7 @@ finally:
     # print(f"Collection '{COLLECTION_NAME}' released.")
 
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 6 finished.")
\ No newline at end of file
@@ -1,18 +1,19 @@
 # demo_07_get_data_by_ids.py
-import time
-from pymilvus import MilvusClient
+from milvus_connection import get_client, get_config, get_pool, close_pool
+from milvus_wait import wait_for_loaded
+from milvus_reader import fetch_by_ids, iter_query_batches
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称 (与 demo_02 保持一致)
 COLLECTION_NAME = "document_embeddings_demo"
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 检查 Collection 是否存在
     if not client.has_collection(collection_name=COLLECTION_NAME):
@@ -23,19 +24,16 @@ try:
     print(f"\nLoading collection '{COLLECTION_NAME}' into memory...")
     client.load_collection(collection_name=COLLECTION_NAME, repeatedly_load=False)
     print(f"Collection '{COLLECTION_NAME}' loaded or already loaded.")
-    time.sleep(2)
+    wait_for_loaded(client, COLLECTION_NAME)
     print("Collection loading complete.")
 
     # 1. 获取 Collection 中存在的 ID (为了演示，这里先执行一个简单的 Query 来获取一些 ID)
     # 实际应用中，你可能已经知道要获取的 ID 列表
     print("\nGetting some IDs by querying for 'Technology'...")
-    query_results = client.query(
-        collection_name=COLLECTION_NAME,
-        filter='category == "Technology"',
-        output_fields=["doc_id"]
-    )
-
-    ids_to_get = [entity['doc_id'] for entity in query_results]
+    # 用查询迭代器分批读取，只返回主键，匹配数量很大时内存占用也只与批大小有关
+    ids_to_get = []
+    for batch in iter_query_batches(client, COLLECTION_NAME, filter='category == "Technology"', id_field="doc_id"):
+        ids_to_get.extend(batch.ids.tolist())
     print(f"Found IDs to get: {ids_to_get}")
 
     if not ids_to_get:
@@ -44,17 +42,23 @@ try:
 
     # 2. 根据 ID 获取 Entity 数据
     print(f"\nAttempting to get entities by IDs: {ids_to_get}")
-    get_results = client.get(
-        collection_name=COLLECTION_NAME,
-        ids=ids_to_get,
-        output_fields=["doc_id", "category", "embedding"] # 可以指定要返回的字段，包括向量字段
+    # 只请求需要的字段 (不需要向量时去掉 vector_field)；
+    # ID 很多时自动拆分为多个分片，在连接池的多个连接上并行获取，向量直接解码为 float32 矩阵
+    result = fetch_by_ids(
+        client,
+        COLLECTION_NAME,
+        ids_to_get,
+        output_fields=["category"],
+        vector_field="embedding",
+        id_field="doc_id",
+        clients=get_pool().clients(),
     )
 
     print("\nGet results:")
-    if get_results:
-        for entity in get_results:
-             # 注意：embedding 字段可能很长，这里简化打印
-            print(f"  ID: {entity['doc_id']}, Category: {entity['category']}, Embedding (partial): {entity['embedding'][:5]}...")
+    if len(result):
+        for doc_id, category, embedding in zip(result.ids, result.columns["category"], result.vectors):
+            # 注意：embedding 字段可能很长，这里简化打印
+            print(f"  ID: {doc_id}, Category: {category}, Embedding (partial): {embedding[:5]}...")
     else:
         print("  No entities retrieved for the given IDs.")
 
@@ -68,7 +72,7 @@ finally:
     # print(f"Collection '{COLLECTION_NAME}' released.")
 
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 7 finished.")
\ No newline at end of file
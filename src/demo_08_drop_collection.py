@@ -1,18 +1,19 @@
 # demo_08_drop_collection.py
-from pymilvus import MilvusClient
-import time
+from pymilvus.client.types import LoadState
+from milvus_connection import get_client, get_config, close_pool
+from milvus_wait import get_load_state, wait_for_released, wait_for_dropped
+from profiling import install_profiling
 
-# Milvus 服务连接信息
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
+# 带 --profile[=sample] 参数或设置环境变量 PROFILE 时记录整个脚本的性能分析结果 (见 profiling.py)
+install_profiling()
 
 # Collection 名称 (与 demo_02 保持一致)
 COLLECTION_NAME = "document_embeddings_demo"
 
 client = None
 try:
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
-    print(f"Successfully connected to Milvus service at {MILVUS_HOST}:{MILVUS_PORT}")
+    client = get_client()
+    print(f"Successfully connected to Milvus service at {get_config().uri}")
 
     # 检查 Collection 是否存在
     if client.has_collection(collection_name=COLLECTION_NAME):
@@ -22,13 +23,13 @@ try:
         # 检查 Collection 是否已加载 (不是必须的，但好习惯)
         try:
              # 尝试获取加载状态，如果 Collection 不存在或未加载会抛异常
-             load_state = client.get_load_state(collection_name=COLLECTION_NAME)
-             if load_state.get('state') in ['LoadState.Loading', 'LoadState.Loaded']:
+             load_state = get_load_state(client, COLLECTION_NAME)
+             if load_state in (LoadState.Loading, LoadState.Loaded):
                   print(f"Collection '{COLLECTION_NAME}' is loaded. Releasing it first.")
                   client.release_collection(collection_name=COLLECTION_NAME)
                   print(f"Collection '{COLLECTION_NAME}' released.")
                   # 等待释放完成 (可选)
-                  time.sleep(1)
+                  wait_for_released(client, COLLECTION_NAME)
         except Exception as e:
              # 如果 Collection 不存在或未加载，忽略异常
              pass
@@ -40,8 +41,7 @@ try:
 
         # 等待删除完成 (可选)
         print("Waiting for collection deletion...")
-        while client.has_collection(collection_name=COLLECTION_NAME):
-             time.sleep(1)
+        wait_for_dropped(client, COLLECTION_NAME)
         print(f"Collection '{COLLECTION_NAME}' confirmed to be deleted.")
 
     else:
@@ -52,7 +52,7 @@ except Exception as e:
 
 finally:
     if client:
-        client.close()
+        close_pool()
         print("Client connection closed.")
 
 print("\nDemo 8 finished.")
\ No newline at end of file
@@ -6,25 +6,94 @@
 提供人脸向量数据的API接口，用于前端可视化展示
 """
 
+import functools
 import os
-import numpy as np
+import time
+import logging
+import threading
 import base64
-from typing import List, Dict, Any
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Union
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import cv2
-from pymilvus import MilvusClient
-import time
 
-# 导入配置
-from face_vectorization import (
-    MILVUS_HOST, MILVUS_PORT, COLLECTION_NAME,
-    ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME
+# 导入配置 (轻量模块，不会导入 OpenCV / face_recognition)
+from face_config import (
+    COLLECTION_NAME, IDENTITY_COLLECTION_NAME, SHARD_COLLECTIONS,
+    ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME, CLUSTER_FIELD_NAME, EMBEDDING_DIM,
+    REPRESENTATIVES_FILTER,
+)
+# face_config 已将上级目录 src/ 加入 sys.path
+from milvus_connection import get_client, get_pool, close_pool
+from milvus_residency import ResidencyManager
+from milvus_maintenance import CompactionScheduler
+from milvus_cache import SearchCache, get_search_cache
+from milvus_consistency import STRONG, CUSTOMIZED, WRITE_TOKEN_HEADER, WriteToken, read_options
+from milvus_range import MAX_TOPK, range_search_params, range_search
+from milvus_federated import POLICY_ALL, POLICY_PARTIAL, FederatedSearchError, Shard, federated_search
+from milvus_reader import query_page
+from graph_encoding import (
+    VECTORS_LIST, VECTORS_BASE64, VECTORS_NONE, VECTOR_ENCODINGS, MSGPACK_MEDIA_TYPE, NDJSON_MEDIA_TYPE,
+    build_graph_payload, build_nodes, build_edges, negotiate_media_type, serialize, serialize_line,
 )
+from face_identity import MAX_SHORTLIST, two_stage_search
+from face_graph import get_gallery, load_gallery, iter_edges, iter_range_edges, edge_cursor, parse_edge_cursor
+from face_layout import get_layout
+from metrics import configure_logging, stage, metrics_payload, HTTP_REQUEST_SECONDS
+from profiling import profile_run
+
+logger = logging.getLogger(__name__)
+
+# 流式接口每行最多包含的节点数和边数
+STREAM_NODE_CHUNK = 200
+STREAM_EDGE_CHUNK = 2000
+# 边的计算方式: local 在 API 进程中分块计算全部两两相似度，server 用 Milvus 范围搜索只取回超过阈值的近邻
+EDGE_SOURCES = ("local", "server")
+# /face-verify 一次请求最多的查询向量数量
+MAX_VERIFY_BATCH = 100
+# 分页接口每页的默认数量和最大数量
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 10000
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+    应用生命周期: 启动时连接 Milvus，关闭时释放连接池
+    导入本模块不会建立连接，reload 和 worker 启动更快
+
+    注意: 作为子应用挂载 (app.mount) 时不会执行子应用自己的 lifespan，
+    主应用需要把本函数作为自己的 lifespan 传入 (见 main.py)
+    """
+    configure_logging()
+    try:
+        # 共享连接池中的温热连接，所有请求复用
+        # 总是保存在本模块的 app 上 (挂载时传入的是主应用)
+        app.state.client = get_client()
+        # 按访问时间和内存预算管理集合的加载与释放 (预算和空闲时间见 milvus_residency.py 的环境变量)
+        app.state.residency = ResidencyManager(app.state.client)
+        app.state.residency.start_background_release()
+        # 删除和替换照片后定期检查是否需要压缩 (MILVUS_COMPACTION_INTERVAL_S 为 0 时不启动，见 milvus_maintenance.py)
+        app.state.compaction = CompactionScheduler(app.state.client, [COLLECTION_NAME, IDENTITY_COLLECTION_NAME])
+        app.state.compaction.start()
+        logger.info("Milvus 连接成功")
+    except Exception as e:
+        logger.error("Milvus 连接失败: %s", e)
+        raise
+    try:
+        yield
+    finally:
+        app.state.compaction.close()
+        app.state.residency.close()
+        close_pool()
+
 
 # 创建FastAPI应用
-app = FastAPI(title="人脸向量可视化API")
+# 访问 Milvus 或做 NumPy 计算的接口都定义为普通函数 (def)，由 Starlette 在线程池中执行，
+# 慢请求 (如 /face-graph) 不会阻塞事件循环和其他请求
+app = FastAPI(title="人脸向量可视化API", lifespan=lifespan)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -35,13 +104,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 连接Milvus
-try:
-    client = MilvusClient(uri=f"http://{MILVUS_HOST}:{MILVUS_PORT}")
-    print("Milvus 连接成功!")
-except Exception as e:
-    print(f"Milvus 连接失败: {e}")
-    raise
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    """记录每个请求的耗时 (按路由模板分组，避免路径参数导致标签过多)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        HTTP_REQUEST_SECONDS.labels(method=request.method, path=path, status=str(status)).observe(
+            time.perf_counter() - start)
+
+
+def profiled(func):
+    """
+    设置环境变量 PROFILE=cprofile / sample 时为请求记录性能分析 (见 src/profiling.py)
+    在执行接口函数的线程池线程中分析 (cProfile 和采样都只记录当前线程)；
+    同一时间只分析一个请求，分析进行中到达的其他请求照常处理
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profile_run(f"request_{func.__name__}"):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 指标 (各阶段耗时、Milvus 调用耗时、HTTP 请求耗时)"""
+    payload = metrics_payload()
+    if payload is None:
+        raise HTTPException(status_code=503, detail="未安装 prometheus_client")
+    content, content_type = payload
+    return Response(content=content, media_type=content_type)
+
+
+def get_milvus_client():
+    """返回生命周期中建立的 Milvus 连接；未经 lifespan 启动时 (例如测试中直接调用) 从连接池获取"""
+    return getattr(app.state, "client", None) or get_client()
 
 class FaceNode(BaseModel):
     """人脸节点模型"""
@@ -49,7 +154,11 @@ class FaceNode(BaseModel):
     name: str
     image_path: str
     image_data: str  # Base64编码的图像数据
-    vector: List[float]
+    # vectors=list 时为浮点数列表，vectors=base64 时为 float32 缓冲区的 base64 字符串，vectors=none 时省略
+    vector: Optional[Union[List[float], str]] = None
+    # 服务端计算的二维布局坐标 (约在 [-1, 1] 范围内)
+    x: Optional[float] = None
+    y: Optional[float] = None
 
 class FaceEdge(BaseModel):
     """人脸边（相似度连接）模型"""
@@ -61,13 +170,48 @@ class FaceGraph(BaseModel):
     """人脸图结构模型"""
     nodes: List[FaceNode]
     edges: List[FaceEdge]
+    vector_encoding: str = VECTORS_LIST
+    vector_dim: int = 0
+
+class FaceSearchRequest(BaseModel):
+    """人脸搜索请求: 查询向量由调用方提取 (例如 FaceVectorizer.extract_face_encoding)"""
+    vector: List[float]
+    top_k: int = 5
+    representatives: bool = False
+    # 大于 0 时使用两阶段搜索: 先按身份中心向量选出 shortlist 个候选人，再只在他们的照片中搜索
+    shortlist: int = 0
+    # 一致性级别 Strong / Bounded / Session / Eventually，默认使用 MILVUS_READ_CONSISTENCY 或集合的级别
+    consistency: Optional[str] = None
 
-def compute_cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
-    """计算两个向量之间的余弦相似度"""
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    similarity = np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-    return float(similarity)
+class FaceFederatedSearchRequest(BaseModel):
+    """跨多个人脸分片的搜索请求"""
+    vector: List[float]
+    top_k: int = 5
+    # 要搜索的分片 (FACE_SHARD_COLLECTIONS 中的名称)，默认全部
+    shards: Optional[List[str]] = None
+    representatives: bool = False
+    # 每个分片的超时 (毫秒)
+    timeout_ms: int = 2000
+    # 为 false 时任一分片失败或超时都返回 503
+    allow_partial: bool = True
+    consistency: Optional[str] = None
+
+class FaceVerifyRequest(BaseModel):
+    """1:N 人脸核验请求: 返回每个查询向量相似度超过阈值的全部人脸 (分页)"""
+    vectors: List[List[float]]
+    min_similarity: float = 0.9
+    limit: int = 100
+    offset: int = 0
+    representatives: bool = False
+    consistency: Optional[str] = None
+
+class FaceSearchHit(BaseModel):
+    """人脸搜索结果"""
+    id: str
+    name: str
+    image_path: str
+    cluster_id: Optional[str] = None
+    similarity: float
 
 def image_to_base64(image_path: str) -> str:
     """将图像转换为Base64编码"""
@@ -77,80 +221,489 @@ def image_to_base64(image_path: str) -> str:
             current_dir = os.path.dirname(os.path.abspath(__file__))
             image_path = os.path.join(current_dir, image_path)
         
-        print(f"尝试读取图像文件: {image_path}")
+        logger.debug("读取图像文件: %s", image_path)
         
-        with open(image_path, "rb") as img_file:
+        with stage("image_io"), open(image_path, "rb") as img_file:
             img_data = img_file.read()
             return base64.b64encode(img_data).decode('utf-8')
     except Exception as e:
-        print(f"图像转换失败: {e}")
+        logger.warning("图像转换失败: %s", e)
         # 返回空字符串或默认图像
         return ""
 
 @app.get("/face-graph", response_model=FaceGraph)
-async def get_face_graph(similarity_threshold: float = 0.7):
+@profiled
+def get_face_graph(
+    request: Request,
+    similarity_threshold: float = 0.7,
+    vectors: str = VECTORS_LIST,
+    representatives: bool = False,
+    edge_source: str = "local",
+):
     """
     获取人脸向量图数据
     
     参数:
         similarity_threshold: 相似度阈值，只有超过此值的边才会被返回
+        vectors: 向量编码 none / list / base64，前端只需要画图时使用 none
+        representatives: 只返回每个簇的代表人脸 (运行 face_cluster.py 之后)
+        edge_source: local 在本进程计算全部两两相似度 (精确)，server 用 Milvus 范围搜索只取回超过阈值的边
+                     (人脸很多而边很稀疏时更快，结果来自近似索引)
         
     返回:
-        FaceGraph: 人脸图数据，包含节点和边
+        FaceGraph: 人脸图数据，包含节点和边；
+        请求头 Accept: application/msgpack 时返回 msgpack，否则返回 JSON
     """
+    check_vector_encoding(vectors)
+    if edge_source not in EDGE_SOURCES:
+        raise HTTPException(status_code=400, detail=f"edge_source 只能是 {', '.join(EDGE_SOURCES)}")
+
     try:
-        # 查询所有人脸数据
-        print(f"\nLoading collection '{COLLECTION_NAME}' into memory...")
-        client.load_collection(collection_name=COLLECTION_NAME, repeatedly_load=False)
-        print(f"Collection '{COLLECTION_NAME}' loaded or already loaded.")
-        time.sleep(2)
-        print("Collection loading complete.")
-
-        results = client.query(
-            collection_name=COLLECTION_NAME,
-            filter="",
-            limit=1000,
-            output_fields=[ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME]
-        )
+        client = get_milvus_client()
+
+        # 分批流式读取全部人脸，向量直接组装为 float32 矩阵，不受 query 的 limit 限制
+        gallery = read_loaded(client, lambda: load_gallery(client, COLLECTION_NAME, gallery_filter(representatives)))
         
-        if not results:
+        if len(gallery) == 0:
             raise HTTPException(status_code=404, detail="未找到人脸数据")
         
-        # 转换为节点列表
-        nodes = []
-        for face in results:
-            # 为图像路径添加完整路径
-            image_path = face[PATH_FIELD_NAME]
-            # 获取Base64图像数据
-            print(f"image_path: {image_path}")
-            image_data = image_to_base64(image_path)
-            
-            nodes.append(FaceNode(
-                id=str(face[ID_FIELD_NAME]),
-                name=face[NAME_FIELD_NAME],
-                image_path=image_path,
-                image_data=image_data,
-                vector=face[EMBEDDING_FIELD_NAME]
-            ))
+        # 获取Base64图像数据
+        image_data = [image_to_base64(image_path) for image_path in gallery.image_paths]
         
-        # 计算所有人脸之间的相似度
-        edges = []
-        for i, node1 in enumerate(nodes):
-            for j, node2 in enumerate(nodes):
-                if i < j:  # 避免重复计算
-                    similarity = (compute_cosine_similarity(node1.vector, node2.vector) - 0.8) * 5
-                    # 只添加相似度超过阈值的边
-                    if similarity >= similarity_threshold:
-                        edges.append(FaceEdge(
-                            source=node1.id,
-                            target=node2.id,
-                            similarity=similarity
-                        ))
-        return FaceGraph(nodes=nodes, edges=edges)
+        # 按分块计算所有人脸之间的相似度，只保留超过阈值的边；或由服务端范围搜索直接返回这些边
+        if edge_source == "server":
+            edges = read_loaded(client, lambda: list(iter_range_edges(client, gallery, similarity_threshold,
+                                                                      filter=gallery_filter(representatives))))
+        else:
+            edges = list(iter_edges(gallery, similarity_threshold))
+
+        # 缓存的二维布局，新增的人脸增量计算坐标
+        positions = get_layout(layout_key(representatives), gallery).coordinates(gallery.ids)
+
+        # 直接组装 dict 并序列化，不为每个节点和每个浮点数构造 pydantic 模型
+        media_type = negotiate_media_type(request.headers.get("accept"))
+        payload = build_graph_payload(
+            gallery.ids, gallery.names, gallery.image_paths, image_data, gallery.vectors, edges,
+            vector_encoding=vectors, binary=(media_type == MSGPACK_MEDIA_TYPE), positions=positions,
+        )
+        with stage("serialize"):
+            content = serialize(payload, media_type)
+        return Response(content=content, media_type=media_type)
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取人脸图数据失败: {str(e)}")
 
+
+def gallery_filter(representatives: bool) -> str:
+    """representatives 参数对应的过滤表达式"""
+    return REPRESENTATIVES_FILTER if representatives else ""
+
+
+def layout_key(representatives: bool) -> str:
+    """布局缓存的键: 全部人脸和只含代表人脸的图各自缓存一份布局"""
+    return f"{COLLECTION_NAME}:representatives" if representatives else COLLECTION_NAME
+
+
+def check_vector_encoding(vectors: str):
+    """校验 vectors 参数"""
+    if vectors not in VECTOR_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"vectors 只能是 {', '.join(VECTOR_ENCODINGS)}")
+
+
+_residency_lock = threading.Lock()
+
+
+def get_residency(client):
+    """
+    返回进程内共享的集合驻留管理器: 由 lifespan 创建，未经 lifespan 启动时 (例如测试) 第一次使用时用 client 创建
+    所有请求共用同一个管理器，LRU 顺序、正在使用的集合和后台释放线程只有一份
+    """
+    manager = getattr(app.state, "residency", None)
+    if manager is None:
+        with _residency_lock:
+            manager = getattr(app.state, "residency", None)
+            if manager is None:
+                manager = app.state.residency = ResidencyManager(client)
+    return manager
+
+
+def read_loaded(client, read, collection_names=(COLLECTION_NAME,)):
+    """
+    确保集合已加载 (被释放时重新加载) 后执行 read()，并记录一次访问
+    请求期间这些集合不会被换出；确认加载状态之后集合被其他进程释放时，重新加载并重试一次
+
+    参数:
+        read: 无参数的读取函数
+        collection_names: read 读取的集合
+    """
+    return get_residency(client).run(collection_names, read)
+
+
+def consistency_options(consistency, write_token, collection_names=(COLLECTION_NAME,)):
+    """
+    把请求中的一致性级别和写入令牌 (请求头 X-Milvus-Write-Token) 转换为搜索参数，无效时返回 400
+
+    参数:
+        collection_names: 本次请求搜索的集合，写入令牌必须属于其中之一
+
+    返回:
+        (搜索的关键字参数, 是否需要读到最新数据 (此时不使用搜索结果缓存))
+    """
+    try:
+        token = WriteToken.decode(write_token) if write_token else None
+        if token is not None and token.collection_name not in collection_names:
+            raise ValueError(f"写入令牌不属于集合 {', '.join(collection_names)}")
+        options = read_options(consistency, token)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return options, options.get("consistency_level") in (STRONG, CUSTOMIZED)
+
+
+def iter_graph_lines(gallery, positions, similarity_threshold, vectors):
+    """
+    按 NDJSON 逐行产出人脸图: 先是 meta，再是若干 nodes 块，然后是若干 edges 块，最后是 end
+    图像在发送对应的节点块时才读取，边由分块相似度生成器边计算边发送
+    """
+    yield serialize_line({
+        "type": "meta",
+        "node_count": len(gallery),
+        "vector_encoding": vectors,
+        "vector_dim": int(gallery.vectors.shape[1]) if len(gallery) else 0,
+    })
+    for start in range(0, len(gallery), STREAM_NODE_CHUNK):
+        end = start + STREAM_NODE_CHUNK
+        image_paths = gallery.image_paths[start:end]
+        yield serialize_line({
+            "type": "nodes",
+            "items": build_nodes(
+                gallery.ids[start:end], gallery.names[start:end], image_paths,
+                [image_to_base64(image_path) for image_path in image_paths],
+                gallery.vectors[start:end], vectors, positions=positions[start:end],
+            ),
+        })
+    edge_count = 0
+    chunk = []
+    for edge in iter_edges(gallery, similarity_threshold):
+        chunk.append(edge)
+        if len(chunk) >= STREAM_EDGE_CHUNK:
+            yield serialize_line({"type": "edges", "items": build_edges(chunk)})
+            edge_count += len(chunk)
+            chunk = []
+    if chunk:
+        yield serialize_line({"type": "edges", "items": build_edges(chunk)})
+        edge_count += len(chunk)
+    yield serialize_line({"type": "end", "node_count": len(gallery), "edge_count": edge_count})
+
+
+@app.get("/face-graph/stream")
+@profiled
+def stream_face_graph(similarity_threshold: float = 0.7, vectors: str = VECTORS_BASE64,
+                      representatives: bool = False):
+    """
+    以 NDJSON 流的形式返回人脸图 (application/x-ndjson)
+    节点先于边发送，前端可以边接收边渲染；服务端不保存完整的边列表
+
+    参数:
+        similarity_threshold: 相似度阈值
+        vectors: 向量编码 none / list / base64
+        representatives: 只返回每个簇的代表人脸
+    """
+    check_vector_encoding(vectors)
+    try:
+        client = get_milvus_client()
+        gallery = read_loaded(client, lambda: load_gallery(client, COLLECTION_NAME, gallery_filter(representatives)))
+        positions = get_layout(layout_key(representatives), gallery).coordinates(gallery.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取人脸图数据失败: {str(e)}")
+    if len(gallery) == 0:
+        raise HTTPException(status_code=404, detail="未找到人脸数据")
+    # 同步生成器由 Starlette 在线程池中迭代，不阻塞事件循环
+    return StreamingResponse(iter_graph_lines(gallery, positions, similarity_threshold, vectors),
+                             media_type=NDJSON_MEDIA_TYPE)
+
+
+def check_page_size(limit: int):
+    if not 0 < limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+
+
+@app.get("/face-graph/nodes")
+@profiled
+def get_face_graph_nodes(request: Request, cursor: Optional[int] = None,
+                         limit: int = DEFAULT_PAGE_SIZE, vectors: str = VECTORS_NONE,
+                         representatives: bool = False):
+    """
+    按主键游标分页返回节点
+
+    参数:
+        cursor: 上一页返回的 next_cursor (主键)，第一页不传
+        limit: 每页节点数
+        vectors: 向量编码 none / list / base64
+        representatives: 只返回每个簇的代表人脸
+
+    返回:
+        {"items": [...], "next_cursor": 下一页游标，没有更多数据时为 null}
+    """
+    check_vector_encoding(vectors)
+    check_page_size(limit)
+    try:
+        client = get_milvus_client()
+        # 只读取主键大于游标的一页，不需要读取全部主键
+        page, has_more = read_loaded(client, lambda: query_page(
+            client, COLLECTION_NAME, after=cursor, limit=limit, filter=gallery_filter(representatives),
+            output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME],
+            vector_field=None if vectors == VECTORS_NONE else EMBEDDING_FIELD_NAME,
+            id_field=ID_FIELD_NAME,
+        ))
+        layout = get_layout(layout_key(representatives))
+        if not layout.covers(page.ids):
+            # 本页有布局中还没有的人脸，与完整的人脸库同步一次
+            gallery = read_loaded(client, lambda: get_gallery(client, COLLECTION_NAME,
+                                                              gallery_filter(representatives)))
+            layout = get_layout(layout_key(representatives), gallery)
+        positions = layout.coordinates(page.ids)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取人脸节点失败: {str(e)}")
+
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    image_paths = page.columns[PATH_FIELD_NAME]
+    items = build_nodes(
+        page.ids, page.columns[NAME_FIELD_NAME], image_paths,
+        [image_to_base64(image_path) for image_path in image_paths],
+        page.vectors, vectors, binary=(media_type == MSGPACK_MEDIA_TYPE), positions=positions,
+    )
+    next_cursor = int(page.ids[-1]) if has_more else None
+    with stage("serialize"):
+        content = serialize({"items": items, "next_cursor": next_cursor}, media_type)
+    return Response(content=content, media_type=media_type)
+
+
+@app.get("/face-graph/edges")
+@profiled
+def get_face_graph_edges(request: Request, similarity_threshold: float = 0.7,
+                         cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE * 10,
+                         representatives: bool = False):
+    """
+    按游标分页返回边，每页只计算到凑满 limit 条为止
+
+    参数:
+        similarity_threshold: 相似度阈值，翻页时需要保持不变
+        cursor: 上一页返回的 next_cursor，第一页不传
+        limit: 每页边数
+        representatives: 只计算每个簇的代表人脸之间的边
+
+    返回:
+        {"items": [...], "next_cursor": 下一页游标，没有更多数据时为 null}
+    """
+    check_page_size(limit)
+    try:
+        client = get_milvus_client()
+        # 数据版本不变时各页共用同一个人脸库快照，不为每一页重新读取全部向量
+        gallery = read_loaded(client, lambda: get_gallery(client, COLLECTION_NAME, gallery_filter(representatives)))
+        start = parse_edge_cursor(gallery, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"无效的游标: {cursor}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取人脸边失败: {str(e)}")
+
+    items = []
+    next_cursor = None
+    for edge in iter_edges(gallery, similarity_threshold, start=start):
+        if len(items) == limit:
+            # 下一页从本条边开始
+            next_cursor = edge_cursor(gallery, edge[3], edge[4])
+            break
+        items.append(edge)
+
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    with stage("serialize"):
+        content = serialize({"items": build_edges(items), "next_cursor": next_cursor}, media_type)
+    return Response(content=content, media_type=media_type)
+
+@app.post("/face-search", response_model=List[FaceSearchHit])
+@profiled
+def search_faces(body: FaceSearchRequest,
+                 write_token: Optional[str] = Header(None, alias=WRITE_TOKEN_HEADER)):
+    """
+    搜索与查询向量最相似的人脸
+
+    参数:
+        vector: 128 维人脸特征向量
+        top_k: 返回的结果数量
+        representatives: 只搜索每个簇的代表人脸
+        shortlist: 两阶段搜索的候选人数量，0 表示直接搜索全部照片 (需要先建立身份索引，见 face_identity.py)
+        consistency: 一致性级别
+        X-Milvus-Write-Token 请求头: 写入令牌 (例如导入返回的令牌)，搜索等到该写入可见后执行，优先于 consistency
+
+    返回:
+        按余弦相似度从高到低排列的人脸
+    """
+    if len(body.vector) != EMBEDDING_DIM:
+        raise HTTPException(status_code=400, detail=f"vector 的维度应为 {EMBEDDING_DIM}")
+    if not 0 < body.top_k <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"top_k 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+    if not 0 <= body.shortlist <= MAX_SHORTLIST:
+        raise HTTPException(status_code=400, detail=f"shortlist 必须在 0 到 {MAX_SHORTLIST} 之间")
+    options, fresh = consistency_options(body.consistency, write_token)
+    # 要求读到最新数据时不使用搜索结果缓存
+    cache = SearchCache(max_entries=0) if fresh else get_search_cache()
+    client = get_milvus_client()
+    if body.shortlist and not client.has_collection(IDENTITY_COLLECTION_NAME):
+        raise HTTPException(status_code=409, detail="身份索引不存在，请先运行 face_identity.py 或重新导入人脸")
+    search_params = {"metric_type": "COSINE", "params": {"ef": max(128, body.top_k)}}
+    output_fields = [NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME]
+
+    def search():
+        if body.shortlist:
+            return two_stage_search(
+                client, [body.vector], limit=body.top_k, shortlist=body.shortlist,
+                filter=gallery_filter(body.representatives), search_params=search_params,
+                output_fields=output_fields, cache=cache, **options,
+            )
+        # 相同或几乎相同的查询向量直接返回缓存结果，写入后按集合数据版本失效
+        return cache.search(
+            client,
+            collection_name=COLLECTION_NAME,
+            data=[body.vector],
+            anns_field=EMBEDDING_FIELD_NAME,
+            search_params=search_params,
+            limit=body.top_k,
+            filter=gallery_filter(body.representatives),
+            output_fields=output_fields,
+            **options,
+        )
+
+    try:
+        # 两阶段搜索先加载人脸集合再加载身份集合，请求期间两者都不会被换出
+        results = read_loaded(client, search, (COLLECTION_NAME, IDENTITY_COLLECTION_NAME) if body.shortlist
+                              else (COLLECTION_NAME,))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜索人脸失败: {str(e)}")
+
+    return [to_search_hit(hit) for hit in results[0]] if results else []
+
+@app.post("/face-search-federated")
+@profiled
+def search_faces_federated(body: FaceFederatedSearchRequest,
+                           write_token: Optional[str] = Header(None, alias=WRITE_TOKEN_HEADER)):
+    """
+    在多个人脸分片 (集合或分区) 上并发搜索，按相似度合并为全局 top_k
+
+    参数:
+        vector / top_k / representatives / consistency: 与 /face-search 相同
+        shards: 要搜索的分片，默认为 FACE_SHARD_COLLECTIONS 中的全部分片
+        timeout_ms: 每个分片的超时 (毫秒)，超时的分片不等待
+        allow_partial: 部分分片失败时是否仍返回其他分片的结果
+        X-Milvus-Write-Token 请求头: 属于所搜索集合之一的写入令牌；搜索多个集合时按 Strong 读取
+
+    返回:
+        {"matches": [...], "shards": [{"shard", "status", "latency_ms", "hits", "error"}], "partial": bool}，
+        matches 中每个结果比 /face-search 多一个 shard 字段
+    """
+    if len(body.vector) != EMBEDDING_DIM:
+        raise HTTPException(status_code=400, detail=f"vector 的维度应为 {EMBEDDING_DIM}")
+    if not 0 < body.top_k <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"top_k 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+    if body.timeout_ms <= 0:
+        raise HTTPException(status_code=400, detail="timeout_ms 必须大于 0")
+    names = body.shards or SHARD_COLLECTIONS
+    unknown = [name for name in names if name not in SHARD_COLLECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未配置的分片: {', '.join(unknown)}")
+    shards = [Shard.parse(name) for name in names]
+    collection_names = list(dict.fromkeys(shard.collection_name for shard in shards))
+    options, _ = consistency_options(body.consistency, write_token, collection_names)
+    if "guarantee_timestamp" in options and len(collection_names) > 1:
+        # 写入令牌的时间戳只对写入的集合有意义
+        options = {"consistency_level": STRONG}
+
+    client = get_milvus_client()
+    residency = get_residency(client)
+    # 加载后面的分片时不会换出前面已加载的分片
+    with residency.pin(*collection_names):
+        for collection_name in collection_names:
+            try:
+                residency.ensure_loaded(collection_name)
+            except Exception as e:
+                # 不存在或无法加载的分片在搜索时报告为 error
+                logger.warning("加载分片 %s 失败: %s", collection_name, e)
+        try:
+            result = federated_search(
+                shards, [body.vector], EMBEDDING_FIELD_NAME, {"metric_type": "COSINE", "params": {"ef": max(128, body.top_k)}},
+                limit=body.top_k, filter=gallery_filter(body.representatives),
+                output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME], timeout=body.timeout_ms / 1000,
+                # 分片轮流使用连接池中的各个连接，避免并发搜索挤在同一个 gRPC channel 上
+                policy=POLICY_PARTIAL if body.allow_partial else POLICY_ALL, clients=get_pool().clients(), **options,
+            )
+        except FederatedSearchError as e:
+            raise HTTPException(status_code=503, detail={"message": str(e), "shards": [r.as_dict() for r in e.reports]})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"搜索人脸失败: {str(e)}")
+
+    return {
+        "matches": [dict(to_search_hit(hit), shard=hit["shard"]) for hit in result.results[0]],
+        "shards": [report.as_dict() for report in result.shards],
+        "partial": result.partial,
+    }
+
+@app.post("/face-verify")
+@profiled
+def verify_faces(body: FaceVerifyRequest,
+                 write_token: Optional[str] = Header(None, alias=WRITE_TOKEN_HEADER)):
+    """
+    1:N 人脸核验: 用 Milvus 范围搜索返回每个查询向量余弦相似度超过 min_similarity 的全部人脸
+
+    参数:
+        vectors: 一批 128 维人脸特征向量 (最多 MAX_VERIFY_BATCH 个)
+        min_similarity: 余弦相似度阈值
+        limit / offset: 每个查询向量的分页 (offset + limit 不超过 16384)
+        representatives: 只在每个簇的代表人脸中核验
+        consistency / X-Milvus-Write-Token 请求头: 与 /face-search 相同
+
+    返回:
+        {"results": [{"matches": [...], "next_offset": 下一页的 offset，没有更多结果时为 null}]}，与 vectors 按顺序对应
+    """
+    if not 0 < len(body.vectors) <= MAX_VERIFY_BATCH:
+        raise HTTPException(status_code=400, detail=f"vectors 的数量必须在 1 到 {MAX_VERIFY_BATCH} 之间")
+    if any(len(vector) != EMBEDDING_DIM for vector in body.vectors):
+        raise HTTPException(status_code=400, detail=f"vector 的维度应为 {EMBEDDING_DIM}")
+    if body.limit <= 0 or body.offset < 0 or body.offset + body.limit > MAX_TOPK:
+        raise HTTPException(status_code=400, detail=f"limit 必须大于 0，且 offset + limit 不能超过 {MAX_TOPK}")
+    if not -1.0 <= body.min_similarity < 1.0:
+        raise HTTPException(status_code=400, detail="min_similarity 必须在 -1 到 1 之间")
+    options, _ = consistency_options(body.consistency, write_token)
+    try:
+        client = get_milvus_client()
+        results = read_loaded(client, lambda: range_search(
+            client, COLLECTION_NAME, body.vectors, EMBEDDING_FIELD_NAME,
+            range_search_params("COSINE", min_similarity=body.min_similarity),
+            limit=body.limit, offset=body.offset, filter=gallery_filter(body.representatives),
+            output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME], **options,
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"人脸核验失败: {str(e)}")
+
+    return {"results": [{
+        "matches": [to_search_hit(hit) for hit in hits],
+        "next_offset": body.offset + len(hits)
+        if len(hits) == body.limit and body.offset + 2 * body.limit <= MAX_TOPK else None,
+    } for hits in results]}
+
+
+def to_search_hit(hit):
+    """把搜索结果转换为 FaceSearchHit 的字段"""
+    entity = hit["entity"]
+    cluster_id = entity.get(CLUSTER_FIELD_NAME)
+    return {
+        "id": str(hit["id"]),
+        "name": entity.get(NAME_FIELD_NAME),
+        "image_path": entity.get(PATH_FIELD_NAME),
+        "cluster_id": str(cluster_id) if cluster_id is not None else None,
+        "similarity": float(hit["distance"]),
+    }
+
 # 如果直接运行此文件
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸聚类与去重任务
+用 HNSW 索引为每张人脸搜索 k 个近邻，把余弦相似度不低于阈值的近邻对用并查集合并为簇，
+避免 get_face_graph 那样的 O(n²) 两两比较。
+
+每个簇选出一张代表人脸 (与簇中心最接近的一张)，簇内所有人脸的 cluster_id 写为代表人脸的主键，
+因此 "id == cluster_id" 的行就是代表人脸 (face_config.REPRESENTATIVES_FILTER)。
+代表人脸之后被删除或替换时，face_vectorization 调用 reassign_representatives 从剩余成员中重新选出代表人脸，
+该簇不会在只看代表人脸的搜索和人脸图中消失；新增的照片不属于任何簇，需要时重新运行本脚本。
+加 --collapse 时删除非代表人脸，只保留每个簇的一张。
+
+用法:
+    python face_cluster.py --threshold 0.95 --neighbors 16
+    python face_cluster.py --dry-run
+    python face_cluster.py --collapse
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+# 配置常量与 sys.path 设置 (共享的 Milvus 模块位于上级目录 src/)
+from face_config import (
+    COLLECTION_NAME, IDENTITY_COLLECTION_NAME,
+    ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME, CLUSTER_FIELD_NAME,
+)
+from pymilvus import DataType
+from milvus_connection import get_client, get_pool, close_pool
+from milvus_reader import read_all
+from milvus_cache import bump_version
+from milvus_consistency import STRONG
+from milvus_wait import wait_for_loaded
+from face_identity import update_identities
+
+# 余弦相似度不低于该值的两张人脸视为同一个人的近重复照片
+DEFAULT_THRESHOLD = 0.95
+# 每张人脸搜索的近邻数量 (不含自身)
+DEFAULT_NEIGHBORS = 16
+# 每次搜索请求的查询向量数量
+SEARCH_BATCH_SIZE = 256
+# 每次 upsert / delete 的实体数量
+WRITE_BATCH_SIZE = 1000
+
+
+@dataclass
+class ClusterReport:
+    """一次聚类任务的统计"""
+    faces: int = 0
+    clusters: int = 0
+    duplicate_faces: int = 0
+    largest_cluster: int = 0
+    updated: int = 0
+    deleted: int = 0
+    search_seconds: float = 0.0
+    write_seconds: float = 0.0
+
+
+class UnionFind:
+    """按行号的并查集 (路径压缩 + 按大小合并)"""
+
+    def __init__(self, size):
+        self.parent = np.arange(size)
+        self.size = np.ones(size, dtype=np.int64)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+    def labels(self):
+        return np.array([self.find(i) for i in range(len(self.parent))])
+
+
+def ensure_cluster_field(client, collection_name=COLLECTION_NAME):
+    """
+    确保集合中有 cluster_id 字段
+    旧版本创建的集合没有该字段时尝试在线添加 (需要服务端支持 add_collection_field)
+    """
+    description = client.describe_collection(collection_name=collection_name)
+    if any(f["name"] == CLUSTER_FIELD_NAME for f in description["fields"]):
+        return
+    try:
+        client.add_collection_field(
+            collection_name=collection_name, field_name=CLUSTER_FIELD_NAME,
+            data_type=DataType.INT64, nullable=True,
+        )
+    except Exception as e:
+        raise RuntimeError(
+            f"集合 '{collection_name}' 没有 {CLUSTER_FIELD_NAME} 字段且无法在线添加 ({e})，"
+            f"请重新运行 face_vectorization.py 创建集合"
+        ) from e
+
+
+def search_neighbors(clients, collection_name, vectors, neighbors, ef=None):
+    """
+    用向量索引为每个向量搜索近邻，分批在多个连接上并行执行
+
+    返回:
+        (ids, similarities): 均为 (n, neighbors + 1) 的矩阵，结果不足时主键为 -1
+    """
+    limit = neighbors + 1  # 结果中包含自身
+    search_params = {"metric_type": "COSINE", "params": {"ef": max(ef or 0, limit * 2, 64)}}
+    ids = np.full((len(vectors), limit), -1, dtype=np.int64)
+    similarities = np.zeros((len(vectors), limit), dtype=np.float32)
+
+    def search(batch_index):
+        start = batch_index * SEARCH_BATCH_SIZE
+        batch = vectors[start:start + SEARCH_BATCH_SIZE]
+        results = clients[batch_index % len(clients)].search(
+            collection_name=collection_name,
+            data=batch.tolist(),
+            anns_field=EMBEDDING_FIELD_NAME,
+            search_params=search_params,
+            limit=limit,
+            output_fields=[],
+        )
+        for row, hits in enumerate(results):
+            for col, hit in enumerate(hits):
+                ids[start + row, col] = hit["id"]
+                similarities[start + row, col] = hit["distance"]
+
+    num_batches = (len(vectors) + SEARCH_BATCH_SIZE - 1) // SEARCH_BATCH_SIZE
+    with ThreadPoolExecutor(max_workers=max(1, min(num_batches, len(clients)))) as executor:
+        list(executor.map(search, range(num_batches)))
+    return ids, similarities
+
+
+def cluster_faces(face_ids, vectors, neighbor_ids, neighbor_similarities, threshold):
+    """
+    根据近邻列表聚类
+
+    参数:
+        face_ids: (n,) 主键
+        vectors: (n, dim) L2 归一化向量
+        neighbor_ids / neighbor_similarities: search_neighbors 的结果
+        threshold: 余弦相似度阈值
+
+    返回:
+        (n,) 每张人脸的 cluster_id (代表人脸的主键)
+    """
+    row_of = {face_id: row for row, face_id in enumerate(face_ids.tolist())}
+    union_find = UnionFind(len(face_ids))
+    rows, cols = np.nonzero(neighbor_similarities >= threshold)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        other = row_of.get(int(neighbor_ids[row, col]))
+        if other is not None and other != row:
+            union_find.union(row, other)
+
+    labels = union_find.labels()
+    cluster_ids = np.empty(len(face_ids), dtype=np.int64)
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    for members in np.split(order, boundaries):
+        if len(members) == 1:
+            cluster_ids[members] = face_ids[members]
+            continue
+        # 代表人脸: 与簇中心 (平均向量) 余弦相似度最高的一张
+        centroid = vectors[members].mean(axis=0)
+        representative = members[int(np.argmax(vectors[members] @ centroid))]
+        cluster_ids[members] = face_ids[representative]
+    return cluster_ids
+
+
+def write_cluster_ids(client, collection_name, face_ids, cluster_ids, faces):
+    """
+    把 cluster_id 写回集合 (只写有变化的行)
+    优先使用部分更新 (只传主键和 cluster_id)，服务端不支持时退回到整行 upsert
+
+    返回:
+        int: 写入的行数
+    """
+    current = faces.columns[CLUSTER_FIELD_NAME]
+    changed = [i for i in range(len(face_ids)) if current[i] != int(cluster_ids[i])]
+    for start in range(0, len(changed), WRITE_BATCH_SIZE):
+        rows = changed[start:start + WRITE_BATCH_SIZE]
+        partial = [{ID_FIELD_NAME: int(face_ids[i]), CLUSTER_FIELD_NAME: int(cluster_ids[i])} for i in rows]
+        try:
+            client.upsert(collection_name=collection_name, data=partial, partial_update=True)
+        except Exception:
+            full = [{
+                ID_FIELD_NAME: int(face_ids[i]),
+                NAME_FIELD_NAME: faces.columns[NAME_FIELD_NAME][i],
+                PATH_FIELD_NAME: faces.columns[PATH_FIELD_NAME][i],
+                EMBEDDING_FIELD_NAME: faces.vectors[i],
+                CLUSTER_FIELD_NAME: int(cluster_ids[i]),
+            } for i in rows]
+            client.upsert(collection_name=collection_name, data=full)
+    return len(changed)
+
+
+def reassign_representatives(client, removed, collection_name=COLLECTION_NAME):
+    """
+    为代表人脸已被删除的簇重新选出代表人脸 (剩余成员中与簇中心最接近的一张)，并改写成员的 cluster_id
+
+    参数:
+        removed: 已删除的行 (RecordBatch，包含 cluster_id 列)
+
+    返回:
+        int: 改写 cluster_id 的人脸数量
+    """
+    clusters = removed.columns.get(CLUSTER_FIELD_NAME) or []
+    orphaned = sorted({int(face_id) for face_id, cluster_id in zip(removed.ids.tolist(), clusters)
+                       if cluster_id == face_id})
+    if not orphaned:
+        return 0
+    members = read_all(
+        client, collection_name, filter=f"{CLUSTER_FIELD_NAME} in {orphaned}",
+        output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME],
+        vector_field=EMBEDDING_FIELD_NAME, id_field=ID_FIELD_NAME, consistency_level=STRONG,
+    )
+    if not len(members):
+        return 0
+    norms = np.linalg.norm(members.vectors, axis=1, keepdims=True)
+    vectors = members.vectors / np.where(norms == 0, 1, norms)
+    old_ids = np.array(members.columns[CLUSTER_FIELD_NAME], dtype=np.int64)
+    cluster_ids = old_ids.copy()
+    for old_id in np.unique(old_ids):
+        rows = np.flatnonzero(old_ids == old_id)
+        # 与 cluster_faces 相同的规则: 与簇中心 (平均向量) 余弦相似度最高的一张
+        centroid = vectors[rows].mean(axis=0)
+        cluster_ids[rows] = members.ids[rows[int(np.argmax(vectors[rows] @ centroid))]]
+    updated = write_cluster_ids(client, collection_name, members.ids, cluster_ids, members)
+    bump_version(client, collection_name)
+    return updated
+
+
+def collapse_duplicates(client, collection_name, face_ids, cluster_ids):
+    """
+    删除非代表人脸，每个簇只保留代表人脸
+
+    返回:
+        int: 删除的行数
+    """
+    duplicates = face_ids[face_ids != cluster_ids].tolist()
+    for start in range(0, len(duplicates), WRITE_BATCH_SIZE):
+        client.delete(collection_name=collection_name, ids=duplicates[start:start + WRITE_BATCH_SIZE])
+    return len(duplicates)
+
+
+def run(client, collection_name=COLLECTION_NAME, threshold=DEFAULT_THRESHOLD, neighbors=DEFAULT_NEIGHBORS,
+        collapse=False, dry_run=False, clients=None):
+    """
+    执行一次聚类任务
+
+    参数:
+        client: MilvusClient
+        collection_name: 人脸集合名称
+        threshold: 余弦相似度阈值
+        neighbors: 每张人脸搜索的近邻数量
+        collapse: 是否删除非代表人脸
+        dry_run: 只计算并返回统计，不写回集合
+        clients: 并行搜索使用的连接列表，默认只用 client
+
+    返回:
+        ClusterReport
+    """
+    report = ClusterReport()
+    ensure_cluster_field(client, collection_name)
+    client.load_collection(collection_name=collection_name, repeatedly_load=False)
+    wait_for_loaded(client, collection_name)
+
+    faces = read_all(
+        client, collection_name,
+        output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME],
+        vector_field=EMBEDDING_FIELD_NAME, id_field=ID_FIELD_NAME,
+    )
+    report.faces = len(faces)
+    if not len(faces):
+        return report
+    norms = np.linalg.norm(faces.vectors, axis=1, keepdims=True)
+    vectors = faces.vectors / np.where(norms == 0, 1, norms)
+
+    start = time.perf_counter()
+    neighbor_ids, neighbor_similarities = search_neighbors(clients or [client], collection_name, vectors, neighbors)
+    report.search_seconds = time.perf_counter() - start
+
+    cluster_ids = cluster_faces(faces.ids, vectors, neighbor_ids, neighbor_similarities, threshold)
+    _, sizes = np.unique(cluster_ids, return_counts=True)
+    report.clusters = len(sizes)
+    report.duplicate_faces = int(np.sum(faces.ids != cluster_ids))
+    report.largest_cluster = int(sizes.max())
+    if dry_run:
+        return report
+
+    start = time.perf_counter()
+    report.updated = write_cluster_ids(client, collection_name, faces.ids, cluster_ids, faces)
+    if collapse:
+        report.deleted = collapse_duplicates(client, collection_name, faces.ids, cluster_ids)
+        # 从身份中心向量中减去被删除的照片
+        if collection_name == COLLECTION_NAME and client.has_collection(IDENTITY_COLLECTION_NAME):
+            duplicates = faces.ids != cluster_ids
+            update_identities(client, [name for name, duplicate in zip(faces.columns[NAME_FIELD_NAME], duplicates)
+                                       if duplicate], faces.vectors[duplicates], remove=True)
+    client.flush(collection_name=collection_name)
+    # cluster_id 已变化 (或删除了人脸)，使搜索缓存失效
+    bump_version(client, collection_name)
+    report.write_seconds = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="人脸集合名称")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="余弦相似度阈值")
+    parser.add_argument("--neighbors", type=int, default=DEFAULT_NEIGHBORS, help="每张人脸搜索的近邻数量")
+    parser.add_argument("--collapse", action="store_true", help="删除非代表人脸")
+    parser.add_argument("--dry-run", action="store_true", help="只输出统计，不写回集合")
+    args = parser.parse_args()
+
+    client = get_client()
+    try:
+        report = run(client, args.collection, threshold=args.threshold, neighbors=args.neighbors,
+                     collapse=args.collapse, dry_run=args.dry_run, clients=get_pool().clients())
+    finally:
+        close_pool()
+
+    print(f"人脸 {report.faces} 张，聚为 {report.clusters} 个簇，其中近重复照片 {report.duplicate_faces} 张，"
+          f"最大的簇 {report.largest_cluster} 张")
+    print(f"近邻搜索 {report.search_seconds:.2f}s，写回 {report.write_seconds:.2f}s，"
+          f"更新 {report.updated} 行，删除 {report.deleted} 行")
+
+
+if __name__ == "__main__":
+    main()
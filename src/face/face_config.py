@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸模块配置
+只包含常量，不导入 OpenCV / face_recognition 等重量级依赖，
+API 服务只需要本模块即可知道集合和字段名称。
+"""
+
+import os
+import sys
+
+# 共享的 Milvus 模块 (milvus_connection 等) 位于上级目录 src/
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# 配置参数
+COLLECTION_NAME = "face_embeddings_collection"
+
+# 字段名配置
+ID_FIELD_NAME = "id"
+NAME_FIELD_NAME = "name"
+PATH_FIELD_NAME = "image_path"
+EMBEDDING_FIELD_NAME = "embedding"
+IMAGE_FIELD_NAME = "image_data"
+# 聚类结果: 同一个人的近重复照片共用一个 cluster_id，取值为该簇代表人脸的主键 (见 face_cluster.py)
+# 可为空，尚未聚类的人脸为 null
+CLUSTER_FIELD_NAME = "cluster_id"
+
+# 向量索引名称
+INDEX_NAME = "face_embeddings_index"
+# name 字段的标量索引 (人名取值很多，使用 INVERTED)
+NAME_INDEX_NAME = "face_name_index"
+# cluster_id 字段的标量索引
+CLUSTER_INDEX_NAME = "face_cluster_index"
+
+# 只保留每个簇的代表人脸 (以及尚未聚类的人脸) 的过滤表达式
+REPRESENTATIVES_FILTER = f"{CLUSTER_FIELD_NAME} is null or {ID_FIELD_NAME} == {CLUSTER_FIELD_NAME}"
+
+# 身份索引: 每个人名一行，保存该人所有照片 (L2 归一化后) 的向量和、照片数量和归一化的中心向量 (见 face_identity.py)
+IDENTITY_COLLECTION_NAME = "face_identities_collection"
+CENTROID_FIELD_NAME = "centroid"
+EMBEDDING_SUM_FIELD_NAME = "embedding_sum"
+PHOTO_COUNT_FIELD_NAME = "photo_count"
+IDENTITY_INDEX_NAME = "face_identities_index"
+
+# /face-search-federated 可以搜索的人脸分片 (按站点、租户或时间拆分的集合，Schema 与人脸集合相同)
+# 环境变量 FACE_SHARD_COLLECTIONS 以逗号分隔，"集合:分区1|分区2" 表示只搜索其中的分区；默认只有 COLLECTION_NAME
+SHARD_COLLECTIONS = [
+    name.strip().replace("|", ",") for name in os.environ.get("FACE_SHARD_COLLECTIONS", COLLECTION_NAME).split(",")
+    if name.strip()
+]
+
+# 视频人脸轨迹: 每条轨迹 (同一个人脸在连续帧中的位置) 一行，保存质量最高的一帧的特征向量 (见 face_video.py)
+VIDEO_COLLECTION_NAME = "face_video_tracks_collection"
+SOURCE_FIELD_NAME = "source"
+TRACK_FIELD_NAME = "track_id"
+# 轨迹的开始、结束时间和特征向量所在帧的时间 (毫秒): 视频文件为相对视频开头的位置，摄像头和网络流为 unix 时间
+START_MS_FIELD_NAME = "start_ms"
+END_MS_FIELD_NAME = "end_ms"
+BEST_MS_FIELD_NAME = "best_ms"
+QUALITY_FIELD_NAME = "quality"
+VIDEO_INDEX_NAME = "face_video_tracks_index"
+VIDEO_SOURCE_INDEX_NAME = "face_video_source_index"
+
+# 将 name 声明为 Partition Key: 按人名过滤的搜索和查询只访问该人名所在的分区
+NAME_AS_PARTITION_KEY = True
+# Partition Key 使用的分区数量
+NUM_PARTITIONS = 64
+
+# 向量维度 (face_recognition生成的面部特征向量是128维)
+EMBEDDING_DIM = 128
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸图计算模块
+按分块 (tile) 计算人脸之间的相似度，边以生成器的形式逐块产出:
+- 每次只计算 row_tile x col_tile 的相似度矩阵，内存占用与人脸数量无关
+- 调用方可以边计算边发送 (NDJSON 流) 或按游标分页，服务端不需要保存完整的边列表
+
+边按 (source 行号, target 行号) 的行优先顺序产出，且只产出 source < target 的上三角部分，
+因此可以用最后一条边的位置作为分页游标继续计算。
+
+iter_range_edges 改用服务端范围搜索: 每张人脸只取回相似度超过阈值的近邻，不计算 n x n 相似度矩阵，
+产出顺序与 iter_edges 相同；结果来自向量索引，在近似索引上可能漏掉少量边。
+
+get_gallery 按集合的数据版本 (milvus_cache.bump_version) 缓存人脸库快照，分页读取边时不必每页都读取全部向量。
+"""
+
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from face_config import ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME, COLLECTION_NAME
+from milvus_reader import read_all
+from milvus_cache import get_search_cache
+from milvus_range import range_search_params, range_search_all
+from metrics import stage
+
+# 前端展示的相似度 = (余弦相似度 - SIMILARITY_OFFSET) * SIMILARITY_SCALE
+# 同一个人的人脸余弦相似度通常在 0.8 以上，变换后把这一段放大到 0~1
+SIMILARITY_OFFSET = 0.8
+SIMILARITY_SCALE = 5.0
+
+DEFAULT_ROW_TILE = 256
+DEFAULT_COL_TILE = 4096
+
+
+@dataclass
+class Gallery:
+    """按主键排序的人脸库快照"""
+    ids: np.ndarray
+    names: list
+    image_paths: list
+    # 原始 float32 向量 (返回给前端)
+    vectors: np.ndarray
+    # L2 归一化后的向量，点积即为余弦相似度
+    unit_vectors: np.ndarray
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def to_display_similarity(cosine):
+    """余弦相似度转换为前端展示的相似度"""
+    return (cosine - SIMILARITY_OFFSET) * SIMILARITY_SCALE
+
+
+def to_cosine(display_similarity):
+    """前端展示的相似度阈值转换为余弦相似度阈值"""
+    return display_similarity / SIMILARITY_SCALE + SIMILARITY_OFFSET
+
+
+def normalize(vectors):
+    """按行 L2 归一化 (零向量保持为零)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def load_gallery(client, collection_name=COLLECTION_NAME, filter=""):
+    """
+    流式读取全部人脸并按主键排序
+
+    参数:
+        filter: 过滤表达式，例如 face_config.REPRESENTATIVES_FILTER 只读取每个簇的代表人脸
+
+    返回:
+        Gallery
+    """
+    with stage("load_gallery"):
+        faces = read_all(
+            client,
+            collection_name,
+            filter=filter,
+            output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME],
+            vector_field=EMBEDDING_FIELD_NAME,
+            id_field=ID_FIELD_NAME,
+        )
+    if len(faces) == 0:
+        empty = np.empty((0, 0), dtype=np.float32)
+        return Gallery(ids=np.array([], dtype=np.int64), names=[], image_paths=[],
+                       vectors=empty, unit_vectors=empty)
+    order = np.argsort(faces.ids, kind="stable")
+    vectors = faces.vectors[order]
+    return Gallery(
+        ids=faces.ids[order],
+        names=[faces.columns[NAME_FIELD_NAME][i] for i in order],
+        image_paths=[faces.columns[PATH_FIELD_NAME][i] for i in order],
+        vectors=vectors,
+        unit_vectors=normalize(vectors).astype(np.float32, copy=False),
+    )
+
+
+# (集合, 过滤表达式) -> (数据版本, Gallery)
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_gallery(client, collection_name=COLLECTION_NAME, filter=""):
+    """
+    返回人脸库快照: 集合的数据版本不变时复用上一次 load_gallery 的结果
+    版本按 SearchCache 的间隔读取，其他进程写入后最多在该间隔内返回旧快照；快照不要修改
+
+    返回:
+        Gallery
+    """
+    # 先读取版本再读取数据: 两者之间发生写入时，下一次请求看到新版本会重新读取
+    version = get_search_cache().version(client, collection_name)
+    key = (collection_name, filter)
+    with _snapshots_lock:
+        cached = _snapshots.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    gallery = load_gallery(client, collection_name, filter)
+    with _snapshots_lock:
+        _snapshots[key] = (version, gallery)
+    return gallery
+
+
+def iter_edge_tiles(vectors, threshold, start=(0, 0), row_tile=DEFAULT_ROW_TILE, col_tile=DEFAULT_COL_TILE):
+    """
+    按行块计算相似度超过阈值的边
+
+    参数:
+        vectors: L2 归一化的 (n, dim) float32 矩阵
+        threshold: 展示相似度阈值 (与 to_display_similarity 的结果比较)
+        start: 起始位置 (行号, 列号)，只产出行优先顺序下不早于该位置的边
+        row_tile / col_tile: 每次计算的相似度矩阵大小
+
+    返回:
+        迭代器，每个元素为一个行块内的边 (rows, cols, similarities)，按行优先排序
+    """
+    n = len(vectors)
+    cosine_threshold = to_cosine(threshold)
+    start_row, start_col = start
+    for r0 in range(start_row, n, row_tile):
+        r1 = min(r0 + row_tile, n)
+        block = vectors[r0:r1]
+        hit_rows, hit_cols, hit_sims = [], [], []
+        # 只统计计算耗时，不包括调用方处理已产出的边的时间
+        with stage("similarity"):
+            # 上三角: 只需要计算列号大于本块第一行的部分
+            for c0 in range(r0 + 1, n, col_tile):
+                c1 = min(c0 + col_tile, n)
+                cosine = block @ vectors[c0:c1].T
+                rows = np.arange(r0, r1)[:, None]
+                cols = np.arange(c0, c1)[None, :]
+                mask = (cosine >= cosine_threshold) & (cols > rows)
+                if r0 == start_row:
+                    # 起始行中位于起始列之前的边已经产出过
+                    mask &= (rows > start_row) | (cols >= start_col)
+                i, j = np.nonzero(mask)
+                if len(i):
+                    hit_rows.append(i + r0)
+                    hit_cols.append(j + c0)
+                    hit_sims.append(cosine[i, j])
+        if not hit_rows:
+            continue
+        rows = np.concatenate(hit_rows)
+        cols = np.concatenate(hit_cols)
+        sims = np.concatenate(hit_sims)
+        order = np.lexsort((cols, rows))
+        yield rows[order], cols[order], to_display_similarity(sims[order].astype(np.float64))
+
+
+def iter_edges(gallery, threshold, start=(0, 0), **tile_kwargs):
+    """
+    逐条产出边 (source_id, target_id, similarity, 行号, 列号)
+    行号和列号用于生成分页游标
+    """
+    for rows, cols, sims in iter_edge_tiles(gallery.unit_vectors, threshold, start=start, **tile_kwargs):
+        sources = gallery.ids[rows].tolist()
+        targets = gallery.ids[cols].tolist()
+        for source, target, similarity, row, col in zip(sources, targets, sims.tolist(),
+                                                        rows.tolist(), cols.tolist()):
+            yield source, target, similarity, row, col
+
+
+def iter_range_edges(client, gallery, threshold, collection_name=COLLECTION_NAME, filter="",
+                     batch_size=DEFAULT_ROW_TILE):
+    """
+    用服务端范围搜索逐条产出边 (source_id, target_id, similarity, 行号, 列号)
+
+    参数:
+        client: MilvusClient
+        gallery: load_gallery 的结果 (使用相同的 filter 读取)
+        threshold: 展示相似度阈值
+        filter: 人脸库的过滤表达式，近邻只在过滤后的人脸中搜索
+        batch_size: 每次范围搜索的查询向量数量
+    """
+    row_of = {face_id: row for row, face_id in enumerate(gallery.ids.tolist())}
+    search_params = range_search_params("COSINE", min_similarity=to_cosine(threshold))
+    for r0 in range(0, len(gallery), batch_size):
+        with stage("range_search"):
+            results = range_search_all(client, collection_name, gallery.unit_vectors[r0:r0 + batch_size].tolist(),
+                                       EMBEDDING_FIELD_NAME, search_params, filter=filter)
+        for i, hits in enumerate(results):
+            row = r0 + i
+            # 只保留上三角 (source 行号 < target 行号)，并按列号排序，与 iter_edges 的顺序一致
+            neighbors = sorted((row_of[hit["id"]], hit["distance"]) for hit in hits
+                               if row_of.get(hit["id"], -1) > row)
+            for col, cosine in neighbors:
+                yield int(gallery.ids[row]), int(gallery.ids[col]), to_display_similarity(float(cosine)), row, col
+
+
+def edge_cursor(gallery, row, col):
+    """
+    把下一条边的位置 (行号, 列号) 编码为游标 "source_id:target_id"
+    使用主键而不是行号，两次请求之间集合发生变化时仍可以继续
+    """
+    target = gallery.ids[col] if col < len(gallery) else "end"
+    return f"{gallery.ids[row]}:{target}"
+
+
+def parse_edge_cursor(gallery, cursor):
+    """把游标还原为 (行号, 列号)"""
+    if not cursor:
+        return 0, 0
+    source, target = cursor.split(":")
+    source = int(source)
+    row = int(np.searchsorted(gallery.ids, source))
+    if row >= len(gallery) or gallery.ids[row] != source:
+        # 起始人脸已被删除，从下一个主键开始
+        return row, 0
+    if target == "end":
+        return row + 1, 0
+    return row, int(np.searchsorted(gallery.ids, int(target)))
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸身份索引与两阶段搜索
+人脸集合每张照片一行，1:N 搜索要扫描所有人的所有照片。身份索引在一个小的辅助集合中为每个人名保存一行:
+- embedding_sum: 该人所有照片 L2 归一化后的向量和 (ARRAY<FLOAT>，增量更新时直接累加)
+- photo_count:   照片数量
+- centroid:      embedding_sum 归一化后的中心向量 (HNSW / COSINE 索引)
+
+两阶段搜索先在中心向量中找出最相近的 shortlist 个人，再用 name in [...] 过滤只在这些人的照片中重排。
+name 是人脸集合的 Partition Key，第二阶段只访问这些人名所在的分区。
+同一个人的照片越多，第一阶段要比较的行数相对照片数量越少；
+真正匹配的人不在 shortlist 中时会被漏掉，shortlist 越大越接近逐张照片搜索的结果。
+
+导入 (face_vectorization.py) 时用 replace_identities 按本次导入的全部照片重写身份索引，
+之后的增量写入调用 update_identities；删除或合并照片后可以运行本脚本从人脸集合重新计算:
+    python face_identity.py
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+# 配置常量与 sys.path 设置 (共享的 Milvus 模块位于上级目录 src/)
+from face_config import (
+    COLLECTION_NAME, IDENTITY_COLLECTION_NAME, IDENTITY_INDEX_NAME,
+    ID_FIELD_NAME, NAME_FIELD_NAME, EMBEDDING_FIELD_NAME,
+    CENTROID_FIELD_NAME, EMBEDDING_SUM_FIELD_NAME, PHOTO_COUNT_FIELD_NAME, EMBEDDING_DIM,
+)
+from pymilvus import FieldSchema, CollectionSchema, DataType
+from milvus_connection import get_client, close_pool
+from milvus_reader import read_all
+from milvus_index import build_index_async
+from milvus_cache import get_search_cache, bump_version, plain_hit
+from milvus_consistency import STRONG
+from milvus_wait import wait_for_loaded
+from metrics import stage
+
+# 第一阶段默认保留的候选人数量
+DEFAULT_SHORTLIST = 20
+# 第一阶段候选人数量的上限 (第二阶段的过滤表达式中包含全部候选人名)
+MAX_SHORTLIST = 1000
+# 每次 upsert / get / delete 的身份数量
+WRITE_BATCH_SIZE = 1000
+
+
+def build_identity_schema():
+    """构建身份集合的 Schema (人名为主键)"""
+    fields = [
+        FieldSchema(name=NAME_FIELD_NAME, dtype=DataType.VARCHAR, max_length=256, is_primary=True),
+        FieldSchema(name=PHOTO_COUNT_FIELD_NAME, dtype=DataType.INT64),
+        FieldSchema(name=EMBEDDING_SUM_FIELD_NAME, dtype=DataType.ARRAY, element_type=DataType.FLOAT,
+                    max_capacity=EMBEDDING_DIM),
+        FieldSchema(name=CENTROID_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM),
+    ]
+    return CollectionSchema(fields=fields, description="人脸身份中心向量集合")
+
+
+def build_identity_index_params(client):
+    """构建中心向量的索引参数 (与人脸集合相同的 HNSW / COSINE)"""
+    index_params = client.prepare_index_params()
+    index_params.add_index(
+        field_name=CENTROID_FIELD_NAME,
+        index_type="HNSW",
+        metric_type="COSINE",
+        params={"M": 16, "efConstruction": 200},
+        index_name=IDENTITY_INDEX_NAME,
+    )
+    return index_params
+
+
+def ensure_identity_collection(client, collection_name=IDENTITY_COLLECTION_NAME):
+    """
+    身份集合不存在时创建、建索引并加载
+
+    返回:
+        bool: 是否新建了集合
+    """
+    if client.has_collection(collection_name):
+        return False
+    client.create_collection(collection_name=collection_name, schema=build_identity_schema())
+    build_index_async(client, collection_name, build_identity_index_params(client), IDENTITY_INDEX_NAME,
+                      on_progress=None).wait()
+    client.load_collection(collection_name=collection_name)
+    wait_for_loaded(client, collection_name)
+    return True
+
+
+def accumulate(names, vectors):
+    """
+    按人名累加 L2 归一化后的向量
+
+    返回:
+        {name: (向量和 (float64), 照片数量)}
+    """
+    if not len(names):
+        return {}
+    vectors = np.asarray(vectors, dtype=np.float64).reshape(len(names), EMBEDDING_DIM)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit_vectors = vectors / np.where(norms == 0, 1, norms)
+    unique_names, inverse = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+    sums = np.zeros((len(unique_names), EMBEDDING_DIM))
+    np.add.at(sums, inverse.reshape(-1), unit_vectors)
+    counts = np.bincount(inverse.reshape(-1), minlength=len(unique_names))
+    return {name: (sums[i], int(counts[i])) for i, name in enumerate(unique_names.tolist())}
+
+
+def _identity_row(name, total, count):
+    norm = np.linalg.norm(total)
+    return {
+        NAME_FIELD_NAME: name,
+        PHOTO_COUNT_FIELD_NAME: count,
+        EMBEDDING_SUM_FIELD_NAME: total.astype(np.float32).tolist(),
+        CENTROID_FIELD_NAME: (total / (norm or 1.0)).astype(np.float32).tolist(),
+    }
+
+
+def _write_identities(client, collection_name, sums, removed=()):
+    """upsert sums 中的身份并删除 removed 中的人名"""
+    rows = [_identity_row(name, total, count) for name, (total, count) in sums.items()]
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        client.upsert(collection_name=collection_name, data=rows[start:start + WRITE_BATCH_SIZE])
+    removed = list(removed)
+    for start in range(0, len(removed), WRITE_BATCH_SIZE):
+        client.delete(collection_name=collection_name, ids=removed[start:start + WRITE_BATCH_SIZE])
+    # 中心向量已变化，使两阶段搜索第一阶段的缓存失效
+    bump_version(client, collection_name)
+
+
+def update_identities(client, names, vectors, collection_name=IDENTITY_COLLECTION_NAME, remove=False):
+    """
+    增量更新身份索引: 把一批新增 (remove=True 时为删除) 的照片计入对应人名的中心向量
+    读取-累加-写回不是原子的，同一时间只应有一个写入方
+
+    参数:
+        names: 每张照片的人名
+        vectors: 每张照片的特征向量 (不需要预先归一化)
+        remove: 从身份中减去这些照片，照片数量减到 0 的身份被删除
+
+    返回:
+        int: 更新的身份数量
+    """
+    delta = accumulate(names, vectors)
+    if not delta:
+        return 0
+    ensure_identity_collection(client, collection_name)
+    current = {}
+    keys = list(delta)
+    for start in range(0, len(keys), WRITE_BATCH_SIZE):
+        # 读取-累加-写回: 按 Strong 读取，连续两次更新 (例如替换照片时先减后加) 时第二次能读到第一次写入的结果
+        for row in client.get(collection_name=collection_name, ids=keys[start:start + WRITE_BATCH_SIZE],
+                              output_fields=[EMBEDDING_SUM_FIELD_NAME, PHOTO_COUNT_FIELD_NAME],
+                              consistency_level=STRONG):
+            current[row[NAME_FIELD_NAME]] = (np.asarray(row[EMBEDDING_SUM_FIELD_NAME], dtype=np.float64),
+                                             int(row[PHOTO_COUNT_FIELD_NAME]))
+
+    sign = -1 if remove else 1
+    merged, removed = {}, []
+    for name, (total, count) in delta.items():
+        base_total, base_count = current.get(name, (np.zeros(EMBEDDING_DIM), 0))
+        new_count = base_count + sign * count
+        if new_count <= 0:
+            if name in current:
+                removed.append(name)
+            continue
+        merged[name] = (base_total + sign * total, new_count)
+    _write_identities(client, collection_name, merged, removed)
+    return len(delta)
+
+
+def replace_identities(client, names, vectors, collection_name=IDENTITY_COLLECTION_NAME):
+    """
+    按全部照片重写身份索引: 写入每个人名的中心向量，并删除不再出现的人名
+    集合在重写期间保持可搜索
+
+    返回:
+        int: 身份数量
+    """
+    sums = accumulate(names, vectors)
+    if not ensure_identity_collection(client, collection_name):
+        existing = read_all(client, collection_name, output_fields=[], id_field=NAME_FIELD_NAME,
+                            consistency_level=STRONG)
+        stale = [name for name in existing.ids.tolist() if name not in sums]
+    else:
+        stale = []
+    _write_identities(client, collection_name, sums, stale)
+    return len(sums)
+
+
+def rebuild_identities(client, faces_collection=COLLECTION_NAME, collection_name=IDENTITY_COLLECTION_NAME):
+    """
+    从人脸集合重新计算全部身份 (删除、合并照片之后，或身份索引与人脸集合不一致时使用)
+
+    返回:
+        int: 身份数量
+    """
+    client.load_collection(collection_name=faces_collection, repeatedly_load=False)
+    wait_for_loaded(client, faces_collection)
+    faces = read_all(
+        client, faces_collection, output_fields=[NAME_FIELD_NAME],
+        vector_field=EMBEDDING_FIELD_NAME, id_field=ID_FIELD_NAME,
+    )
+    return replace_identities(client, faces.columns.get(NAME_FIELD_NAME, []), faces.vectors, collection_name)
+
+
+def shortlist_filter(names):
+    """只保留 names 中人名的过滤表达式"""
+    return f"{NAME_FIELD_NAME} in {json.dumps(list(names), ensure_ascii=False)}"
+
+
+def two_stage_search(client, data, limit=10, shortlist=DEFAULT_SHORTLIST, filter="", search_params=None,
+                     output_fields=None, collection_name=COLLECTION_NAME,
+                     identity_collection=IDENTITY_COLLECTION_NAME, cache=None, **kwargs):
+    """
+    两阶段人脸搜索: 先按中心向量选出 shortlist 个候选人，再只在他们的照片中搜索
+
+    参数:
+        data: 查询向量列表
+        limit: 每个查询向量返回的照片数量
+        shortlist: 第一阶段保留的候选人数量
+        filter: 人脸集合上的额外过滤表达式 (例如 face_config.REPRESENTATIVES_FILTER)
+        search_params: 第二阶段的搜索参数，默认 COSINE，ef 不小于 limit
+        cache: SearchCache，默认使用进程内共享的缓存
+        kwargs: 两个阶段搜索的其他参数 (例如 milvus_consistency.read_options 的一致性参数)；
+                写入令牌的时间戳只对人脸集合有意义，第一阶段改用 Strong，读到令牌之前已完成的身份更新
+
+    返回:
+        每个查询向量一个结果列表，每个结果为 {"id", "distance", "entity"}，与 client.search 的结果顺序相同
+    """
+    cache = cache or get_search_cache()
+    search_params = search_params or {"metric_type": "COSINE", "params": {"ef": max(128, limit)}}
+    # 刚导入的人在身份集合中的中心向量也必须可见，否则第一阶段就会漏掉他
+    shortlist_options = {"consistency_level": STRONG} if "guarantee_timestamp" in kwargs else kwargs
+    with stage("identity_shortlist"):
+        candidates = cache.search(
+            client, identity_collection, data, limit=shortlist, anns_field=CENTROID_FIELD_NAME,
+            search_params={"metric_type": "COSINE", "params": {"ef": max(64, shortlist)}}, output_fields=[],
+            **shortlist_options,
+        )
+
+    results = []
+    with stage("identity_rerank"):
+        for vector, hits in zip(data, candidates):
+            if not hits:
+                results.append([])
+                continue
+            # 人名排序后过滤表达式稳定，相同的候选人集合可以命中缓存
+            expr = shortlist_filter(sorted(plain_hit(hit)["id"] for hit in hits))
+            if filter:
+                expr = f"({filter}) and {expr}"
+            results.extend(cache.search(
+                client, collection_name, [vector], limit=limit, filter=expr, anns_field=EMBEDDING_FIELD_NAME,
+                search_params=search_params, output_fields=output_fields, **kwargs,
+            ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="人脸集合名称")
+    parser.add_argument("--identity-collection", default=IDENTITY_COLLECTION_NAME, help="身份集合名称")
+    args = parser.parse_args()
+
+    client = get_client()
+    try:
+        start = time.perf_counter()
+        identities = rebuild_identities(client, args.collection, args.identity_collection)
+    finally:
+        close_pool()
+    print(f"身份 {identities} 个，耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
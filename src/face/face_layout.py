@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸图二维布局
+在服务端用 PCA (NumPy SVD) 把人脸向量投影到二维平面，前端直接按坐标绘制，不再运行力导向布局。
+
+布局按集合缓存在进程内:
+- 首次请求时在全部人脸上拟合 PCA
+- 之后新增的人脸用已拟合的投影直接计算坐标，已有人脸的坐标保持不变 (前端画面稳定)
+- 新增人脸超过拟合时数量的 REFIT_FRACTION 后重新拟合，删除的人脸从缓存中移除
+  (集合重建后主键全部变化，同样会触发重新拟合，因此不需要显式清空缓存)
+"""
+
+import threading
+
+import numpy as np
+
+from metrics import stage
+
+# 新增人脸数量超过拟合时数量的该比例后重新拟合
+REFIT_FRACTION = 0.2
+
+
+class Layout:
+    """一个集合的 PCA 布局及其坐标缓存"""
+
+    def __init__(self):
+        self.mean = None
+        # (2, dim) 投影矩阵
+        self.components = None
+        # 把投影坐标缩放到大约 [-1, 1] 的系数 (拟合时确定，增量更新时不变)
+        self.scale = 1.0
+        self.fitted_count = 0
+        self.positions = {}
+
+    def fit(self, ids, vectors):
+        """在全部人脸上重新拟合 PCA 并计算坐标"""
+        self.mean = vectors.mean(axis=0)
+        centered = vectors - self.mean
+        if len(vectors) >= 2:
+            # 前两个右奇异向量即为前两个主成分
+            _, _, vt = np.linalg.svd(centered, full_matrices=False)
+            components = vt[:2]
+        else:
+            components = np.zeros((0, vectors.shape[1]), dtype=vectors.dtype)
+        if len(components) < 2:
+            components = np.vstack([components, np.zeros((2 - len(components), vectors.shape[1]))])
+        self.components = components.astype(np.float32)
+        projected = centered @ self.components.T
+        extent = np.abs(projected).max() if len(projected) else 0.0
+        self.scale = 1.0 / extent if extent > 0 else 1.0
+        self.fitted_count = len(ids)
+        self.positions = dict(zip(ids.tolist(), (projected * self.scale).tolist()))
+
+    def project(self, vectors):
+        """用已拟合的 PCA 计算坐标"""
+        return ((vectors - self.mean) @ self.components.T) * self.scale
+
+    def update(self, ids, vectors):
+        """
+        与当前人脸库同步: 删除已不存在的人脸，为新增人脸计算坐标，必要时重新拟合
+
+        参数:
+            ids: 当前全部人脸的主键
+            vectors: 与 ids 对应的 L2 归一化向量
+        """
+        id_list = ids.tolist()
+        current = set(id_list)
+        for face_id in [face_id for face_id in self.positions if face_id not in current]:
+            del self.positions[face_id]
+
+        new_rows = [i for i, face_id in enumerate(id_list) if face_id not in self.positions]
+        if self.components is None or len(new_rows) > REFIT_FRACTION * max(self.fitted_count, 1):
+            self.fit(ids, vectors)
+            return
+        if new_rows:
+            coords = self.project(vectors[new_rows])
+            for row, xy in zip(new_rows, coords.tolist()):
+                self.positions[id_list[row]] = xy
+
+    def coordinates(self, ids):
+        """返回 ids 对应的 (n, 2) 坐标矩阵，缺少坐标的人脸为 NaN"""
+        coords = np.full((len(ids), 2), np.nan, dtype=np.float32)
+        for i, face_id in enumerate(ids.tolist()):
+            xy = self.positions.get(face_id)
+            if xy is not None:
+                coords[i] = xy
+        return coords
+
+    def covers(self, ids):
+        """ids 是否都已有坐标"""
+        return self.components is not None and all(face_id in self.positions for face_id in ids.tolist())
+
+
+_layouts = {}
+_lock = threading.Lock()
+
+
+def get_layout(collection_name, gallery=None):
+    """
+    返回集合的布局缓存；传入 gallery (face_graph.Gallery) 时先与其同步
+
+    返回:
+        Layout
+    """
+    with _lock:
+        layout = _layouts.setdefault(collection_name, Layout())
+        if gallery is not None and len(gallery):
+            with stage("layout"):
+                layout.update(gallery.ids, gallery.unit_vectors)
+        return layout
@@ -7,32 +7,49 @@
 """
 
 import os
-import numpy as np
-import cv2
-from tqdm import tqdm
 import glob
-import face_recognition
-from pymilvus import (
-    MilvusClient,
-    FieldSchema, CollectionSchema, DataType,
-    connections, Collection, utility
+import logging
+import argparse
+
+# 配置常量与 sys.path 设置 (共享的 Milvus 模块位于上级目录 src/)
+from face_config import (
+    COLLECTION_NAME,
+    ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME, EMBEDDING_FIELD_NAME, CLUSTER_FIELD_NAME,
+    INDEX_NAME, NAME_INDEX_NAME, CLUSTER_INDEX_NAME, NAME_AS_PARTITION_KEY, NUM_PARTITIONS, EMBEDDING_DIM,
+    REPRESENTATIVES_FILTER,
 )
-import time
+from pymilvus import FieldSchema, CollectionSchema, DataType
+from milvus_connection import get_client, get_config
+from milvus_wait import wait_for_dropped, wait_for_loaded
+from milvus_index import build_index_async, tqdm_progress
+from milvus_bulk import bulk_load
+from milvus_cache import deferred_bumps, get_search_cache
+from milvus_range import range_search_params, range_search_all
+from milvus_maintenance import delete_by_filter, key_filter, upsert_by_key
+from milvus_reader import concat_batches
+from face_identity import replace_identities, update_identities, two_stage_search
+from face_cluster import reassign_representatives
+from metrics import configure_logging, stage, RunSummary
+from profiling import profile_run
+
+logger = logging.getLogger(__name__)
+
+# process_images 的运行汇总 (各阶段次数和耗时) 写入该环境变量指定的 JSON 文件
+RUN_SUMMARY_ENV = "FACE_RUN_SUMMARY"
 
-# 配置参数
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19530"
-COLLECTION_NAME = "face_embeddings_collection"
 
-# 字段名配置
-ID_FIELD_NAME = "id"
-NAME_FIELD_NAME = "name"
-PATH_FIELD_NAME = "image_path"
-EMBEDDING_FIELD_NAME = "embedding"
-IMAGE_FIELD_NAME = "image_data"
+def _load_vision():
+    """
+    首次使用时才导入 OpenCV 和 face_recognition (dlib)
+    两者导入耗时长、占用内存多，只导入本模块的调用方 (例如 API 服务) 不需要它们
+
+    返回:
+        (cv2, face_recognition)
+    """
+    import cv2
+    import face_recognition
+    return cv2, face_recognition
 
-# 向量维度 (face_recognition生成的面部特征向量是128维)
-EMBEDDING_DIM = 128
 
 class FaceVectorizer:
     def __init__(self, image_dir="image"):
@@ -49,58 +66,86 @@ class FaceVectorizer:
     def connect_milvus(self):
         """连接到Milvus服务器"""
         try:
-            print(f"正在连接 Milvus ({MILVUS_HOST}:{MILVUS_PORT})...")
-            self.client = MilvusClient(uri=f"http://{MILVUS_HOST}:{MILVUS_PORT}")
-            print("Milvus 连接成功!")
+            logger.info("正在连接 Milvus (%s)...", get_config().uri)
+            # 从共享连接池获取温热连接，同一进程内的多个 FaceVectorizer 复用同一组连接
+            self.client = get_client()
+            logger.info("Milvus 连接成功")
         except Exception as e:
-            print(f"Milvus 连接失败: {e}")
+            logger.error("Milvus 连接失败: %s", e)
             raise
     
-    def create_collection(self):
-        """创建Milvus集合，如果不存在的话"""
-        # 检查集合是否存在
-        if self.client.has_collection(COLLECTION_NAME):
-            print(f"集合 '{COLLECTION_NAME}' 已存在，正在删除...")
-            self.client.drop_collection(COLLECTION_NAME)
-            print(f"集合 '{COLLECTION_NAME}' 已删除。")
-
+    def build_schema(self):
+        """构建人脸集合的 Schema"""
         # 1. 定义 Fields (字段)
         fields = [
             # 主键字段：doc_id，整型，自动生成 ID
             FieldSchema(name=ID_FIELD_NAME, dtype=DataType.INT64, is_primary=True, auto_id=True),
             # 标量字段：category，字符串类型，用于过滤
-            FieldSchema(name=NAME_FIELD_NAME, dtype=DataType.VARCHAR, max_length=256),
+            FieldSchema(name=NAME_FIELD_NAME, dtype=DataType.VARCHAR, max_length=256,
+                        is_partition_key=NAME_AS_PARTITION_KEY),
             # 标量字段：category，字符串类型，用于过滤
             FieldSchema(name=PATH_FIELD_NAME, dtype=DataType.VARCHAR, max_length=256),
+            # 标量字段：cluster_id，聚类任务写入，导入时为空
+            FieldSchema(name=CLUSTER_FIELD_NAME, dtype=DataType.INT64, nullable=True),
             # 向量字段：embedding，浮点向量，指定维度
             FieldSchema(name=EMBEDDING_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM)
         ]
 
         # 2. 定义 Collection 的 Schema
-        schema = CollectionSchema(fields=fields, description="人脸特征向量集合")
-        
+        return CollectionSchema(fields=fields, description="人脸特征向量集合")
+
+    def build_index_params(self):
+        """构建向量字段和 name 字段的索引参数"""
+        index_params = self.client.prepare_index_params()
+        index_params.add_index(
+            field_name=EMBEDDING_FIELD_NAME,
+            index_type="HNSW",
+            metric_type="COSINE",
+            params={"M": 16, "efConstruction": 200},
+            index_name=INDEX_NAME
+        )
+        # name 上的标量索引，按人名过滤时不需要逐行比较字符串
+        index_params.add_index(
+            field_name=NAME_FIELD_NAME,
+            index_type="INVERTED",
+            index_name=NAME_INDEX_NAME
+        )
+        # cluster_id 上的标量索引，按簇查询和只搜索代表人脸时使用
+        index_params.add_index(
+            field_name=CLUSTER_FIELD_NAME,
+            index_type="INVERTED",
+            index_name=CLUSTER_INDEX_NAME
+        )
+        return index_params
+
+    def create_collection_kwargs(self):
+        """create_collection 的额外参数 (Partition Key 的分区数量)"""
+        return {"num_partitions": NUM_PARTITIONS} if NAME_AS_PARTITION_KEY else {}
+
+    def create_collection(self):
+        """创建Milvus集合并建立索引 (先建索引，适合之后持续写入少量数据)"""
+        # 检查集合是否存在
+        if self.client.has_collection(COLLECTION_NAME):
+            logger.info("集合 '%s' 已存在，正在删除...", COLLECTION_NAME)
+            self.client.drop_collection(COLLECTION_NAME)
+            wait_for_dropped(self.client, COLLECTION_NAME)
+            logger.info("集合 '%s' 已删除", COLLECTION_NAME)
+
         try:
-            self.client.create_collection(collection_name=COLLECTION_NAME, schema=schema);
-            print(f"集合 '{COLLECTION_NAME}' 创建成功!")
-            
-            # 为向量字段创建索引
-            index_params = self.client.prepare_index_params()
-            index_params.add_index(
-                field_name=EMBEDDING_FIELD_NAME,
-                index_type="HNSW",
-                metric_type="COSINE",
-                params={"M": 16, "efConstruction": 200},
-                index_name="face_embeddings_index"
+            self.client.create_collection(
+                collection_name=COLLECTION_NAME, schema=self.build_schema(), **self.create_collection_kwargs()
             )
+            logger.info("集合 '%s' 创建成功", COLLECTION_NAME)
             
-            self.client.create_index(
-                collection_name=COLLECTION_NAME,
-                index_params=index_params
-            )
-            print(f"向量索引创建完成!")
+            # 为向量字段创建索引
+            build_index_async(
+                self.client, COLLECTION_NAME, self.build_index_params(), INDEX_NAME,
+                on_progress=tqdm_progress("构建向量索引")
+            ).wait()
+            logger.info("向量索引创建完成")
             
         except Exception as e:
-            print(f"创建集合失败: {e}")
+            logger.error("创建集合失败: %s", e)
             raise
     
     def extract_face_encoding(self, image_path):
@@ -114,30 +159,35 @@ class FaceVectorizer:
             face_encoding: 人脸特征向量 (如果没有检测到人脸则返回None)
             face_location: 人脸位置坐标
         """
+        cv2, face_recognition = _load_vision()
+
         # 读取图像
-        image = cv2.imread(image_path)
+        with stage("image_io"):
+            image = cv2.imread(image_path)
         if image is None:
-            print(f"无法读取图像: {image_path}")
+            logger.warning("无法读取图像: %s", image_path)
             return None, None
         
         # 转换为RGB (face_recognition需要RGB格式)
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
         # 检测人脸位置
-        face_locations = face_recognition.face_locations(rgb_image)
+        with stage("face_detection"):
+            face_locations = face_recognition.face_locations(rgb_image)
         
         if not face_locations:
-            print(f"未在图像中检测到人脸: {image_path}")
+            logger.debug("未在图像中检测到人脸: %s", image_path)
             return None, None
         
         # 使用检测到的第一个人脸 (如果有多个人脸)
         face_location = face_locations[0]
         
         # 提取人脸编码
-        face_encodings = face_recognition.face_encodings(rgb_image, [face_location])
+        with stage("face_encoding"):
+            face_encodings = face_recognition.face_encodings(rgb_image, [face_location])
         
         if not face_encodings:
-            print(f"无法提取人脸特征: {image_path}")
+            logger.debug("无法提取人脸特征: %s", image_path)
             return None, None
         
         return face_encodings[0], face_location
@@ -153,8 +203,11 @@ class FaceVectorizer:
         返回:
             face_image: 裁剪后的人脸图像的二进制数据
         """
+        cv2, _ = _load_vision()
+
         # 读取图像
-        image = cv2.imread(image_path)
+        with stage("image_io"):
+            image = cv2.imread(image_path)
         
         # 提取坐标
         top, right, bottom, left = face_location
@@ -169,21 +222,41 @@ class FaceVectorizer:
         _, face_bytes = cv2.imencode('.jpg', face_image)
         return face_bytes.tobytes()
     
-    def process_images(self):
-        """处理目录中的所有图像并将其向量化后存入Milvus"""
-        # 确保集合存在
-        self.create_collection()
-        
+    def process_images(self, summary_path=None, profile=None):
+        """
+        处理目录中的所有图像并将其向量化后存入Milvus
+
+        参数:
+            summary_path: 运行汇总 (各阶段次数和耗时) 的 JSON 输出路径，默认读取环境变量 FACE_RUN_SUMMARY，
+                          都没有时只写入日志
+            profile: 性能分析模式 cprofile / sample，默认读取环境变量 PROFILE (见 src/profiling.py)
+
+        返回:
+            RunSummary: 本次运行的汇总
+        """
+        summary = RunSummary("process_images")
+        with profile_run("process_images", profile), summary.activate():
+            self._process_images(summary)
+        logger.info("%s", summary.format())
+        summary_path = summary_path or os.environ.get(RUN_SUMMARY_ENV)
+        if summary_path:
+            summary.write(summary_path)
+        return summary
+
+    def _process_images(self, summary):
+        from tqdm import tqdm
+
         # 获取所有图像文件
         image_files = []
         for ext in ['jpg', 'jpeg', 'png']:
             image_files.extend(glob.glob(os.path.join(self.image_dir, f'*.{ext}')))
         
         if not image_files:
-            print(f"在 {self.image_dir} 中未找到图像文件")
+            logger.warning("在 %s 中未找到图像文件", self.image_dir)
             return
         
-        print(f"找到 {len(image_files)} 个图像文件，开始处理...")
+        logger.info("找到 %d 个图像文件，开始处理...", len(image_files))
+        summary.count("images", len(image_files))
         
         # 准备数据
         entities = []
@@ -197,6 +270,7 @@ class FaceVectorizer:
             face_encoding, face_location = self.extract_face_encoding(image_path)
             
             if face_encoding is None:
+                summary.count("skipped_images")
                 continue
             
             # 准备插入Milvus的实体
@@ -208,31 +282,133 @@ class FaceVectorizer:
             
             entities.append(entity)
         
+        summary.count("faces", len(entities))
         if not entities:
-            print("没有有效的人脸可以处理")
+            logger.warning("没有有效的人脸可以处理")
             return
         
-        # 插入Milvus
+        # 批量导入Milvus: 重建集合，按数据量选择建索引的先后顺序，
+        # 整个导入只做一次 flush 和一次索引构建
         try:
-            print("正在向Milvus插入数据...")
-            result = self.client.insert(
-                collection_name=COLLECTION_NAME,
-                data=entities
-            )
+            logger.info("正在向Milvus插入数据...")
+            with stage("bulk_load"):
+                report = bulk_load(
+                    self.client, COLLECTION_NAME, self.build_schema(), self.build_index_params(), INDEX_NAME,
+                    entities, EMBEDDING_DIM, on_progress=tqdm_progress("构建向量索引"),
+                    **self.create_collection_kwargs()
+                )
             
-            print(f"成功插入 {len(entities)} 个人脸特征向量!")
-            print(f"插入结果: {result}")
+            summary.count("inserted_rows", report.rows)
+            logger.info("成功插入 %d 个人脸特征向量", report.rows)
+            logger.info("导入顺序: %s, 插入 %.2fs, flush %.2fs, 索引 %.2fs",
+                        report.order, report.insert_seconds, report.flush_seconds, report.index_seconds)
+
+            # 人脸集合已按本次导入重建，身份索引同样按本次导入的全部照片重写
+            with stage("identities"):
+                identities = replace_identities(
+                    self.client, [entity[NAME_FIELD_NAME] for entity in entities],
+                    [entity[EMBEDDING_FIELD_NAME] for entity in entities],
+                )
+            summary.count("identities", identities)
             
         except Exception as e:
-            print(f"插入数据失败: {e}")
+            logger.error("插入数据失败: %s", e)
     
-    def search_similar_faces(self, query_image_path, top_k=5):
+    def upsert_images(self, image_paths):
+        """
+        重新导入指定图像 (新增或修正后的图像): 按 image_path 替换集合中已有的行，不重建集合，
+        身份索引中减去旧行、加上新行。image_path 需要与导入时的写法一致 (例如 image/张三.jpg)。
+        被替换的行如果是某个簇的代表人脸，该簇的其他人脸在重新运行 face_cluster.py 之前不会出现在
+        representatives_only 的搜索结果中。
+
+        参数:
+            image_paths: 图像路径列表，未检测到人脸的图像保留集合中已有的行
+
+        返回:
+            milvus_maintenance.UpsertReport，没有检测到任何人脸时为 None
+        """
+        entities = []
+        for image_path in image_paths:
+            face_encoding, _ = self.extract_face_encoding(image_path)
+            if face_encoding is None:
+                logger.warning("%s 中未检测到人脸，保留集合中已有的行", image_path)
+                continue
+            entities.append(self.build_entity(image_path, face_encoding))
+        return self.upsert_entities(entities) if entities else None
+
+    def build_entity(self, image_path, face_encoding):
+        """构建一张图像的实体 (人名取文件名)"""
+        return {
+            NAME_FIELD_NAME: os.path.splitext(os.path.basename(image_path))[0],
+            PATH_FIELD_NAME: image_path,
+            EMBEDDING_FIELD_NAME: face_encoding.tolist()
+        }
+
+    def upsert_entities(self, entities):
+        """
+        按 image_path 替换或新增已编码的实体 (build_entity 的结果)，并同步更新身份索引
+
+        返回:
+            milvus_maintenance.UpsertReport
+        """
+        self.ensure_loaded()
+        # 人脸集合和身份集合各只更新一次数据版本
+        with deferred_bumps():
+            with stage("upsert_images"):
+                report = upsert_by_key(
+                    self.client, COLLECTION_NAME, entities, PATH_FIELD_NAME,
+                    old_fields=[NAME_FIELD_NAME, CLUSTER_FIELD_NAME], old_vector_field=EMBEDDING_FIELD_NAME,
+                )
+            with stage("identities"):
+                if report.previous is not None:
+                    update_identities(self.client, report.previous.columns[NAME_FIELD_NAME], report.previous.vectors,
+                                      remove=True)
+                    # 主键为 auto_id，被替换的旧行都已删除
+                    reassign_representatives(self.client, report.previous)
+                update_identities(self.client, [entity[NAME_FIELD_NAME] for entity in entities],
+                                  [entity[EMBEDDING_FIELD_NAME] for entity in entities])
+        logger.info("新增 %d 张，替换 %d 张 (删除旧行 %d 行)", report.inserted, report.replaced, report.deleted)
+        return report
+
+    def remove_faces(self, filter):
+        """
+        按过滤表达式分批删除人脸 (例如离开图库的人: name in [...])，并从身份索引中减去这些照片
+
+        返回:
+            milvus_maintenance.DeleteReport
+        """
+        removed = []
+
+        def forget(batch):
+            update_identities(self.client, batch.columns[NAME_FIELD_NAME], batch.vectors, remove=True)
+            removed.append(batch)
+
+        self.ensure_loaded()
+        # forget 每个删除批次都会更新身份集合，数据版本只在删除结束后写入一次
+        with stage("remove_faces"), deferred_bumps():
+            report = delete_by_filter(
+                self.client, COLLECTION_NAME, filter, output_fields=[NAME_FIELD_NAME, CLUSTER_FIELD_NAME],
+                vector_field=EMBEDDING_FIELD_NAME, on_batch=forget,
+            )
+            # 被删除的代表人脸所在的簇从剩余成员中重新选出代表人脸
+            reassigned = reassign_representatives(self.client, concat_batches(removed)) if removed else 0
+        logger.info("删除 %d 张人脸，%d 张人脸改为新的代表人脸", report.deleted, reassigned)
+        return report
+
+    def ensure_loaded(self):
+        """按条件读取前确保人脸集合已加载"""
+        self.client.load_collection(collection_name=COLLECTION_NAME, repeatedly_load=False)
+        wait_for_loaded(self.client, COLLECTION_NAME)
+
+    def search_similar_faces(self, query_image_path, top_k=5, representatives_only=False, shortlist=None):
         """
         在Milvus中搜索与查询图像相似的人脸
         
         参数:
             query_image_path: 查询图像路径
             top_k: 返回的最相似结果数量
+            representatives_only: 只搜索每个簇的代表人脸 (运行 face_cluster.py 之后)，结果中不会出现近重复照片
+            shortlist: 两阶段搜索的候选人数量 (见 face_identity.py)，None 表示直接搜索全部照片
             
         返回:
             results: 搜索结果列表
@@ -241,26 +417,83 @@ class FaceVectorizer:
         face_encoding, _ = self.extract_face_encoding(query_image_path)
         
         if face_encoding is None:
-            print(f"无法从查询图像中提取人脸特征: {query_image_path}")
+            logger.warning("无法从查询图像中提取人脸特征: %s", query_image_path)
             return []
         
         # 执行向量搜索
         search_params = {"metric_type": "COSINE", "params": {"ef": 128}}
+        filter = REPRESENTATIVES_FILTER if representatives_only else ""
+        output_fields = [NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME]
+
+        if shortlist:
+            # 先按身份中心向量选出候选人，再只在他们的照片中搜索
+            return two_stage_search(
+                self.client, [face_encoding.tolist()], limit=top_k, shortlist=shortlist, filter=filter,
+                search_params=search_params, output_fields=output_fields,
+            )
         
-        results = self.client.search(
+        # 相同或几乎相同的查询直接返回缓存结果 (导入或聚类写入后自动失效)
+        results = get_search_cache().search(
+            self.client,
             collection_name=COLLECTION_NAME,
             data=[face_encoding.tolist()],
             anns_field=EMBEDDING_FIELD_NAME,
-            param=search_params,
+            search_params=search_params,
             limit=top_k,
-            output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME]
+            filter=filter,
+            output_fields=output_fields
         )
         
         return results
 
+    def find_matching_faces(self, query_image_path, min_similarity=0.9, representatives_only=False):
+        """
+        1:N 人脸核验: 返回与查询图像余弦相似度超过 min_similarity 的全部人脸，而不是固定数量的 top_k
+
+        参数:
+            query_image_path: 查询图像路径
+            min_similarity: 余弦相似度阈值
+            representatives_only: 只在每个簇的代表人脸中核验
+
+        返回:
+            results: 匹配的人脸列表，按相似度从高到低排列
+        """
+        face_encoding, _ = self.extract_face_encoding(query_image_path)
+
+        if face_encoding is None:
+            logger.warning("无法从查询图像中提取人脸特征: %s", query_image_path)
+            return []
+
+        results = range_search_all(
+            self.client,
+            COLLECTION_NAME,
+            [face_encoding.tolist()],
+            EMBEDDING_FIELD_NAME,
+            range_search_params("COSINE", min_similarity=min_similarity),
+            filter=REPRESENTATIVES_FILTER if representatives_only else "",
+            output_fields=[NAME_FIELD_NAME, PATH_FIELD_NAME, CLUSTER_FIELD_NAME]
+        )
+
+        return results[0]
+
 if __name__ == "__main__":
-    vectorizer = FaceVectorizer()
-    vectorizer.process_images()
+    parser = argparse.ArgumentParser(description="提取人脸特征向量并导入 Milvus")
+    parser.add_argument("--image-dir", default="image", help="人脸图像目录")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=["cprofile", "sample", "off"],
+                        help="记录性能分析结果 (默认 cprofile，结果目录由 PROFILE_DIR 指定)")
+    parser.add_argument("--upsert", nargs="+", metavar="IMAGE", help="只重新导入这些图像 (按 image_path 替换)，不重建集合")
+    parser.add_argument("--remove-names", nargs="+", metavar="NAME", help="删除这些人名的全部人脸，不重建集合")
+    args = parser.parse_args()
+
+    configure_logging()
+    vectorizer = FaceVectorizer(args.image_dir)
+    if args.upsert or args.remove_names:
+        if args.remove_names:
+            vectorizer.remove_faces(key_filter(NAME_FIELD_NAME, args.remove_names))
+        if args.upsert:
+            vectorizer.upsert_images(args.upsert)
+    else:
+        vectorizer.process_images(profile=args.profile)
     
     # 测试搜索功能 (可选)
     # 如果存在测试图像，可以取消下面注释进行测试
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+视频与摄像头流的人脸导入
+逐帧编码的代价太高 (face_encodings 每张人脸数十毫秒)，本模块只对采样帧做人脸检测，
+并把连续帧中的人脸框按 IoU 关联为轨迹，每条轨迹只编码一次，之后只有质量明显提高时才重新编码:
+
+- 采样: 按 --sample-fps 跳帧 (跳过的帧只 grab 不解码为图像)；连续 idle_frames 个采样帧没有人脸时
+  采样间隔逐步加倍 (最长 max_idle_seconds 秒一帧)，检测到人脸后恢复
+- 检测: 在缩小 detect_scale 倍的帧上检测，人脸框再按比例还原
+- 跟踪: 人脸框与当前轨迹按 IoU 贪心匹配，未匹配的检测开始新轨迹，连续 max_missed 个采样帧没有匹配的轨迹结束
+- 质量: 人脸框面积 × 清晰度 (拉普拉斯方差)，超过已编码帧的 (1 + quality_gain) 倍时重新编码
+- 写入: 结束的轨迹 (至少出现 min_hits 次) 每条一行写入 face_video_tracks_collection，
+  包含质量最高的特征向量、开始/结束时间和该帧的时间，每 batch_size 条或 flush_seconds 秒插入一次
+
+用法:
+    python face_video.py recordings/gate.mp4                  # 重新导入同一文件时先删除它已有的轨迹
+    python face_video.py 0 --sample-fps 3                     # 摄像头 0 (Ctrl-C 停止)
+    python face_video.py rtsp://camera-1/stream
+"""
+
+import argparse
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+# 配置常量与 sys.path 设置 (共享的 Milvus 模块位于上级目录 src/)
+from face_config import (
+    VIDEO_COLLECTION_NAME, VIDEO_INDEX_NAME, VIDEO_SOURCE_INDEX_NAME, ID_FIELD_NAME, EMBEDDING_FIELD_NAME,
+    SOURCE_FIELD_NAME, TRACK_FIELD_NAME, START_MS_FIELD_NAME, END_MS_FIELD_NAME, BEST_MS_FIELD_NAME,
+    QUALITY_FIELD_NAME, EMBEDDING_DIM,
+)
+from pymilvus import FieldSchema, CollectionSchema, DataType
+from milvus_connection import get_client, close_pool
+from milvus_index import build_index_async
+from milvus_cache import bump_version
+from milvus_consistency import insert_with_token
+from milvus_maintenance import delete_by_filter, key_filter
+from milvus_wait import wait_for_loaded
+from face_vectorization import _load_vision
+from metrics import configure_logging, stage, RunSummary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_FPS = 5.0
+# 连续该数量的采样帧没有人脸时开始加大采样间隔
+DEFAULT_IDLE_FRAMES = 3
+DEFAULT_MAX_IDLE_SECONDS = 1.0
+DEFAULT_DETECT_SCALE = 0.5
+DEFAULT_IOU_THRESHOLD = 0.3
+DEFAULT_MAX_MISSED = 5
+DEFAULT_QUALITY_GAIN = 0.2
+DEFAULT_MIN_HITS = 2
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_SECONDS = 5.0
+# 无法读取帧率时假定的帧率
+FALLBACK_FPS = 25.0
+
+
+def iou(a, b):
+    """两个 (top, right, bottom, left) 人脸框的交并比"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class Track:
+    """一条人脸轨迹"""
+    track_id: int
+    # 最近一次的人脸框 (top, right, bottom, left)
+    box: tuple
+    first_ms: int
+    last_ms: int
+    hits: int = 1
+    # 连续没有匹配到检测的采样帧数
+    missed: int = 0
+    # 已编码帧的质量、时间和特征向量，尚未编码时为 None
+    quality: float = 0.0
+    best_ms: int = 0
+    encoding: Optional[np.ndarray] = None
+    encodings: int = 0
+
+
+class FaceTracker:
+    """按 IoU 把采样帧中的人脸框关联为轨迹，并决定哪些检测需要编码"""
+
+    def __init__(self, iou_threshold=DEFAULT_IOU_THRESHOLD, max_missed=DEFAULT_MAX_MISSED,
+                 quality_gain=DEFAULT_QUALITY_GAIN, min_hits=DEFAULT_MIN_HITS):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.quality_gain = quality_gain
+        self.min_hits = min_hits
+        self.active = []
+        self._next_id = 0
+
+    def update(self, detections, timestamp_ms):
+        """
+        用一个采样帧的检测结果更新轨迹
+
+        参数:
+            detections: [(人脸框, 质量)]
+            timestamp_ms: 帧的时间
+
+        返回:
+            (to_encode, finished): 需要编码的 [(Track, 人脸框, 质量)]，以及本帧结束的 Track 列表
+                                   (已过滤出现次数不足或没有特征向量的轨迹)
+        """
+        pairs = sorted(
+            ((iou(track.box, box), t, d) for t, track in enumerate(self.active) for d, (box, _) in enumerate(detections)),
+            reverse=True,
+        )
+        matched_tracks, matched_detections = set(), set()
+        to_encode = []
+        for overlap, t, d in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            track = self.active[t]
+            box, quality = detections[d]
+            track.box, track.last_ms, track.hits, track.missed = box, timestamp_ms, track.hits + 1, 0
+            if track.encoding is None or quality > track.quality * (1 + self.quality_gain):
+                to_encode.append((track, box, quality))
+
+        finished, active = [], []
+        for t, track in enumerate(self.active):
+            if t not in matched_tracks:
+                track.missed += 1
+            (finished if track.missed > self.max_missed else active).append(track)
+
+        for d, (box, quality) in enumerate(detections):
+            if d not in matched_detections:
+                track = Track(self._next_id, box, timestamp_ms, timestamp_ms)
+                self._next_id += 1
+                active.append(track)
+                to_encode.append((track, box, quality))
+        self.active = active
+        return to_encode, self._keep(finished)
+
+    def finish(self):
+        """结束全部轨迹 (视频结束或停止导入时)"""
+        finished, self.active = self.active, []
+        return self._keep(finished)
+
+    def _keep(self, tracks):
+        return [track for track in tracks if track.hits >= self.min_hits and track.encoding is not None]
+
+
+def build_video_schema():
+    """构建视频轨迹集合的 Schema"""
+    fields = [
+        FieldSchema(name=ID_FIELD_NAME, dtype=DataType.INT64, is_primary=True, auto_id=True),
+        FieldSchema(name=SOURCE_FIELD_NAME, dtype=DataType.VARCHAR, max_length=1024),
+        FieldSchema(name=TRACK_FIELD_NAME, dtype=DataType.INT64),
+        FieldSchema(name=START_MS_FIELD_NAME, dtype=DataType.INT64),
+        FieldSchema(name=END_MS_FIELD_NAME, dtype=DataType.INT64),
+        FieldSchema(name=BEST_MS_FIELD_NAME, dtype=DataType.INT64),
+        FieldSchema(name=QUALITY_FIELD_NAME, dtype=DataType.FLOAT),
+        FieldSchema(name=EMBEDDING_FIELD_NAME, dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM),
+    ]
+    return CollectionSchema(fields=fields, description="视频人脸轨迹集合")
+
+
+def ensure_video_collection(client, collection_name=VIDEO_COLLECTION_NAME):
+    """视频轨迹集合不存在时创建、建索引 (与人脸集合相同的 HNSW / COSINE) 并加载"""
+    if not client.has_collection(collection_name):
+        client.create_collection(collection_name=collection_name, schema=build_video_schema())
+        index_params = client.prepare_index_params()
+        index_params.add_index(
+            field_name=EMBEDDING_FIELD_NAME, index_type="HNSW", metric_type="COSINE",
+            params={"M": 16, "efConstruction": 200}, index_name=VIDEO_INDEX_NAME,
+        )
+        # 按视频来源删除和过滤
+        index_params.add_index(field_name=SOURCE_FIELD_NAME, index_type="INVERTED", index_name=VIDEO_SOURCE_INDEX_NAME)
+        build_index_async(client, collection_name, index_params, VIDEO_INDEX_NAME, on_progress=None).wait()
+    client.load_collection(collection_name=collection_name, repeatedly_load=False)
+    wait_for_loaded(client, collection_name)
+
+
+def track_row(source, track):
+    """轨迹在视频集合中的一行"""
+    return {
+        SOURCE_FIELD_NAME: source,
+        TRACK_FIELD_NAME: track.track_id,
+        START_MS_FIELD_NAME: int(track.first_ms),
+        END_MS_FIELD_NAME: int(track.last_ms),
+        BEST_MS_FIELD_NAME: int(track.best_ms),
+        QUALITY_FIELD_NAME: float(track.quality),
+        EMBEDDING_FIELD_NAME: track.encoding.tolist(),
+    }
+
+
+def face_quality(cv2, gray, box):
+    """人脸框面积 × 清晰度 (人脸区域的拉普拉斯方差)"""
+    top, right, bottom, left = box
+    crop = gray[max(top, 0):bottom, max(left, 0):right]
+    if crop.size == 0:
+        return 0.0
+    return float((bottom - top) * (right - left) * cv2.Laplacian(crop, cv2.CV_64F).var())
+
+
+def parse_source(text):
+    """命令行的视频来源: 纯数字为摄像头编号，其他为文件路径或流地址"""
+    return int(text) if text.isdigit() else text
+
+
+def is_live(source):
+    return isinstance(source, int) or "://" in source
+
+
+@dataclass
+class VideoIngestReport:
+    """ingest_video 的结果"""
+    frames: int = 0
+    sampled_frames: int = 0
+    detections: int = 0
+    encodings: int = 0
+    tracks: int = 0
+    deleted: int = 0
+    seconds: float = 0.0
+
+
+class VideoIngest:
+    """从一个视频来源读取帧、跟踪人脸并写入轨迹"""
+
+    def __init__(self, client, source, collection_name=VIDEO_COLLECTION_NAME, sample_fps=DEFAULT_SAMPLE_FPS,
+                 idle_frames=DEFAULT_IDLE_FRAMES, max_idle_seconds=DEFAULT_MAX_IDLE_SECONDS,
+                 detect_scale=DEFAULT_DETECT_SCALE, tracker=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_seconds=DEFAULT_FLUSH_SECONDS, cached=False):
+        """
+        参数:
+            source: 视频文件路径、流地址或摄像头编号 (int)
+            sample_fps: 有人脸时每秒检测的帧数
+            idle_frames / max_idle_seconds: 连续 idle_frames 个采样帧没有人脸后逐步加大采样间隔，最长 max_idle_seconds 秒
+            detect_scale: 检测前缩小帧的比例 (1 表示不缩小，小人脸较多时调大)
+            tracker: FaceTracker，默认使用默认参数
+            batch_size / flush_seconds: 累积到该数量的轨迹或距上次写入超过该时间时插入
+            cached: 是否有 SearchCache 缓存轨迹集合的搜索结果；为 True 时每次运行结束后更新一次数据版本
+                    (bump_version 是一次 DDL，不按写入批次调用；摄像头和网络流在停止前缓存不会失效)
+        """
+        self.client = client
+        self.source = source
+        self.source_name = str(source)
+        self.collection_name = collection_name
+        self.sample_fps = sample_fps
+        self.idle_frames = idle_frames
+        self.max_idle_seconds = max_idle_seconds
+        self.detect_scale = detect_scale
+        self.tracker = tracker or FaceTracker()
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.cached = cached
+        self.report = VideoIngestReport()
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._stop = False
+
+    def stop(self):
+        """在下一帧之后停止 (已结束的轨迹照常写入)"""
+        self._stop = True
+
+    def _detect(self, cv2, face_recognition, rgb):
+        """返回 [(人脸框, 质量)]，人脸框已还原到原始分辨率"""
+        small = rgb if self.detect_scale == 1 else cv2.resize(rgb, (0, 0), fx=self.detect_scale, fy=self.detect_scale)
+        with stage("face_detection"):
+            locations = face_recognition.face_locations(small)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        detections = []
+        for location in locations:
+            box = tuple(int(round(v / self.detect_scale)) for v in location)
+            detections.append((box, face_quality(cv2, gray, box)))
+        return detections
+
+    def _encode(self, face_recognition, rgb, to_encode, timestamp_ms):
+        if not to_encode:
+            return
+        with stage("face_encoding"):
+            encodings = face_recognition.face_encodings(rgb, [box for _, box, _ in to_encode])
+        for (track, _, quality), encoding in zip(to_encode, encodings):
+            track.encoding, track.quality, track.best_ms = encoding, quality, timestamp_ms
+            track.encodings += 1
+        self.report.encodings += len(encodings)
+
+    def _add(self, tracks, force=False):
+        self._rows.extend(track_row(self.source_name, track) for track in tracks)
+        due = time.monotonic() - self._last_flush >= self.flush_seconds
+        if self._rows and (force or due or len(self._rows) >= self.batch_size):
+            with stage("video_insert"):
+                insert_with_token(self.client, self.collection_name, self._rows)
+            self.report.tracks += len(self._rows)
+            logger.info("%s: 写入 %d 条轨迹 (累计 %d)", self.source_name, len(self._rows), self.report.tracks)
+            self._rows = []
+            self._last_flush = time.monotonic()
+
+    def run(self, replace=True):
+        """
+        读取全部帧 (摄像头和网络流直到 stop() 或流结束)
+
+        参数:
+            replace: 视频文件重新导入时先删除该文件已有的轨迹
+
+        返回:
+            VideoIngestReport
+        """
+        cv2, face_recognition = _load_vision()
+        start = time.perf_counter()
+        live = is_live(self.source)
+        ensure_video_collection(self.client, self.collection_name)
+        if replace and not live:
+            self.report.deleted = delete_by_filter(
+                self.client, self.collection_name, key_filter(SOURCE_FIELD_NAME, [self.source_name]),
+                bump=self.cached).deleted
+
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            raise RuntimeError(f"无法打开视频来源: {self.source_name}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or FALLBACK_FPS
+        base_stride = max(1, int(round(fps / self.sample_fps)))
+        max_stride = max(base_stride, int(round(fps * self.max_idle_seconds)))
+        stride, idle, skip = base_stride, 0, 0
+        try:
+            while not self._stop:
+                # 跳过的帧只 grab，不解码为图像
+                if skip:
+                    with stage("video_decode"):
+                        ok = capture.grab()
+                    if not ok:
+                        break
+                    self.report.frames += 1
+                    skip -= 1
+                    continue
+                with stage("video_decode"):
+                    ok, frame = capture.read()
+                if not ok:
+                    break
+                self.report.frames += 1
+                self.report.sampled_frames += 1
+                # 文件按帧序号和帧率计算时间 (read() 之后 CAP_PROP_POS_MSEC 已指向下一帧，且部分后端不准确)
+                timestamp_ms = int(time.time() * 1000) if live else int((self.report.frames - 1) * 1000 / fps)
+
+                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                detections = self._detect(cv2, face_recognition, rgb)
+                self.report.detections += len(detections)
+                to_encode, finished = self.tracker.update(detections, timestamp_ms)
+                self._encode(face_recognition, rgb, to_encode, timestamp_ms)
+                self._add(finished)
+
+                # 自适应采样: 画面中没有人脸时逐步拉长间隔，出现人脸或仍有未结束的轨迹时恢复
+                if detections or self.tracker.active:
+                    stride, idle = base_stride, 0
+                else:
+                    idle += 1
+                    if idle >= self.idle_frames:
+                        stride = min(stride * 2, max_stride)
+                skip = stride - 1
+        finally:
+            capture.release()
+            self._add(self.tracker.finish(), force=True)
+            if self.cached and (self.report.tracks or self.report.deleted):
+                bump_version(self.client, self.collection_name)
+            self.report.seconds = time.perf_counter() - start
+        return self.report
+
+
+def ingest_video(client, source, replace=True, **kwargs):
+    """导入一个视频来源，参数同 VideoIngest，返回 VideoIngestReport"""
+    return VideoIngest(client, source, **kwargs).run(replace=replace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="视频文件路径、流地址或摄像头编号")
+    parser.add_argument("--sample-fps", type=float, default=DEFAULT_SAMPLE_FPS, help="有人脸时每秒检测的帧数")
+    parser.add_argument("--max-idle-seconds", type=float, default=DEFAULT_MAX_IDLE_SECONDS,
+                        help="没有人脸时最长的采样间隔 (秒)")
+    parser.add_argument("--detect-scale", type=float, default=DEFAULT_DETECT_SCALE, help="检测前缩小帧的比例")
+    parser.add_argument("--min-hits", type=int, default=DEFAULT_MIN_HITS, help="轨迹至少出现的采样帧数")
+    parser.add_argument("--keep", action="store_true", help="重新导入视频文件时保留已有的轨迹")
+    args = parser.parse_args()
+
+    configure_logging()
+    client = get_client()
+    summary = RunSummary("ingest_video")
+    ingest = VideoIngest(client, parse_source(args.source), sample_fps=args.sample_fps,
+                         max_idle_seconds=args.max_idle_seconds, detect_scale=args.detect_scale,
+                         tracker=FaceTracker(min_hits=args.min_hits))
+    try:
+        with summary.activate():
+            report = ingest.run(replace=not args.keep)
+    except KeyboardInterrupt:
+        report = ingest.report
+    finally:
+        close_pool()
+    logger.info("%s", summary.format())
+    print(f"帧 {report.frames}，检测 {report.sampled_frames} 帧 / {report.detections} 张人脸，"
+          f"编码 {report.encodings} 次，写入 {report.tracks} 条轨迹，耗时 {report.seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸图像目录的持续导入服务
+监视图像目录，新增或修改的图像编码后按 image_path 写入人脸集合，被删除的图像从集合中删除，
+不需要定期重新运行 face_vectorization.py 全量扫描和重建集合。
+
+- 监视: 安装 watchdog 时使用 inotify 等系统通知，否则 (或 --polling) 每隔 poll_interval 秒比较目录中文件的
+  修改时间和大小；两种方式都只比较文件元数据，不重新编码未变化的图像
+- 去抖: 同一文件的事件合并，最后一次事件之后 debounce 秒内没有新事件才处理 (复制中的大文件不会读到一半)
+- 批处理: 每批最多 batch_size 个文件，在 workers 个线程中并行编码，整批一次写入 (upsert_by_key / delete_by_filter)
+- 背压: 等待处理的文件超过 max_pending 个时，通知线程阻塞直到积压减少
+- 文件在处理时已不存在则删除它在集合中的行；编码失败或未检测到人脸时保留已有的行
+- 删除或替换的照片是某个簇的代表人脸时，从簇的剩余成员中重新选出代表人脸 (见 face_cluster.py)；
+  新增的照片不加入已有的簇，需要时定期重新运行 face_cluster.py
+
+写入不调用 flush，插入的数据在 growing segment 中即可被搜索，新人脸通常在 debounce + 编码时间内可以搜到。
+服务停止期间被修改的文件不会被发现 (集合中不记录文件的修改时间)；--reconcile 在启动时导入集合中没有的文件，
+并删除文件已不存在的行。
+
+用法:
+    python face_watch.py --image-dir image
+    python face_watch.py --image-dir image --polling --poll-interval 5 --reconcile
+"""
+
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 可选依赖，未安装时使用轮询
+    Observer = None
+    FileSystemEventHandler = object
+
+# 配置常量与 sys.path 设置 (共享的 Milvus 模块位于上级目录 src/)
+from face_config import COLLECTION_NAME, PATH_FIELD_NAME
+from face_vectorization import FaceVectorizer
+from milvus_cache import deferred_bumps
+from milvus_maintenance import key_filter
+from milvus_reader import iter_query_batches
+from metrics import configure_logging, stage
+
+logger = logging.getLogger(__name__)
+
+# 与 process_images 相同的图像扩展名
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+DEFAULT_DEBOUNCE = 1.0
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_PENDING = 10000
+DEFAULT_POLL_INTERVAL = 2.0
+# 分发线程检查待处理文件的间隔 (秒)
+TICK_SECONDS = 0.2
+
+
+def is_image(path):
+    return path.endswith(IMAGE_EXTENSIONS)
+
+
+def scan_directory(image_dir):
+    """
+    返回目录中图像文件的元数据 (不递归子目录)
+
+    返回:
+        {路径: (修改时间 ns, 文件大小)}，路径与 process_images 的写法相同 (os.path.join(image_dir, 文件名))
+    """
+    snapshot = {}
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and is_image(entry.name):
+                stat = entry.stat()
+                snapshot[os.path.join(image_dir, entry.name)] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+class _EventHandler(FileSystemEventHandler):
+    """把 watchdog 事件转换为 FaceIngestService.notify"""
+
+    def __init__(self, service):
+        self.service = service
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path:
+                self.service.notify(path)
+
+
+class FaceIngestService:
+    """监视图像目录并增量导入人脸"""
+
+    def __init__(self, vectorizer, image_dir, debounce=DEFAULT_DEBOUNCE, batch_size=DEFAULT_BATCH_SIZE,
+                 workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, poll_interval=DEFAULT_POLL_INTERVAL,
+                 polling=None):
+        """
+        参数:
+            vectorizer: FaceVectorizer
+            image_dir: 图像目录
+            debounce: 同一文件最后一次事件之后等待的时间 (秒)
+            batch_size: 每批处理的文件数量
+            workers: 编码线程数
+            max_pending: 等待处理的文件数量上限 (超过时 notify 阻塞)
+            poll_interval: 轮询间隔 (秒)
+            polling: 是否使用轮询，默认在未安装 watchdog 时轮询
+        """
+        self.vectorizer = vectorizer
+        # 与 glob 得到的路径写法一致 (image/ 与 image 都得到 image/张三.jpg)
+        self.image_dir = os.path.normpath(image_dir)
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.polling = Observer is None if polling is None else polling
+        if not self.polling and Observer is None:
+            raise RuntimeError("未安装 watchdog，只能使用轮询 (--polling)")
+        self.stats = {"upserted": 0, "deleted": 0, "skipped": 0, "errors": 0}
+        # 路径 -> 最后一次事件的时间 (monotonic)
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="face-encode")
+
+    def notify(self, path):
+        """记录一个文件的变化 (新增、修改或删除，处理时按文件是否存在区分)；积压过多时阻塞"""
+        if not is_image(path):
+            return
+        with self._cond:
+            while len(self._pending) >= self.max_pending and path not in self._pending and not self._stop.is_set():
+                self._cond.wait(1.0)
+            self._pending[path] = time.monotonic()
+
+    def _take_ready(self):
+        """取出最后一次事件已超过 debounce 的文件 (最多 batch_size 个，先到先处理)"""
+        deadline = time.monotonic() - self.debounce
+        with self._cond:
+            ready = [path for path, at in self._pending.items() if at <= deadline][:self.batch_size]
+            for path in ready:
+                del self._pending[path]
+            if ready:
+                self._cond.notify_all()
+        return ready
+
+    def _encode(self, image_path):
+        face_encoding, _ = self.vectorizer.extract_face_encoding(image_path)
+        return None if face_encoding is None else self.vectorizer.build_entity(image_path, face_encoding)
+
+    def process_batch(self, paths):
+        """处理一批文件: 已不存在的删除，其余并行编码后一次写入；每个集合的数据版本每批只更新一次"""
+        with deferred_bumps():
+            self._process_batch(paths)
+
+    def _process_batch(self, paths):
+        removed = [path for path in paths if not os.path.exists(path)]
+        present = [path for path in paths if path not in removed]
+        if removed:
+            report = self.vectorizer.remove_faces(key_filter(PATH_FIELD_NAME, removed))
+            self.stats["deleted"] += report.deleted
+        if not present:
+            return
+
+        entities = []
+        with stage("watch_encode"):
+            futures = [self._pool.submit(self._encode, path) for path in present]
+            for path, future in zip(present, futures):
+                try:
+                    entity = future.result()
+                except Exception as e:
+                    logger.warning("编码 %s 失败: %s", path, e)
+                    self.stats["errors"] += 1
+                    continue
+                if entity is None:
+                    logger.info("%s 中未检测到人脸，保留集合中已有的行", path)
+                    self.stats["skipped"] += 1
+                    continue
+                entities.append(entity)
+        if entities:
+            report = self.vectorizer.upsert_entities(entities)
+            self.stats["upserted"] += len(entities)
+            logger.info("导入 %d 张 (新增 %d，替换 %d)，删除 %d 张，等待处理 %d 个文件",
+                        len(entities), report.inserted, report.replaced, len(removed), len(self._pending))
+
+    def reconcile(self):
+        """
+        比较目录与集合: 集合中没有的文件加入待处理，文件已不存在的行加入待删除
+
+        返回:
+            (新增文件数, 待删除的路径数)
+        """
+        on_disk = set(scan_directory(self.image_dir))
+        stored = set()
+        for batch in iter_query_batches(self.vectorizer.client, COLLECTION_NAME, output_fields=[PATH_FIELD_NAME]):
+            stored.update(batch.columns[PATH_FIELD_NAME])
+        new = on_disk - stored
+        # 只删除本目录下的路径 (集合中可能还有从其他目录导入的图像)
+        gone = {path for path in stored - on_disk if os.path.dirname(path) == self.image_dir}
+        for path in sorted(new | gone):
+            self.notify(path)
+        return len(new), len(gone)
+
+    def _poll(self, snapshot):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                current = scan_directory(self.image_dir)
+            except OSError as e:
+                logger.warning("扫描 %s 失败: %s", self.image_dir, e)
+                continue
+            for path in set(snapshot) | set(current):
+                if snapshot.get(path) != current.get(path):
+                    self.notify(path)
+            snapshot = current
+
+    def run(self, reconcile=False):
+        """运行直到 stop() 被调用"""
+        client = self.vectorizer.client
+        if not client.has_collection(COLLECTION_NAME):
+            # 先建索引的空集合，之后持续写入
+            self.vectorizer.create_collection()
+        self.vectorizer.ensure_loaded()
+
+        observer = None
+        if self.polling:
+            # 基准快照在开始监视前取得，之后新增的文件都会被发现
+            threading.Thread(target=self._poll, args=(scan_directory(self.image_dir),), name="face-watch-poll",
+                             daemon=True).start()
+        else:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), self.image_dir, recursive=False)
+            observer.start()
+        logger.info("开始监视 %s (%s)", self.image_dir, "轮询" if self.polling else "文件系统通知")
+        if reconcile:
+            # 在单独的线程中对比，待处理的文件超过积压上限时 notify 会等待下面的分发循环
+            def run_reconcile():
+                new, gone = self.reconcile()
+                logger.info("启动时对比: 待导入 %d 个文件，待删除 %d 个路径", new, gone)
+
+            threading.Thread(target=run_reconcile, name="face-watch-reconcile", daemon=True).start()
+
+        try:
+            while not self._stop.is_set():
+                paths = self._take_ready()
+                if not paths:
+                    self._stop.wait(TICK_SECONDS)
+                    continue
+                try:
+                    self.process_batch(paths)
+                except Exception as e:
+                    # Milvus 暂时不可用等: 放回待处理，稍后重试
+                    logger.warning("处理 %d 个文件失败，稍后重试: %s", len(paths), e)
+                    self.stats["errors"] += 1
+                    # 不经过 notify 的积压上限，否则分发线程会等待自己
+                    with self._cond:
+                        for path in paths:
+                            self._pending.setdefault(path, time.monotonic())
+                    self._stop.wait(self.poll_interval)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            self._pool.shutdown(wait=True)
+            logger.info("停止监视: %s", self.stats)
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image-dir", default="image", help="人脸图像目录")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, help="同一文件最后一次事件之后等待的秒数")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批处理的文件数量")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="编码线程数")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING, help="等待处理的文件数量上限")
+    parser.add_argument("--polling", action="store_true", help="使用轮询 (未安装 watchdog 时总是轮询)")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="轮询间隔 (秒)")
+    parser.add_argument("--reconcile", action="store_true", help="启动时导入集合中没有的文件并删除文件已不存在的行")
+    args = parser.parse_args()
+
+    configure_logging()
+    service = FaceIngestService(
+        FaceVectorizer(args.image_dir), args.image_dir, debounce=args.debounce, batch_size=args.batch_size,
+        workers=args.workers, max_pending=args.max_pending, poll_interval=args.poll_interval,
+        polling=True if args.polling else None,
+    )
+    signal.signal(signal.SIGTERM, lambda *_: service.stop())
+    try:
+        service.run(reconcile=args.reconcile)
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
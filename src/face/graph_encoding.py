@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+人脸图响应编码
+节点和边直接组装为普通 dict，跳过逐个 float 的 pydantic 校验，再按客户端协商的格式序列化:
+
+向量编码 (vectors 参数):
+- none:   不返回向量 (前端只需要节点和边)
+- list:   浮点数列表 (与原接口兼容)
+- base64: 小端 float32 缓冲区的 base64 字符串，前端用 Float32Array 解码
+
+响应格式 (Accept 头):
+- application/msgpack: msgpack 编码，base64 向量直接以二进制发送
+- application/json:    安装了 orjson 时使用 orjson，否则使用标准库 json
+
+流式接口 (NDJSON) 每行一个 JSON 对象，用 serialize_line 序列化。
+"""
+
+import base64
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖
+    msgpack = None
+
+VECTORS_NONE = "none"
+VECTORS_LIST = "list"
+VECTORS_BASE64 = "base64"
+VECTOR_ENCODINGS = (VECTORS_NONE, VECTORS_LIST, VECTORS_BASE64)
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def negotiate_media_type(accept):
+    """根据 Accept 头选择响应格式，未安装 msgpack 时总是返回 JSON"""
+    if msgpack is not None and accept:
+        for item in accept.split(","):
+            media_type = item.split(";")[0].strip()
+            if media_type in (MSGPACK_MEDIA_TYPE, "application/x-msgpack"):
+                return MSGPACK_MEDIA_TYPE
+            if media_type == JSON_MEDIA_TYPE:
+                break
+    return JSON_MEDIA_TYPE
+
+
+def encode_vectors(vectors, vector_encoding, binary=False):
+    """
+    把 float32 向量矩阵按行编码
+
+    参数:
+        vectors: (n, dim) float32 矩阵
+        vector_encoding: none / list / base64
+        binary: 为 True 时 base64 编码改为直接返回原始字节 (用于 msgpack)
+
+    返回:
+        每行一个编码结果的列表，vector_encoding 为 none 时返回 None
+    """
+    if vector_encoding == VECTORS_NONE or vectors is None:
+        return None
+    if vector_encoding == VECTORS_LIST:
+        return vectors.tolist()
+    if vector_encoding == VECTORS_BASE64:
+        vectors = np.ascontiguousarray(vectors, dtype="<f4")
+        if binary:
+            return [row.tobytes() for row in vectors]
+        return [base64.b64encode(row.tobytes()).decode("ascii") for row in vectors]
+    raise ValueError(f"不支持的向量编码: {vector_encoding}")
+
+
+def build_nodes(ids, names, image_paths, image_data, vectors, vector_encoding=VECTORS_LIST, binary=False,
+                positions=None):
+    """
+    组装节点列表 (字段与 FaceNode 模型一致)
+
+    参数:
+        ids / names / image_paths / image_data: 与向量矩阵按行对应的节点属性
+        vectors: (n, dim) float32 向量矩阵，vector_encoding 为 none 时可以为 None
+        vector_encoding: none / list / base64
+        binary: base64 向量是否以原始字节返回 (msgpack)
+        positions: (n, 2) 布局坐标，提供时节点带 x / y 字段 (NaN 表示没有坐标)
+    """
+    encoded = encode_vectors(vectors, vector_encoding, binary=binary)
+    coords = positions.tolist() if positions is not None else None
+    nodes = []
+    for i, face_id in enumerate(ids):
+        node = {
+            "id": str(face_id),
+            "name": names[i],
+            "image_path": image_paths[i],
+            "image_data": image_data[i],
+        }
+        if encoded is not None:
+            node["vector"] = encoded[i]
+        if coords is not None and coords[i][0] == coords[i][0]:  # 跳过 NaN
+            node["x"], node["y"] = coords[i]
+        nodes.append(node)
+    return nodes
+
+
+def build_edges(edges):
+    """组装边列表，edges 为 (source_id, target_id, similarity, ...) 元组的可迭代对象"""
+    return [{"source": str(edge[0]), "target": str(edge[1]), "similarity": float(edge[2])} for edge in edges]
+
+
+def build_graph_payload(ids, names, image_paths, image_data, vectors, edges,
+                        vector_encoding=VECTORS_LIST, binary=False, positions=None):
+    """
+    组装人脸图数据 (字段与 FaceGraph 模型一致)
+
+    参数:
+        edges: [(source_id, target_id, similarity)] 列表
+        其余参数同 build_nodes
+
+    返回:
+        dict: 可直接序列化的图数据
+    """
+    return {
+        "nodes": build_nodes(ids, names, image_paths, image_data, vectors, vector_encoding, binary, positions),
+        "edges": build_edges(edges),
+        "vector_encoding": vector_encoding,
+        "vector_dim": int(vectors.shape[1]) if vectors is not None and vectors.ndim == 2 else 0,
+    }
+
+
+def serialize_line(payload):
+    """序列化为一行 NDJSON (JSON + 换行符)"""
+    return serialize(payload, JSON_MEDIA_TYPE) + b"\n"
+
+
+def serialize(payload, media_type=JSON_MEDIA_TYPE):
+    """按响应格式把图数据序列化为字节"""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(payload, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
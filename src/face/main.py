@@ -14,10 +14,11 @@ from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 
 # 导入API模块
-from face_api import app as api_app
+from face_api import app as api_app, lifespan as api_lifespan
 
 # 创建主应用
-app = FastAPI(title="人脸向量可视化应用")
+# 挂载的子应用不会执行自己的 lifespan，由主应用代为建立和关闭 Milvus 连接
+app = FastAPI(title="人脸向量可视化应用", lifespan=api_lifespan)
 
 # 添加CORS中间件
 app.add_middleware(
@@ -13,6 +13,101 @@ let width = 0;
 let height = 0;
 let similarityThreshold = 0.7;
 
+// 向量以 base64 编码的 float32 缓冲区传输 (比浮点数列表小约 4 倍)，悬停时才解码
+const VECTOR_ENCODING = "base64";
+
+// 构造人脸图数据流的请求地址 (NDJSON: 先节点后边，逐块到达)
+function graphUrl() {
+  return `/api/face-graph/stream?similarity_threshold=${similarityThreshold}&vectors=${VECTOR_ENCODING}`;
+}
+
+// 流式渲染时两次重绘之间的最小间隔 (毫秒)
+const RENDER_INTERVAL = 300;
+let renderTimer = null;
+
+// 合并短时间内的多次重绘请求
+function scheduleRender() {
+  if (renderTimer) {
+    return;
+  }
+  renderTimer = setTimeout(() => {
+    renderTimer = null;
+    renderGraph();
+  }, RENDER_INTERVAL);
+}
+
+// 读取 NDJSON 流，每收到一行调用一次 onMessage
+async function readNdjson(response, onMessage) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffer += decoder.decode(value, { stream: true });
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.filter((line) => line.trim()).forEach((line) => onMessage(JSON.parse(line)));
+  }
+  if (buffer.trim()) {
+    onMessage(JSON.parse(buffer));
+  }
+}
+
+// 获取人脸图数据流，节点和边到达后逐步渲染
+function streamGraph() {
+  return fetch(graphUrl()).then((response) => {
+    if (!response.ok) {
+      throw new Error("网络响应错误");
+    }
+    return readNdjson(response, (message) => {
+      if (message.type === "meta") {
+        graphData = { nodes: [], edges: [] };
+      } else if (message.type === "nodes") {
+        // 服务端布局坐标 (约在 [-1, 1] 范围内) 另存，x / y 留给 D3 作为像素坐标
+        message.items.forEach((node) => {
+          node.layoutX = node.x;
+          node.layoutY = node.y;
+          delete node.x;
+          delete node.y;
+        });
+        graphData.nodes.push(...message.items);
+        scheduleRender();
+      } else if (message.type === "edges") {
+        graphData.edges.push(...message.items);
+        scheduleRender();
+      } else if (message.type === "end") {
+        clearTimeout(renderTimer);
+        renderTimer = null;
+        renderGraph();
+      }
+    });
+  });
+}
+
+// 将 base64 编码的小端 float32 缓冲区解码为 Float32Array
+function decodeVector(encoded) {
+  const binary = atob(encoded);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return new Float32Array(bytes.buffer);
+}
+
+// 返回节点的向量 (数组)，兼容 list 与 base64 两种编码
+function nodeVector(node) {
+  if (node.vector == null) {
+    return null;
+  }
+  if (typeof node.vector === "string") {
+    node.vector = Array.from(decodeVector(node.vector));
+  }
+  return node.vector;
+}
+
 // 初始化函数
 function init() {
   // 获取容器尺寸
@@ -90,18 +185,8 @@ function fetchData() {
     .text("正在加载数据...")
     .attr("class", "loading-text");
 
-  // 从API获取数据
-  fetch(`/api/face-graph?similarity_threshold=${similarityThreshold}`)
-    .then((response) => {
-      if (!response.ok) {
-        throw new Error("网络响应错误");
-      }
-      return response.json();
-    })
-    .then((data) => {
-      graphData = data;
-      renderGraph();
-    })
+  // 从API流式获取数据
+  streamGraph()
     .catch((error) => {
       console.error("获取数据失败:", error);
       container.select(".loading-text").text("获取数据失败，请刷新页面重试。");
@@ -111,12 +196,7 @@ function fetchData() {
 // 更新图形，基于新的阈值筛选边
 function updateGraph() {
   // 重新获取数据（或者只获取边的数据）
-  fetch(`/api/face-graph?similarity_threshold=${similarityThreshold}`)
-    .then((response) => response.json())
-    .then((data) => {
-      graphData = data;
-      renderGraph();
-    })
+  streamGraph()
     .catch((error) => {
       console.error("更新数据失败:", error);
     });
@@ -124,6 +204,11 @@ function updateGraph() {
 
 // 渲染图形
 function renderGraph() {
+  // 流式渲染会多次重绘，先停止上一次的力模拟
+  if (simulation) {
+    simulation.stop();
+  }
+
   // 清除之前的图形
   container.selectAll("*").remove();
 
@@ -212,25 +297,43 @@ function renderGraph() {
   // 悬停事件 - 显示向量数据
   nodes.on("mouseover", showVectorInfo).on("mouseout", hideVectorInfo);
 
-  // 创建力模拟
-  simulation = d3
-    .forceSimulation(graphData.nodes)
-    .force(
-      "link",
-      d3
-        .forceLink(graphData.edges)
-        .id((d) => d.id)
-        .distance((d) => {
-          // 相似度越高，距离越近
-          return 200 * (1 - d.similarity);
-        })
-    )
-    .force("charge", d3.forceManyBody().strength(-300))
-    .force("center", d3.forceCenter(width / 2, height / 2).strength(0.1))
-    .force("collision", d3.forceCollide().radius(60))
-    .force("x", d3.forceX(width / 2).strength(0.05))
-    .force("y", d3.forceY(height / 2).strength(0.05))
-    .on("tick", ticked);
+  // 所有节点都有服务端布局坐标时直接按坐标绘制，不运行力模拟，渲染开销与节点数成线性
+  const useLayout = graphData.nodes.length > 0 && graphData.nodes.every((d) => d.layoutX != null);
+
+  if (useLayout) {
+    const radius = Math.min(width, height) * 0.45;
+    const nodeById = new Map(graphData.nodes.map((d) => [d.id, d]));
+    graphData.nodes.forEach((d) => {
+      d.x = width / 2 + d.layoutX * radius;
+      d.y = height / 2 + d.layoutY * radius;
+    });
+    graphData.edges.forEach((d) => {
+      if (typeof d.source !== "object") d.source = nodeById.get(d.source);
+      if (typeof d.target !== "object") d.target = nodeById.get(d.target);
+    });
+    simulation = null;
+    ticked();
+  } else {
+    // 创建力模拟
+    simulation = d3
+      .forceSimulation(graphData.nodes)
+      .force(
+        "link",
+        d3
+          .forceLink(graphData.edges)
+          .id((d) => d.id)
+          .distance((d) => {
+            // 相似度越高，距离越近
+            return 200 * (1 - d.similarity);
+          })
+      )
+      .force("charge", d3.forceManyBody().strength(-300))
+      .force("center", d3.forceCenter(width / 2, height / 2).strength(0.1))
+      .force("collision", d3.forceCollide().radius(60))
+      .force("x", d3.forceX(width / 2).strength(0.05))
+      .force("y", d3.forceY(height / 2).strength(0.05))
+      .on("tick", ticked);
+  }
 
   // 定位函数
   function ticked() {
@@ -250,6 +353,7 @@ function renderGraph() {
 
   // 拖拽开始
   function dragStarted(event, d) {
+    if (!simulation) return;
     if (!event.active) simulation.alphaTarget(0.3).restart();
     d.fx = d.x;
     d.fy = d.y;
@@ -257,12 +361,20 @@ function renderGraph() {
 
   // 拖拽中
   function dragged(event, d) {
+    if (!simulation) {
+      // 固定布局下直接移动节点并更新连线
+      d.x = event.x;
+      d.y = event.y;
+      ticked();
+      return;
+    }
     d.fx = event.x;
     d.fy = event.y;
   }
 
   // 拖拽结束
   function dragEnded(event, d) {
+    if (!simulation) return;
     if (!event.active) simulation.alphaTarget(0);
     d.fx = null;
     d.fy = null;
@@ -275,7 +387,10 @@ function showVectorInfo(event, d) {
   const vectorData = document.querySelector(".vector-data");
 
   // 格式化向量数据展示，只显示前10个元素和后10个元素
-  const vector = d.vector;
+  const vector = nodeVector(d);
+  if (!vector) {
+    return;
+  }
   let displayVector;
 
   if (vector.length > 20) {
@@ -319,6 +434,9 @@ window.addEventListener("resize", () => {
     if (graphData && simulation) {
       simulation.force("center", d3.forceCenter(width / 2, height / 2));
       simulation.alpha(0.3).restart();
+    } else if (graphData) {
+      // 固定布局按新尺寸重新缩放
+      renderGraph();
     }
   }
 });
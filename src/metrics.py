@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日志与指标模块
+- configure_logging(): 按环境变量 LOG_LEVEL 配置分级日志 (OFF 关闭全部日志)
+- stage(name): 计时上下文，记录到 Prometheus 直方图 stage_seconds{stage=...}
+- instrument_client(client): 为 MilvusClient 的主要方法记录耗时 milvus_call_seconds{method=...} 和错误数
+- RunSummary: 收集一次任务 (例如 process_images) 中各阶段的次数和耗时，结束时输出汇总
+
+prometheus_client 为可选依赖；未安装时指标记录为空操作，日志和 RunSummary 照常工作。
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+except ImportError:  # 可选依赖
+    prometheus_client = None
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# 记录耗时的 MilvusClient 方法
+INSTRUMENTED_METHODS = (
+    "load_collection", "release_collection", "query", "query_iterator", "search", "search_iterator",
+    "hybrid_search", "get", "insert", "upsert", "delete", "flush", "create_index",
+)
+
+# 直方图分桶 (秒)，覆盖从单次小查询到整批索引构建
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def configure_logging(level=None):
+    """
+    配置根日志
+
+    参数:
+        level: 日志级别名称，默认读取环境变量 LOG_LEVEL (默认 INFO)；OFF 关闭全部日志
+    """
+    level = (level or os.environ.get("LOG_LEVEL", "INFO")).upper()
+    if level == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    logging.disable(logging.NOTSET)
+    logging.basicConfig(level=getattr(logging, level, logging.INFO), format=LOG_FORMAT)
+
+
+class _NoopMetric:
+    """未安装 prometheus_client 时使用的空指标"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _histogram(name, documentation, labelnames):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Histogram(name, documentation, labelnames, buckets=LATENCY_BUCKETS)
+
+
+def _counter(name, documentation, labelnames):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Counter(name, documentation, labelnames)
+
+
+def _gauge(name, documentation, labelnames):
+    if prometheus_client is None:
+        return _NoopMetric()
+    return prometheus_client.Gauge(name, documentation, labelnames)
+
+
+STAGE_SECONDS = _histogram("stage_seconds", "各处理阶段的耗时 (秒)", ["stage"])
+MILVUS_CALL_SECONDS = _histogram("milvus_call_seconds", "MilvusClient 调用耗时 (秒)", ["method"])
+MILVUS_CALL_ERRORS = _counter("milvus_call_errors_total", "MilvusClient 调用失败次数", ["method"])
+HTTP_REQUEST_SECONDS = _histogram("http_request_seconds", "HTTP 请求耗时 (秒)", ["method", "path", "status"])
+SEARCH_CACHE_LOOKUPS = _counter("search_cache_lookups_total", "搜索结果缓存的查询次数 (按是否命中)", ["result"])
+COLLECTION_DELETED_RATIO = _gauge("milvus_collection_deleted_ratio", "集合中已删除但尚未压缩的行的比例", ["collection"])
+FEDERATED_SHARD_SECONDS = _histogram("federated_shard_seconds", "联合搜索中每个分片的耗时 (秒)", ["collection", "status"])
+COMPACTIONS = _counter("milvus_compactions_total", "触发的压缩 (compaction) 次数", ["collection", "reason"])
+
+
+class RunSummary:
+    """
+    一次任务中各阶段的耗时汇总 (线程安全)
+    在 with run_summary.activate(): 范围内，stage() 除了记录直方图，也累加到该汇总
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage_name, seconds):
+        with self._lock:
+            count, total = self.stages.get(stage_name, (0, 0.0))
+            self.stages[stage_name] = (count + 1, total + seconds)
+
+    def count(self, name, amount=1):
+        """累加一个计数 (例如成功/失败的图像数量)"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def activate(self):
+        """在当前线程中把 stage() 的耗时累加到本汇总"""
+        previous = getattr(_active, "summary", None)
+        _active.summary = self
+        try:
+            yield self
+        finally:
+            _active.summary = previous
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "counters": dict(self.counters),
+            "stages": {
+                name: {"count": count, "total_seconds": round(total, 4),
+                       "mean_ms": round(total / count * 1000, 3) if count else 0.0}
+                for name, (count, total) in sorted(self.stages.items(), key=lambda item: -item[1][1])
+            },
+        }
+
+    def format(self):
+        """格式化为多行文本 (按总耗时从高到低)"""
+        summary = self.as_dict()
+        lines = [f"{self.name} 总耗时 {summary['total_seconds']:.2f}s"]
+        for name, value in summary["counters"].items():
+            lines.append(f"  {name}: {value}")
+        for name, stats in summary["stages"].items():
+            lines.append(f"  {name:<24} 次数 {stats['count']:>6}  总计 {stats['total_seconds']:>8.3f}s  "
+                         f"平均 {stats['mean_ms']:>8.2f}ms")
+        return "\n".join(lines)
+
+    def write(self, path):
+        """把汇总写入 JSON 文件"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, ensure_ascii=False, indent=2)
+
+
+_active = threading.local()
+
+
+@contextmanager
+def stage(name):
+    """记录一个处理阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        summary = getattr(_active, "summary", None)
+        if summary is not None:
+            summary.record(name, elapsed)
+
+
+def _timed_method(method_name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            MILVUS_CALL_ERRORS.labels(method=method_name).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            MILVUS_CALL_SECONDS.labels(method=method_name).observe(elapsed)
+            summary = getattr(_active, "summary", None)
+            if summary is not None:
+                summary.record(f"milvus.{method_name}", elapsed)
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_client(client):
+    """
+    为 MilvusClient 实例的主要方法记录耗时 (只影响该实例)
+
+    返回:
+        同一个 client
+    """
+    for method_name in INSTRUMENTED_METHODS:
+        method = getattr(client, method_name, None)
+        if method is None or getattr(method, "__instrumented__", False):
+            continue
+        setattr(client, method_name, _timed_method(method_name, method))
+    return client
+
+
+def metrics_payload():
+    """
+    返回 Prometheus 文本格式的指标
+
+    返回:
+        (bytes, content_type)，未安装 prometheus_client 时返回 None
+    """
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
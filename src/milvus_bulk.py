@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Milvus 批量导入模块
+比较两种构建顺序:
+- index_first:  先建索引再插入，每个 segment 封存时单独构建索引，适合小数据量/持续写入
+- insert_first: 先插入全部数据，一次 flush 后只构建一次索引，适合大批量导入
+
+bulk_load() 默认使用 index_first (benchmarks/results/index_order_milvus_lite.md 中所有规模下都更快)，
+在目标服务上测得交叉点后可以通过环境变量为大数据量改用 insert_first；
+导入期间不触发任何中间索引构建，最后只做一次 flush 和一次索引构建。
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from milvus_cache import bump_version
+from milvus_consistency import WriteToken, last_write_token
+from milvus_index import build_index_async
+from milvus_wait import wait_for_dropped, wait_for_index_built
+
+INDEX_FIRST = "index_first"
+INSERT_FIRST = "insert_first"
+
+# 向量总量 (行数 x 维度) 达到该值时改为先插入后建索引，None 表示总是先建索引。
+# bench_index_order.py 在 Milvus Lite 上测得 index_first 在全部规模 (最大 1024 维 x 10 万行) 下都更快，
+# 没有交叉点，因此默认不设阈值；在目标服务上测得交叉点后通过环境变量
+# MILVUS_BULK_INDEX_FIRST_MAX_ELEMENTS 设定。
+_max_elements = os.environ.get("MILVUS_BULK_INDEX_FIRST_MAX_ELEMENTS")
+INDEX_FIRST_MAX_ELEMENTS = int(_max_elements) if _max_elements else None
+
+# 单次 insert 请求的大致大小上限 (字节)，远低于 gRPC 消息大小限制
+INSERT_BATCH_BYTES = 16 * 1024 * 1024
+
+
+@dataclass
+class BulkLoadReport:
+    """一次批量导入的耗时统计 (秒)"""
+    order: str
+    rows: int = 0
+    create_seconds: float = 0.0
+    insert_seconds: float = 0.0
+    flush_seconds: float = 0.0
+    index_seconds: float = 0.0
+    batches: int = 0
+    # 最后一次插入的写入令牌，读请求带上该令牌即可读到全部导入的数据
+    write_token: Optional[WriteToken] = None
+
+    @property
+    def total_seconds(self):
+        return self.create_seconds + self.insert_seconds + self.flush_seconds + self.index_seconds
+
+
+def choose_build_order(num_rows, dim):
+    """根据数据规模选择构建顺序"""
+    if INDEX_FIRST_MAX_ELEMENTS is None or num_rows * dim < INDEX_FIRST_MAX_ELEMENTS:
+        return INDEX_FIRST
+    return INSERT_FIRST
+
+
+def rows_per_batch(dim):
+    """按向量维度计算每批插入的行数，使单次请求大小约为 INSERT_BATCH_BYTES"""
+    return max(1, INSERT_BATCH_BYTES // (4 * dim))
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_load(client, collection_name, schema, index_params, index_name, rows, dim,
+              num_rows=None, order="auto", recreate=True, num_partitions=None, on_progress=None):
+    """
+    批量导入数据并构建索引
+
+    参数:
+        client: MilvusClient
+        collection_name: 集合名称
+        schema: 集合 Schema
+        index_params: 向量索引参数
+        index_name: 向量索引名称
+        rows: 实体 (dict) 的列表或迭代器
+        dim: 向量维度，用于选择构建顺序和批大小
+        num_rows: 实体数量；rows 是迭代器时可以提前告知，默认取 len(rows)
+        order: "auto"、"index_first" 或 "insert_first"
+        recreate: 集合已存在时是否删除重建
+        num_partitions: Schema 中声明了 Partition Key 时使用的分区数量
+        on_progress: 索引构建进度回调，默认不输出
+
+    返回:
+        BulkLoadReport: 各阶段耗时
+    """
+    if num_rows is None:
+        num_rows = len(rows)
+    if order == "auto":
+        order = choose_build_order(num_rows, dim)
+    report = BulkLoadReport(order=order)
+
+    start = time.perf_counter()
+    if client.has_collection(collection_name=collection_name):
+        if not recreate:
+            raise ValueError(f"集合 '{collection_name}' 已存在")
+        client.drop_collection(collection_name=collection_name)
+        wait_for_dropped(client, collection_name)
+    # 不传 index_params 创建集合，导入期间不会自动建索引
+    create_kwargs = {"num_partitions": num_partitions} if num_partitions else {}
+    client.create_collection(collection_name=collection_name, schema=schema, **create_kwargs)
+    report.create_seconds = time.perf_counter() - start
+
+    build = None
+    if order == INDEX_FIRST:
+        start = time.perf_counter()
+        build = build_index_async(client, collection_name, index_params, index_name, on_progress=on_progress)
+        build.wait()
+        report.index_seconds += time.perf_counter() - start
+
+    start = time.perf_counter()
+    for batch in _batches(rows, rows_per_batch(dim)):
+        client.insert(collection_name=collection_name, data=batch)
+        report.rows += len(batch)
+        report.batches += 1
+    report.insert_seconds = time.perf_counter() - start
+    report.write_token = last_write_token(client, collection_name)
+
+    # 整个导入只做一次 flush
+    start = time.perf_counter()
+    client.flush(collection_name=collection_name)
+    report.flush_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if order == INSERT_FIRST:
+        build_index_async(client, collection_name, index_params, index_name, on_progress=on_progress).wait()
+    else:
+        # 索引已存在，等待 flush 后封存的 segment 完成索引构建 (已索引行数达到插入行数)，
+        # 两种顺序的计时终点一致
+        wait_for_index_built(client, collection_name, build.resolved_index_name, expected_rows=report.rows,
+                             timeout=None)
+    report.index_seconds += time.perf_counter() - start
+
+    # 集合已重建，使各进程中该集合的搜索缓存失效
+    bump_version(client, collection_name)
+    return report
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+搜索结果缓存
+人脸重识别和语义搜索中相同或几乎相同的查询反复出现，SearchCache 在客户端缓存 client.search 的结果:
+- 键: 集合、量化后的查询向量、过滤表达式、limit、搜索参数、输出字段，以及集合的数据版本
+- 每个查询向量单独缓存，一次请求中未命中的向量合并为一次 search 调用
+- TTL 过期 + 容量上限 (LRU 淘汰)
+
+数据版本保存在集合属性 app.data_version 中，写入方 (bulk_load、聚类任务等) 写入后调用 bump_version()。
+其他进程中的缓存每隔 version_check_interval 秒读取一次集合属性，版本变化后旧的缓存条目不再命中，
+因此另一个进程写入后最多在该间隔内返回旧结果；同一进程内的写入立即生效。
+
+每次 bump_version 是一次 alter_collection_properties，属于 DDL: 由 RootCoord 与建索引、加载等 DDL 串行执行，
+耗时通常为几十毫秒，并使所有进程的缓存整体失效。应按一次逻辑写入 (一次导入、一批文件) 调用一次，
+不要每个写入批次调用；一次逻辑写入内部多处调用 bump_version 时 (例如 upsert 后再更新身份索引)，
+在最外层用 deferred_bumps() 包住，退出时每个集合只写入一次集合属性。
+
+环境变量:
+    MILVUS_SEARCH_CACHE_SIZE       缓存的查询向量数量上限，默认 10000，0 表示关闭缓存
+    MILVUS_SEARCH_CACHE_TTL        缓存条目的有效期 (秒)，默认 300
+    MILVUS_SEARCH_CACHE_QUANTUM    查询向量的量化步长，默认 1e-3 (L2 归一化向量上相差小于该值的查询共用结果)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import SEARCH_CACHE_LOOKUPS
+
+# 保存数据版本的集合属性
+VERSION_PROPERTY = "app.data_version"
+# 默认每隔该时间 (秒) 从集合属性读取一次数据版本
+DEFAULT_VERSION_CHECK_INTERVAL = 2.0
+
+_local_versions = {}
+# deferred_bumps 中已在本进程生效、尚未写入集合属性的版本
+_pending_versions = {}
+_versions_lock = threading.Lock()
+# 当前线程最外层 deferred_bumps 中调用过 bump_version 的集合: collection_name -> client
+_deferred = threading.local()
+
+
+def bump_version(client, collection_name):
+    """
+    写入集合后调用: 生成新的数据版本并写入集合属性，使所有进程中该集合的缓存结果失效
+    每次调用是一次 DDL (见模块说明)；在 deferred_bumps() 中调用时本进程立即生效，退出时才写入集合属性
+
+    返回:
+        新的版本字符串
+    """
+    version = f"{time.time_ns():x}-{os.getpid()}"
+    deferred = getattr(_deferred, "collections", None)
+    with _versions_lock:
+        _local_versions[collection_name] = version
+        if deferred is not None:
+            _pending_versions[collection_name] = version
+    if deferred is not None:
+        deferred[collection_name] = client
+    else:
+        _persist_version(client, collection_name, version)
+    return version
+
+
+def _persist_version(client, collection_name, version):
+    """把版本写入集合属性；写入的是本进程最新的版本时不再保留待写入的版本"""
+    client.alter_collection_properties(collection_name=collection_name, properties={VERSION_PROPERTY: version})
+    with _versions_lock:
+        if _local_versions.get(collection_name) == version:
+            _pending_versions.pop(collection_name, None)
+
+
+@contextmanager
+def deferred_bumps():
+    """
+    合并 with 块中 (当前线程) 的 bump_version: 本进程的缓存立即按新版本失效，
+    退出时 (包括抛出异常时) 每个集合只写入一次集合属性。可以嵌套，由最外层写入
+    """
+    if getattr(_deferred, "collections", None) is not None:
+        yield
+        return
+    _deferred.collections = collections = {}
+    try:
+        yield
+    finally:
+        _deferred.collections = None
+        for collection_name, client in collections.items():
+            with _versions_lock:
+                version = _pending_versions.get(collection_name)
+            # 其他线程已写入更新的版本时不再写入
+            if version is not None:
+                _persist_version(client, collection_name, version)
+
+
+def read_version(client, collection_name):
+    """从集合属性读取数据版本，没有写入过时为空字符串"""
+    properties = client.describe_collection(collection_name=collection_name).get("properties") or {}
+    return str(properties.get(VERSION_PROPERTY, ""))
+
+
+def plain_hit(hit):
+    """
+    把一条搜索结果转换为 {"id", "distance", "entity"} 字典
+    pymilvus 的 Hit 以主键字段名为键，主键不叫 id 的集合 (例如以人名为主键) 要通过 hit.id 读取
+    """
+    return {"id": hit.id if hasattr(hit, "pk") else hit["id"], "distance": hit["distance"],
+            "entity": dict(hit["entity"])}
+
+
+def _normalize_params(value):
+    """把搜索参数等转换为稳定的字符串 (字典按键排序)"""
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class SearchCache:
+    """client.search 的结果缓存 (线程安全)"""
+
+    def __init__(self, max_entries=None, ttl=None, quantum=None, version_check_interval=DEFAULT_VERSION_CHECK_INTERVAL):
+        """
+        参数:
+            max_entries: 缓存的查询向量数量上限，默认读取 MILVUS_SEARCH_CACHE_SIZE
+            ttl: 缓存条目的有效期 (秒)，默认读取 MILVUS_SEARCH_CACHE_TTL
+            quantum: 查询向量的量化步长，默认读取 MILVUS_SEARCH_CACHE_QUANTUM
+            version_check_interval: 读取集合数据版本的间隔 (秒)
+        """
+        self.max_entries = int(os.environ.get("MILVUS_SEARCH_CACHE_SIZE", 10000)) if max_entries is None else max_entries
+        self.ttl = float(os.environ.get("MILVUS_SEARCH_CACHE_TTL", 300)) if ttl is None else ttl
+        self.quantum = float(os.environ.get("MILVUS_SEARCH_CACHE_QUANTUM", 1e-3)) if quantum is None else quantum
+        self.version_check_interval = version_check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # collection_name -> (version, checked_at)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, client, collection_name):
+        """返回集合当前的数据版本 (本进程写入的版本立即可见，其他进程的写入按间隔读取)"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(collection_name)
+        with _versions_lock:
+            local = _local_versions.get(collection_name)
+            pending = _pending_versions.get(collection_name)
+        if pending is not None:
+            # 尚未写入集合属性，读取集合属性只会得到写入前的版本
+            return pending
+        fresh = cached is not None and now - cached[1] < self.version_check_interval
+        if fresh and (local is None or local == cached[0]):
+            return cached[0]
+        version = read_version(client, collection_name)
+        with self._lock:
+            self._versions[collection_name] = (version, now)
+        return version
+
+    def _query_key(self, vector, prefix):
+        quantized = np.round(np.asarray(vector, dtype=np.float32) / self.quantum).astype(np.int32)
+        digest = hashlib.blake2b(quantized.tobytes(), digest_size=16)
+        digest.update(prefix)
+        return digest.digest()
+
+    def search(self, client, collection_name, data, limit=10, filter="", search_params=None, anns_field=None,
+               output_fields=None, **kwargs):
+        """
+        与 client.search 参数相同，命中缓存的查询向量不访问服务端
+
+        返回:
+            每个查询向量一个结果列表，每个结果为 {"id", "distance", "entity"} 字典；
+            结果可能与其他调用方共享，不要修改
+        """
+        if not self.max_entries:
+            # 不缓存时同样返回字典，调用方只需处理一种结果类型
+            fetched = client.search(collection_name=collection_name, data=data, limit=limit, filter=filter,
+                                    search_params=search_params, anns_field=anns_field, output_fields=output_fields,
+                                    **kwargs)
+            return [[plain_hit(hit) for hit in hits] for hits in fetched]
+
+        version = self.version(client, collection_name)
+        prefix = "\0".join([
+            collection_name, version, filter or "", str(limit), str(anns_field),
+            _normalize_params(search_params), _normalize_params(sorted(output_fields or [])), _normalize_params(kwargs),
+        ]).encode("utf-8")
+        keys = [self._query_key(vector, prefix) for vector in data]
+
+        now = time.monotonic()
+        results = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    results[i] = entry[1]
+            missing = [i for i, result in enumerate(results) if result is None]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        SEARCH_CACHE_LOOKUPS.labels(result="hit").inc(len(keys) - len(missing))
+        SEARCH_CACHE_LOOKUPS.labels(result="miss").inc(len(missing))
+        if not missing:
+            return results
+
+        fetched = client.search(
+            collection_name=collection_name, data=[data[i] for i in missing], limit=limit, filter=filter,
+            search_params=search_params, anns_field=anns_field, output_fields=output_fields, **kwargs,
+        )
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for i, hits in zip(missing, fetched):
+                results[i] = [plain_hit(hit) for hit in hits]
+                self._entries[keys[i]] = (expires, results[i])
+                self._entries.move_to_end(keys[i])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        """返回 {"entries", "hits", "misses", "hit_rate"}"""
+        total = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_search_cache():
+    """返回进程内共享的 SearchCache"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SearchCache()
+        return _default_cache
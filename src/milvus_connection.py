@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Milvus 连接管理模块
+所有入口 (demo_01 ~ demo_08、人脸向量化与 API、句向量 demo) 共享的客户端工厂:
+- 连接配置统一从环境变量读取，不再在各脚本中硬编码 localhost:19530
+- 线程安全的连接池，每个连接持有独立的 gRPC channel，开启 keep-alive
+- 可配置的超时；建立连接时带随机抖动的指数退避重试 (call_with_retry)。
+  连接建立后的 RPC 调用依赖 pymilvus 自身的重试 (retry_on_rpc_failure，遇到 UNAVAILABLE 等错误时按退避重试)，
+  不再在外面叠加一层；需要额外重试的幂等调用可以显式使用 call_with_retry
+- 连接池创建的客户端自动记录主要方法的耗时指标 (见 metrics.py)
+
+环境变量:
+    MILVUS_URI            完整地址，例如 http://localhost:19530 (优先级最高)
+    MILVUS_HOST / MILVUS_PORT  未设置 MILVUS_URI 时用于拼接地址
+    MILVUS_TOKEN          认证 token (user:password 或 API key)
+    MILVUS_DB_NAME        数据库名
+    MILVUS_TIMEOUT        单次调用超时 (秒)
+    MILVUS_POOL_SIZE      连接池大小 (gRPC channel 数量)
+    MILVUS_MAX_RETRIES    可重试错误的最大重试次数
+    MILVUS_BACKOFF_BASE / MILVUS_BACKOFF_MAX  退避的初始/最大等待时间 (秒)
+    MILVUS_KEEPALIVE_MS   gRPC keep-alive 探测间隔 (毫秒)
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import grpc
+from pymilvus import MilvusClient
+from pymilvus.exceptions import ConnectError, MilvusUnavailableException
+
+from metrics import instrument_client
+
+logger = logging.getLogger(__name__)
+
+# 可以安全重试的 gRPC 状态码 (服务暂不可用、超时、限流)
+RETRYABLE_GRPC_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+
+
+@dataclass(frozen=True)
+class MilvusConfig:
+    """Milvus 连接配置"""
+    uri: str = "http://localhost:19530"
+    token: str = ""
+    db_name: str = ""
+    timeout: float = 10.0
+    pool_size: int = 4
+    max_retries: int = 3
+    backoff_base: float = 0.2
+    backoff_max: float = 5.0
+    keepalive_ms: int = 30000
+    # 连接空闲超过该时间后，再次取用前先做一次健康检查 (秒)
+    health_check_interval: float = 60.0
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """从环境变量构造配置，未设置的项使用默认值"""
+        env = os.environ if environ is None else environ
+        uri = env.get("MILVUS_URI")
+        if not uri:
+            host = env.get("MILVUS_HOST", "localhost")
+            port = env.get("MILVUS_PORT", "19530")
+            uri = f"http://{host}:{port}"
+        return cls(
+            uri=uri,
+            token=env.get("MILVUS_TOKEN", ""),
+            db_name=env.get("MILVUS_DB_NAME", ""),
+            timeout=float(env.get("MILVUS_TIMEOUT", cls.timeout)),
+            pool_size=max(1, int(env.get("MILVUS_POOL_SIZE", cls.pool_size))),
+            max_retries=max(0, int(env.get("MILVUS_MAX_RETRIES", cls.max_retries))),
+            backoff_base=float(env.get("MILVUS_BACKOFF_BASE", cls.backoff_base)),
+            backoff_max=float(env.get("MILVUS_BACKOFF_MAX", cls.backoff_max)),
+            keepalive_ms=int(env.get("MILVUS_KEEPALIVE_MS", cls.keepalive_ms)),
+        )
+
+
+def is_retryable(error):
+    """判断异常是否为暂时性错误 (连接失败、服务不可用、超时)"""
+    if isinstance(error, (ConnectError, MilvusUnavailableException, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, grpc.RpcError):
+        return error.code() in RETRYABLE_GRPC_CODES
+    return False
+
+
+def backoff_delays(config):
+    """
+    生成重试前的等待时间序列 (full jitter 指数退避)
+
+    第 n 次重试在 [0, min(backoff_max, backoff_base * 2^n)] 之间随机等待，
+    避免大量客户端在同一时刻一起重连
+    """
+    for attempt in range(config.max_retries):
+        yield random.uniform(0, min(config.backoff_max, config.backoff_base * (2 ** attempt)))
+
+
+def call_with_retry(func, *args, config=None, **kwargs):
+    """
+    调用 func(*args, **kwargs)，遇到暂时性错误时按抖动退避重试
+
+    参数:
+        func: 要调用的函数，例如 client.search
+        config: 重试配置，默认使用环境变量中的配置
+
+    返回:
+        func 的返回值；重试次数用完后抛出最后一次的异常
+    """
+    config = config or get_config()
+    delays = backoff_delays(config)
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            delay = next(delays, None)
+            if delay is None:
+                raise
+            logger.warning("Milvus 调用失败 (%s)，%.2fs 后重试...", e, delay)
+            time.sleep(delay)
+
+
+class _PooledConnection:
+    """连接池中的一个连接 (独立的 gRPC channel)"""
+
+    def __init__(self, client):
+        self.client = client
+        self.last_checked = time.monotonic()
+
+
+class _Slot:
+    """连接池中的一个位置；健康检查和重连只持有本位置的锁，不影响其他位置"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connection = None
+
+
+class MilvusConnectionPool:
+    """
+    线程安全的 Milvus 连接池
+
+    MilvusClient 本身可以被多个线程同时使用，但同一个 gRPC channel 上的并发
+    请求共享一条 TCP 连接。连接池维护 pool_size 个独立 channel，按轮询分配，
+    使并发的大结果集请求 (批量 get、并行搜索) 可以分摊到多条连接上。
+    连接在首次使用时才创建，之后一直保持温热，供同一进程中的所有调用方复用。
+    """
+
+    def __init__(self, config=None):
+        self.config = config or MilvusConfig.from_env()
+        # 只保护轮询位置的分配，连接的创建和健康检查在各位置自己的锁中进行
+        self._lock = threading.Lock()
+        self._slots = [_Slot() for _ in range(self.config.pool_size)]
+        self._next = 0
+
+    def _connect(self):
+        """创建一个新的连接，连接失败时按退避策略重试"""
+        client = call_with_retry(
+            MilvusClient,
+            uri=self.config.uri,
+            token=self.config.token,
+            db_name=self.config.db_name,
+            timeout=self.config.timeout,
+            # 每个连接使用独立的 channel，而不是复用进程内共享的 handler
+            dedicated=True,
+            grpc_options={
+                "grpc.keepalive_time_ms": self.config.keepalive_ms,
+                "grpc.keepalive_permit_without_calls": True,
+            },
+            config=self.config,
+        )
+        return instrument_client(client)
+
+    def _healthy(self, connection):
+        """空闲过久的连接在取用前做一次轻量的健康检查"""
+        if time.monotonic() - connection.last_checked < self.config.health_check_interval:
+            return True
+        try:
+            connection.client.get_server_version(timeout=self.config.timeout)
+        except Exception:
+            return False
+        connection.last_checked = time.monotonic()
+        return True
+
+    def get_client(self):
+        """
+        获取一个可用的 MilvusClient (轮询分配)
+
+        返回:
+            MilvusClient: 共享的温热连接，调用方不需要也不应该关闭它
+        """
+        with self._lock:
+            slot = self._slots[self._next]
+            self._next = (self._next + 1) % len(self._slots)
+        # 健康检查 (一次 RPC) 和重连 (含退避等待) 在池锁之外进行，
+        # 一个位置上的慢服务或重连只阻塞取到同一位置的线程
+        with slot.lock:
+            connection = slot.connection
+            if connection is not None and not self._healthy(connection):
+                self._close_quietly(connection)
+                connection = slot.connection = None
+            if connection is None:
+                connection = slot.connection = _PooledConnection(self._connect())
+            return connection.client
+
+    def clients(self):
+        """返回池中全部连接 (按需创建)，用于把并行任务分摊到不同 channel"""
+        return [self.get_client() for _ in range(len(self._slots))]
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.client.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭池中所有连接 (等待正在进行的重连结束)"""
+        with self._lock:
+            slots, self._slots = self._slots, [_Slot() for _ in range(self.config.pool_size)]
+        for slot in slots:
+            with slot.lock:
+                if slot.connection is not None:
+                    self._close_quietly(slot.connection)
+                    slot.connection = None
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_config():
+    """返回默认连接池使用的配置"""
+    return get_pool().config
+
+
+def get_pool():
+    """返回进程内共享的默认连接池 (首次调用时根据环境变量创建)"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = MilvusConnectionPool()
+        return _default_pool
+
+
+def get_client():
+    """从默认连接池获取一个 MilvusClient"""
+    return get_pool().get_client()
+
+
+def close_pool():
+    """关闭默认连接池，通常在脚本结束或应用关闭时调用"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+            _default_pool = None
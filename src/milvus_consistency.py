@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+读取一致性级别与写入令牌
+写入后立即搜索的流程不需要 flush 或固定的 sleep: flush 只负责把数据持久化为 segment，
+插入的数据在 growing segment 中已经可以被搜索，读请求只需要等到服务端追上写入的时间戳。
+
+一致性级别 (每次调用通过 read_options 指定):
+- Strong:     等待读请求到达时刻之前的全部写入，最慢
+- Bounded:    允许落后服务端配置的时间窗口 (默认几秒)，大多数读请求使用
+- Session:    等待本进程对该集合的最近一次写入 (pymilvus 在进程内记录写入时间戳)
+- Eventually: 不等待，最快
+
+WriteToken 记录一次写入的时间戳 (混合时间戳)，读请求带上令牌时服务端等到该写入可见后再执行，
+比 Strong 等待的更少，并且可以编码为字符串传给其他进程 (例如 HTTP 响应头 X-Milvus-Write-Token)。
+服务端不返回写入时间戳时 (例如 Milvus Lite) 令牌的时间戳为 0，读请求退化为 Strong。
+
+环境变量:
+    MILVUS_READ_CONSISTENCY    read_options 未指定级别和令牌时使用的一致性级别，不设置时使用集合的默认级别
+"""
+
+import os
+from dataclasses import dataclass
+
+from pymilvus.client import ts_utils
+from pymilvus.client.utils import hybridts_to_unixtime
+
+STRONG = "Strong"
+BOUNDED = "Bounded"
+SESSION = "Session"
+EVENTUALLY = "Eventually"
+CONSISTENCY_LEVELS = (STRONG, BOUNDED, SESSION, EVENTUALLY)
+# 带 guarantee_timestamp 的读请求需要使用 Customized 级别，否则 pymilvus 会覆盖时间戳
+CUSTOMIZED = "Customized"
+
+# 在 HTTP 请求和响应中传递写入令牌的请求头
+WRITE_TOKEN_HEADER = "X-Milvus-Write-Token"
+
+
+@dataclass(frozen=True)
+class WriteToken:
+    """一次写入的时间戳，读请求带上令牌时可以读到这次写入"""
+    collection_name: str
+    timestamp: int
+
+    def encode(self):
+        """编码为 "集合名@时间戳" 字符串"""
+        return f"{self.collection_name}@{self.timestamp}"
+
+    @classmethod
+    def decode(cls, text):
+        """解析 encode() 的结果，格式错误时抛出 ValueError"""
+        collection_name, sep, timestamp = text.rpartition("@")
+        if not sep or not collection_name or not timestamp.isdigit():
+            raise ValueError(f"无效的写入令牌: {text}")
+        return cls(collection_name, int(timestamp))
+
+    @property
+    def unix_time(self):
+        """写入的物理时间 (秒)，时间戳为 0 时为 None"""
+        return hybridts_to_unixtime(self.timestamp) if self.timestamp else None
+
+    def merge(self, other):
+        """合并同一集合的两个令牌 (取较新的写入)"""
+        if other is None:
+            return self
+        if other.collection_name != self.collection_name:
+            raise ValueError("只能合并同一集合的写入令牌")
+        return self if self.timestamp >= other.timestamp else other
+
+
+def last_write_token(client, collection_name):
+    """
+    返回本进程通过 client 的服务端地址对集合最近一次写入的令牌
+    pymilvus 在每次 insert / upsert / delete 后记录集合的写入时间戳 (Session 一致性也使用该记录)；
+    并发写入时可能返回更晚一次写入的时间戳，读到的数据只会更新
+
+    返回:
+        WriteToken，本进程没有写入过该集合时为 None
+    """
+    try:
+        connection = client._get_connection()
+        db_name = client._generate_call_context().get_db_name()
+    except AttributeError:
+        # 不是 pymilvus 的 MilvusClient (例如测试替身)
+        return None
+    timestamp = ts_utils.get_collection_ts(collection_name, connection.server_address, db_name or "")
+    return None if timestamp is None else WriteToken(collection_name, int(timestamp))
+
+
+def _write(method, client, collection_name, **kwargs):
+    result = getattr(client, method)(collection_name=collection_name, **kwargs)
+    return result, last_write_token(client, collection_name) or WriteToken(collection_name, 0)
+
+
+def insert_with_token(client, collection_name, data, **kwargs):
+    """
+    client.insert，同时返回写入令牌
+
+    返回:
+        (insert 的结果, WriteToken)
+    """
+    return _write("insert", client, collection_name, data=data, **kwargs)
+
+
+def upsert_with_token(client, collection_name, data, **kwargs):
+    """client.upsert，同时返回写入令牌"""
+    return _write("upsert", client, collection_name, data=data, **kwargs)
+
+
+def delete_with_token(client, collection_name, **kwargs):
+    """client.delete (ids= 或 filter=)，同时返回写入令牌"""
+    return _write("delete", client, collection_name, **kwargs)
+
+
+def default_consistency():
+    """MILVUS_READ_CONSISTENCY 指定的默认一致性级别，未设置时为 None"""
+    level = os.environ.get("MILVUS_READ_CONSISTENCY", "").strip()
+    return check_consistency(level) if level else None
+
+
+def check_consistency(level):
+    """返回规范的一致性级别名称 (不区分大小写)，未知级别抛出 ValueError"""
+    for name in CONSISTENCY_LEVELS:
+        if level.lower() == name.lower():
+            return name
+    raise ValueError(f"未知的一致性级别: {level} (可选 {', '.join(CONSISTENCY_LEVELS)})")
+
+
+def read_options(consistency=None, token=None):
+    """
+    构造 search / query / get 的一致性参数
+
+    参数:
+        consistency: 一致性级别 (Strong / Bounded / Session / Eventually)，None 时使用 MILVUS_READ_CONSISTENCY
+        token: WriteToken，指定时读请求等到该写入可见，优先于 consistency
+
+    返回:
+        可以直接展开到 client.search(**options) 的关键字参数，都未指定时为空字典
+    """
+    if token is not None:
+        if not token.timestamp:
+            return {"consistency_level": STRONG}
+        return {"consistency_level": CUSTOMIZED, "guarantee_timestamp": token.timestamp}
+    level = check_consistency(consistency) if consistency else default_consistency()
+    return {"consistency_level": level} if level else {}
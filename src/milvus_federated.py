@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+跨多个集合 / 分区的联合搜索 (fan-out)
+数据按站点、租户或时间分到多个集合 (或同一集合的多个分区) 时，federated_search 把同一批查询向量
+并发地发给每个分片，再把各分片已排好序的 top-k 用堆归并为全局 top-k:
+
+- 并发: 共享线程池中每个分片一个任务，分片轮流分配到连接池的不同 gRPC channel 上
+- 超时: 每个分片的 search 带 gRPC 截止时间 timeout，超时的分片不等待，记为 timeout
+- 部分结果: policy=partial 时至少 min_shards 个分片成功即返回 (结果中标明哪些分片缺失)，
+  policy=all 时任一分片失败都抛出 FederatedSearchError
+- 每个分片的耗时、状态和结果数量记录在 ShardReport 中，并记录到直方图 federated_shard_seconds{collection,status}
+
+各分片必须使用相同的向量字段和度量，相似度 (距离) 才能直接比较。
+
+环境变量:
+    MILVUS_FEDERATED_WORKERS  联合搜索共享线程池的线程数，默认 16
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import List, Optional
+
+from metrics import FEDERATED_SHARD_SECONDS
+from milvus_cache import plain_hit
+from milvus_connection import get_client
+from milvus_range import SIMILARITY_METRICS
+
+# 任一分片失败都视为搜索失败
+POLICY_ALL = "all"
+# 返回成功分片的结果
+POLICY_PARTIAL = "partial"
+POLICIES = (POLICY_ALL, POLICY_PARTIAL)
+
+DEFAULT_SHARD_TIMEOUT = 2.0
+
+STATUS_OK = "ok"
+STATUS_TIMEOUT = "timeout"
+STATUS_ERROR = "error"
+
+
+@dataclass(frozen=True)
+class Shard:
+    """一个搜索分片: 一个集合，或集合中的部分分区"""
+    collection_name: str
+    partition_names: Optional[tuple] = None
+    # 只作用于该分片的过滤表达式，与请求的 filter 用 and 合并
+    filter: str = ""
+
+    @property
+    def label(self):
+        if not self.partition_names:
+            return self.collection_name
+        return f"{self.collection_name}:{','.join(self.partition_names)}"
+
+    @classmethod
+    def parse(cls, text):
+        """解析 "集合" 或 "集合:分区1,分区2" """
+        collection_name, _, partitions = text.partition(":")
+        names = tuple(p.strip() for p in partitions.split(",") if p.strip())
+        return cls(collection_name.strip(), names or None)
+
+
+@dataclass
+class ShardReport:
+    """一个分片的搜索结果概要"""
+    shard: str
+    status: str
+    latency_ms: float
+    # 各查询向量的结果数量之和
+    hits: int = 0
+    error: Optional[str] = None
+
+    def as_dict(self):
+        return {"shard": self.shard, "status": self.status, "latency_ms": round(self.latency_ms, 2),
+                "hits": self.hits, "error": self.error}
+
+
+@dataclass
+class FederatedResult:
+    """federated_search 的结果"""
+    # 每个查询向量一个结果列表，每个结果为 {"id", "distance", "entity", "shard"}，按相似度从高到低 (距离从小到大)
+    results: list
+    shards: List[ShardReport]
+
+    @property
+    def partial(self):
+        """是否有分片没有返回结果"""
+        return any(report.status != STATUS_OK for report in self.shards)
+
+
+class FederatedSearchError(RuntimeError):
+    """成功的分片不足，reports 为各分片的 ShardReport"""
+
+    def __init__(self, message, reports):
+        super().__init__(message)
+        self.reports = reports
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.environ.get("MILVUS_FEDERATED_WORKERS", 16))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="milvus-federated")
+        return _executor
+
+
+def _search_shard(client, shard, data, anns_field, search_params, limit, filter, output_fields, timeout, kwargs):
+    expr = " and ".join(f"({part})" for part in (filter, shard.filter) if part)
+    start = time.perf_counter()
+    if client is None:
+        # 在分片任务中从连接池取连接 (轮询分配到不同 channel)，连接失败只记为该分片的 error
+        client = get_client()
+    results = client.search(
+        collection_name=shard.collection_name,
+        data=data,
+        anns_field=anns_field,
+        search_params=search_params,
+        limit=limit,
+        filter=expr,
+        output_fields=output_fields or [],
+        partition_names=list(shard.partition_names) if shard.partition_names else None,
+        timeout=timeout,
+        **kwargs,
+    )
+    hits = [[dict(plain_hit(hit), shard=shard.label) for hit in query_hits] for query_hits in results]
+    return hits, time.perf_counter() - start
+
+
+def merge_top_k(shard_results, limit, higher_is_better=True):
+    """
+    归并各分片已排好序的结果
+
+    参数:
+        shard_results: 每个分片一个结果列表 (各自按相似度排序)
+        limit: 保留的结果数量
+        higher_is_better: distance 越大越相似 (COSINE / IP) 时为 True
+
+    返回:
+        合并后的前 limit 个结果
+    """
+    merged = heapq.merge(*shard_results, key=lambda hit: hit["distance"], reverse=higher_is_better)
+    return list(itertools.islice(merged, limit))
+
+
+def federated_search(shards, data, anns_field, search_params, limit=10, filter="", output_fields=None,
+                     timeout=DEFAULT_SHARD_TIMEOUT, policy=POLICY_PARTIAL, min_shards=1, clients=None, **kwargs):
+    """
+    在多个分片上并发搜索并合并 top-k
+
+    参数:
+        shards: Shard 或集合名称 ("集合:分区1,分区2" 表示只搜索这些分区) 的列表
+        data: 查询向量列表
+        search_params: 搜索参数，metric_type 决定合并时的排序方向
+        limit: 每个查询向量的合并结果数量 (每个分片同样取 limit 个)
+        filter: 所有分片共用的过滤表达式
+        timeout: 每个分片的超时时间 (秒)
+        policy: partial (至少 min_shards 个分片成功即返回) / all (全部分片都必须成功)
+        clients: MilvusClient 列表，分片轮流使用；默认每个分片从连接池轮询取一个连接
+        kwargs: client.search 的其他参数 (例如 milvus_consistency.read_options 的一致性参数)
+
+    返回:
+        FederatedResult
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"未知的部分结果策略: {policy} (可选 {', '.join(POLICIES)})")
+    shards = [shard if isinstance(shard, Shard) else Shard.parse(shard) for shard in shards]
+    if not shards:
+        raise ValueError("至少需要一个分片")
+
+    executor = _get_executor()
+    started = time.perf_counter()
+    futures = [
+        executor.submit(_search_shard, clients[i % len(clients)] if clients else None, shard, data, anns_field, search_params, limit,
+                        filter, output_fields, timeout, kwargs)
+        for i, shard in enumerate(shards)
+    ]
+    # 超过 timeout 仍未返回的分片不再等待 (gRPC 截止时间会取消这些请求)
+    wait(futures, timeout=timeout)
+
+    reports, shard_results = [], []
+    for shard, future in zip(shards, futures):
+        if not future.done():
+            future.cancel()
+            report = ShardReport(shard.label, STATUS_TIMEOUT, (time.perf_counter() - started) * 1000)
+        else:
+            try:
+                hits, seconds = future.result()
+            except Exception as e:
+                status = STATUS_TIMEOUT if "DEADLINE_EXCEEDED" in str(e) else STATUS_ERROR
+                report = ShardReport(shard.label, status, (time.perf_counter() - started) * 1000, error=str(e))
+            else:
+                report = ShardReport(shard.label, STATUS_OK, seconds * 1000, hits=sum(len(h) for h in hits))
+                shard_results.append(hits)
+        FEDERATED_SHARD_SECONDS.labels(collection=shard.collection_name, status=report.status).observe(
+            report.latency_ms / 1000)
+        reports.append(report)
+
+    succeeded = len(shard_results)
+    if (policy == POLICY_ALL and succeeded < len(shards)) or succeeded < min(min_shards, len(shards)):
+        failed = ", ".join(f"{r.shard} ({r.status})" for r in reports if r.status != STATUS_OK)
+        raise FederatedSearchError(f"{len(shards)} 个分片中只有 {succeeded} 个成功: {failed}", reports)
+
+    higher_is_better = search_params.get("metric_type", "COSINE").upper() in SIMILARITY_METRICS
+    results = [
+        merge_top_k([hits[i] for hits in shard_results], limit, higher_is_better)
+        for i in range(len(data))
+    ]
+    return FederatedResult(results, reports)
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Milvus 索引管理模块
+- 异步触发索引构建，并通过 describe_index (已索引行数 / 总行数) 跟踪进度
+- 进度可以通过回调或 tqdm 进度条展示
+- 通过集合别名 (alias) 实现新旧索引配置的原子切换:
+  新配置在一个新集合上构建完成并加载后，再把别名切换过去，
+  搜索流量始终访问一个完整可用的索引
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+from pymilvus import CollectionSchema
+
+from milvus_wait import wait_for_loaded, wait_for_released
+
+POLL_INTERVAL = 1.0
+# describe_index 结果中不属于索引参数的键
+_INDEX_INFO_KEYS = {"field_name", "index_name", "index_type", "metric_type", "total_rows", "indexed_rows",
+                    "pending_index_rows", "state", "index_state_fail_reason"}
+
+
+@dataclass
+class IndexProgress:
+    """索引构建进度 (来自 describe_index)"""
+    index_name: str
+    state: str
+    indexed_rows: int
+    total_rows: int
+    pending_index_rows: int
+
+    @property
+    def fraction(self):
+        """已完成比例，集合为空时视为已完成"""
+        if self.total_rows <= 0:
+            return 1.0
+        return min(1.0, self.indexed_rows / self.total_rows)
+
+    @property
+    def finished(self):
+        return self.state == "Finished" and not self.pending_index_rows
+
+    @classmethod
+    def from_description(cls, index_name, info):
+        return cls(
+            index_name=index_name,
+            state=str(info.get("state", "")),
+            indexed_rows=int(info.get("indexed_rows", 0) or 0),
+            total_rows=int(info.get("total_rows", 0) or 0),
+            pending_index_rows=int(info.get("pending_index_rows", 0) or 0),
+        )
+
+
+def get_index_progress(client, collection_name, index_name):
+    """查询一次索引构建进度"""
+    info = client.describe_index(collection_name=collection_name, index_name=index_name)
+    return IndexProgress.from_description(index_name, info)
+
+
+def resolve_index_name(client, collection_name, field_name, index_name):
+    """
+    返回字段上实际的索引名称
+
+    部分部署 (如 Milvus Lite) 会忽略自定义的 index_name 而使用字段名，
+    这时按字段查找真实名称，保证 describe_index 能找到同一个索引
+    """
+    if not field_name:
+        return index_name
+    names = client.list_indexes(collection_name=collection_name, field_name=field_name)
+    if not names or index_name in names:
+        return index_name
+    return names[0]
+
+
+def print_progress(progress):
+    """默认的进度回调：打印一行进度信息"""
+    print(f"索引 '{progress.index_name}' 构建进度: {progress.indexed_rows}/{progress.total_rows} "
+          f"({progress.fraction:.0%}), 状态: {progress.state}")
+
+
+def tqdm_progress(desc=None):
+    """
+    创建一个基于 tqdm 的进度回调
+
+    返回:
+        callback: 可传给 build_index_async 的 on_progress 参数
+    """
+    from tqdm import tqdm
+
+    bar = None
+
+    def callback(progress):
+        nonlocal bar
+        if bar is None:
+            bar = tqdm(total=progress.total_rows, desc=desc or progress.index_name, unit="rows")
+        bar.total = progress.total_rows
+        bar.n = progress.indexed_rows
+        bar.refresh()
+        if progress.finished:
+            bar.close()
+
+    return callback
+
+
+class IndexBuild:
+    """
+    一次后台索引构建
+
+    create_index 在后台线程中执行，同时按 poll_interval 轮询 describe_index
+    并把进度交给回调。调用方可以继续处理其它工作 (包括搜索)，
+    需要时再通过 wait() 等待构建完成。
+    """
+
+    def __init__(self, client, collection_name, index_params, index_name,
+                 on_progress=None, poll_interval=POLL_INTERVAL):
+        self.client = client
+        self.collection_name = collection_name
+        self.index_params = index_params
+        self.index_name = index_name
+        self.field_name = next((p.field_name for p in index_params if p.index_name == index_name), None)
+        self._resolved_name = None
+        self.on_progress = on_progress
+        self.poll_interval = poll_interval
+        self.progress = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"index-build-{index_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def resolved_index_name(self):
+        """服务端实际使用的索引名称 (见 resolve_index_name)"""
+        return self._resolved_name or self.index_name
+
+    def wait(self, timeout=None):
+        """
+        等待索引构建完成
+
+        返回:
+            IndexProgress: 最终进度；构建失败时抛出对应异常，超时抛出 TimeoutError
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"等待索引 '{self.index_name}' 构建超时 ({timeout}s)")
+        if self.error is not None:
+            raise self.error
+        return self.progress
+
+    def _create(self, created):
+        try:
+            self.client.create_index(collection_name=self.collection_name, index_params=self.index_params)
+        except Exception as e:
+            self.error = e
+        finally:
+            created.set()
+
+    def _report(self, request_sent):
+        name = self._resolved_name or self.index_name
+        if request_sent and self._resolved_name is None:
+            name = self._resolved_name = resolve_index_name(
+                self.client, self.collection_name, self.field_name, self.index_name
+            )
+        progress = get_index_progress(self.client, self.collection_name, name)
+        progress.index_name = self.index_name
+        self.progress = progress
+        if self.on_progress is not None:
+            self.on_progress(self.progress)
+
+    def _run(self):
+        # 旧版本的 create_index 会阻塞到构建完成，因此放在单独的线程中，
+        # 当前线程只负责轮询进度
+        created = threading.Event()
+        threading.Thread(target=self._create, args=(created,), daemon=True).start()
+        try:
+            while self.error is None:
+                request_sent = created.is_set()
+                try:
+                    self._report(request_sent)
+                except Exception:
+                    # 请求发出前索引可能还不存在，describe_index 会报错
+                    if request_sent:
+                        raise
+                else:
+                    if self.progress.state == "Failed":
+                        raise RuntimeError(f"索引 '{self.index_name}' 构建失败")
+                    if request_sent and self.progress.finished:
+                        break
+                if request_sent:
+                    time.sleep(self.poll_interval)
+                else:
+                    # create_index 返回时立即醒来，不必等满一个轮询间隔
+                    created.wait(self.poll_interval)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+
+def build_index_async(client, collection_name, index_params, index_name,
+                      on_progress=print_progress, poll_interval=POLL_INTERVAL):
+    """
+    在后台开始构建索引
+
+    参数:
+        client: MilvusClient
+        collection_name: 集合名称
+        index_params: client.prepare_index_params() 生成的索引参数
+        index_name: 要跟踪进度的索引名称 (与 index_params 中的一致)
+        on_progress: 进度回调，参数为 IndexProgress；传 None 关闭进度输出
+        poll_interval: 进度轮询间隔 (秒)
+
+    返回:
+        IndexBuild: 已开始的构建任务
+    """
+    return IndexBuild(client, collection_name, index_params, index_name,
+                      on_progress=on_progress, poll_interval=poll_interval).start()
+
+
+def _copy_rows(client, source, target, schema, batch_size):
+    """把 source 中的全部实体复制到 target (auto_id 的主键由 target 重新生成)"""
+    primary = next(field for field in schema.fields if field.is_primary)
+    output_fields = [field.name for field in schema.fields if not (field.is_primary and schema.auto_id)]
+    iterator = client.query_iterator(
+        collection_name=source, batch_size=batch_size, output_fields=output_fields
+    )
+    copied = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            if schema.auto_id:
+                batch = [{k: v for k, v in row.items() if k != primary.name} for row in batch]
+            client.insert(collection_name=target, data=batch)
+            copied += len(batch)
+    finally:
+        iterator.close()
+    return copied
+
+
+def _inherited_indexes(client, source, index_params):
+    """
+    source 上 index_params 没有覆盖的字段的索引 (标量索引、其他向量字段的索引等)，按原配置在新集合上重建
+
+    返回:
+        [(IndexParams, 索引名称)]，每个索引单独一组参数以便分别等待构建完成
+    """
+    covered = {param.field_name for param in index_params}
+    inherited = []
+    for name in client.list_indexes(collection_name=source):
+        info = client.describe_index(collection_name=source, index_name=name)
+        if info["field_name"] in covered:
+            continue
+        params = client.prepare_index_params()
+        metric_type = info.get("metric_type")
+        params.add_index(
+            field_name=info["field_name"], index_type=info.get("index_type", ""), index_name=info["index_name"],
+            params={k: v for k, v in info.items() if k not in _INDEX_INFO_KEYS},
+            # 标量索引的 metric_type 为 NONE
+            **({"metric_type": metric_type} if metric_type and metric_type != "NONE" else {}),
+        )
+        inherited.append((params, info["index_name"]))
+    return inherited
+
+
+def swap_index_via_alias(client, alias, index_params, index_name, drop_old=True,
+                         on_progress=print_progress, copy_batch_size=1000, timeout=None):
+    """
+    用新的索引配置重建别名背后的集合，并在完成后原子切换
+
+    Milvus 的一个向量字段同一时间只能有一个索引，因此新配置构建在一个新集合上:
+    复制数据 -> 构建索引并等待完成 -> 加载 -> alter_alias 切换别名 -> (可选) 删除旧集合。
+    切换之前搜索流量一直访问旧集合的完整索引，切换之后直接访问新集合的完整索引。
+
+    旧集合上 index_params 没有覆盖的字段 (标量字段、其他向量字段) 的索引按原配置复制到新集合。
+
+    注意: 复制期间写入旧集合的数据不会出现在新集合中，重建期间应暂停写入；
+    auto_id 集合中的实体会在新集合中得到新的主键。
+
+    参数:
+        alias: 搜索流量使用的集合别名 (必须已存在)
+        index_params: 新的索引参数 (只需包含要修改的索引)
+        index_name: 新索引的名称
+        drop_old: 切换完成后是否释放并删除旧集合
+
+    返回:
+        str: 新集合的名称
+    """
+    old_collection = client.describe_alias(alias=alias)["collection_name"]
+    new_collection = f"{alias}_{int(time.time())}"
+
+    schema = CollectionSchema.construct_from_dict(client.describe_collection(collection_name=old_collection))
+    client.create_collection(collection_name=new_collection, schema=schema)
+    print(f"正在把 '{old_collection}' 的数据复制到 '{new_collection}'...")
+    copied = _copy_rows(client, old_collection, new_collection, schema, copy_batch_size)
+    client.flush(collection_name=new_collection)
+    print(f"已复制 {copied} 个实体。")
+
+    builds = [build_index_async(client, new_collection, index_params, index_name, on_progress=on_progress)]
+    builds.extend(build_index_async(client, new_collection, params, name, on_progress=None)
+                  for params, name in _inherited_indexes(client, old_collection, index_params))
+    for build in builds:
+        build.wait(timeout)
+    client.load_collection(collection_name=new_collection)
+    wait_for_loaded(client, new_collection)
+
+    # alter_alias 是原子操作，之后通过别名的请求全部落在新集合上
+    client.alter_alias(collection_name=new_collection, alias=alias)
+    print(f"别名 '{alias}' 已切换到 '{new_collection}'。")
+
+    if drop_old:
+        client.release_collection(collection_name=old_collection)
+        wait_for_released(client, old_collection)
+        client.drop_collection(collection_name=old_collection)
+        print(f"旧集合 '{old_collection}' 已删除。")
+    return new_collection
@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+长期运行集合的维护: 分批删除、按自然键 upsert、压缩 (compaction) 调度
+Milvus 的删除只写入删除记录 (tombstone)，被删除的行在压缩前仍占用 segment，搜索时要额外过滤；
+重复导入和修正图像还会留下大量小 segment。集合长期运行而不是整体重建时，需要定期压缩。
+
+- delete_by_filter(): 按过滤表达式分批读出主键再按主键删除，每批删除前可以回调 (例如同步维护派生数据)
+- upsert_by_key():    按自然键 (例如 image_path) 替换已有的行，主键为 auto_id 的集合先插入新行再删除旧行
+- collection_health(): 估算已删除行的比例，统计 segment 数量 (服务端不支持时为 None，例如 Milvus Lite)
+- CompactionScheduler: 定期检查，超过阈值时触发压缩并跟踪进度；每个集合同一时间只有一个压缩任务，
+  两次触发之间至少间隔 cooldown 秒 (通过集合属性 app.last_compaction 在多个进程间共享)
+
+已删除的行数取服务端统计 (get_collection_stats 在压缩前包含已删除的行) 与本进程通过本模块删除的行数中的较大值，
+服务端统计已经扣除删除的部署上 (例如 Milvus Lite) 只能看到本进程的删除。
+
+也可以作为脚本运行:
+    python src/milvus_maintenance.py --collection face_embeddings_collection --status   # 只输出统计
+    python src/milvus_maintenance.py --collection face_embeddings_collection --once     # 检查一次，需要时压缩
+    python src/milvus_maintenance.py --collection face_embeddings_collection            # 按间隔持续检查
+
+环境变量:
+    MILVUS_COMPACTION_INTERVAL_S         检查间隔 (秒)；API 服务中为 0 时不启动后台检查 (默认 0)
+    MILVUS_COMPACTION_DELETED_RATIO      已删除行的比例超过该值时压缩，默认 0.2
+    MILVUS_COMPACTION_MAX_SMALL_SEGMENTS 小 segment 的数量超过该值时压缩，默认 32
+    MILVUS_COMPACTION_COOLDOWN_S         同一集合两次压缩之间的最短间隔 (秒)，默认 3600
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from pymilvus.client.types import LoadState, SegmentState
+
+from metrics import COLLECTION_DELETED_RATIO, COMPACTIONS
+from milvus_cache import bump_version
+from milvus_consistency import STRONG, WriteToken, delete_with_token, insert_with_token, upsert_with_token
+from milvus_reader import DEFAULT_BATCH_SIZE, RecordBatch, concat_batches, iter_query_batches, read_all
+from milvus_wait import DEFAULT_TIMEOUT, get_load_state, poll_until
+
+logger = logging.getLogger(__name__)
+
+# 记录最近一次触发压缩的时间 (unix 秒) 的集合属性
+COMPACTION_PROPERTY = "app.last_compaction"
+# 行数少于该值的已持久化 segment 视为小 segment (默认 segment 上限约为数百万行 128 维向量)
+SMALL_SEGMENT_ROWS = 50000
+# 已删除的行少于该数量时不因比例触发压缩 (小集合的比例波动大，压缩收益也小)
+MIN_DELETED_ROWS = 1000
+# 命令行持续运行时默认的检查间隔 (秒)
+DEFAULT_INTERVAL = 300.0
+# 服务端返回的压缩任务状态
+COMPACTION_EXECUTING = "Executing"
+
+# 本进程通过本模块删除、尚未压缩的行数 {集合名: 行数}
+_deleted_rows = {}
+_deleted_lock = threading.Lock()
+
+
+def _record_deleted(collection_name, count):
+    if count:
+        with _deleted_lock:
+            _deleted_rows[collection_name] = _deleted_rows.get(collection_name, 0) + count
+
+
+def _reset_deleted(collection_name):
+    with _deleted_lock:
+        _deleted_rows.pop(collection_name, None)
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+@dataclass
+class DeleteReport:
+    """delete_by_filter 的结果"""
+    deleted: int = 0
+    batches: int = 0
+    # 最后一次删除的写入令牌，没有删除时为 None
+    write_token: Optional[WriteToken] = None
+
+
+def delete_by_filter(client, collection_name, filter, batch_size=DEFAULT_BATCH_SIZE, output_fields=None,
+                     vector_field=None, on_batch=None, id_field=None, bump=True):
+    """
+    按过滤表达式分批删除
+    先用 query_iterator 按批读出匹配行的主键，再按主键删除: 匹配的行再多，单次 delete 请求也只包含一批主键
+
+    参数:
+        filter: 过滤表达式，不能为空 (删除全部数据请直接删除集合)
+        batch_size: 每批删除的行数
+        output_fields / vector_field: 传给 on_batch 的批中包含的标量字段和向量字段
+        on_batch: 每批删除前调用 on_batch(RecordBatch)，抛出异常时停止删除 (已删除的批不回滚)
+        id_field: 主键字段名，默认从集合 Schema 中获取
+        bump: 删除后是否调用 bump_version (没有搜索缓存该集合，或由调用方在整个任务结束后调用时为 False)
+
+    返回:
+        DeleteReport
+    """
+    if not filter:
+        raise ValueError("delete_by_filter 需要过滤表达式")
+    report = DeleteReport()
+    try:
+        for batch in iter_query_batches(client, collection_name, filter=filter, output_fields=output_fields,
+                                        vector_field=vector_field, batch_size=batch_size, id_field=id_field):
+            if not len(batch):
+                continue
+            if on_batch is not None:
+                on_batch(batch)
+            _, token = delete_with_token(client, collection_name, ids=batch.ids.tolist())
+            _record_deleted(collection_name, len(batch))
+            report.deleted += len(batch)
+            report.batches += 1
+            report.write_token = token.merge(report.write_token)
+    finally:
+        if bump and report.deleted:
+            bump_version(client, collection_name)
+    return report
+
+
+@dataclass
+class UpsertReport:
+    """upsert_by_key 的结果"""
+    # 键此前不存在的行
+    inserted: int = 0
+    # 键已存在、被替换的行
+    replaced: int = 0
+    # 删除的旧行 (同一个键可能有多条旧行)
+    deleted: int = 0
+    # 被替换的旧行 (包含 old_fields 指定的字段)，没有旧行时为 None
+    previous: Optional[RecordBatch] = None
+    write_token: Optional[WriteToken] = None
+
+
+def _primary_key(client, collection_name):
+    """返回 (主键字段名, 是否 auto_id)"""
+    description = client.describe_collection(collection_name=collection_name)
+    primary = next(f for f in description["fields"] if f.get("is_primary"))
+    return primary["name"], bool(description.get("auto_id") or primary.get("auto_id"))
+
+
+def key_filter(key_field, keys):
+    """key_field 取值在 keys 中的过滤表达式"""
+    return f"{key_field} in {json.dumps(list(keys), ensure_ascii=False)}"
+
+
+def upsert_by_key(client, collection_name, rows, key_field, batch_size=DEFAULT_BATCH_SIZE, old_fields=None,
+                  old_vector_field=None):
+    """
+    按自然键 upsert: 键已存在的行被替换 (同一个键的多条旧行全部替换)，其他行直接插入
+    同一批中键重复的行只保留最后一行。
+
+    主键为 auto_id 时先插入新行再删除旧行: 两步之间读请求可能同时看到新旧两行，但不会两行都看不到；
+    中途失败后重新执行同一批 rows 会删除全部旧行 (包括上次插入的新行) 再插入，结果相同。
+    主键不是 auto_id 时 rows 必须包含主键，按主键 upsert 并删除键相同但主键不同的旧行。
+
+    参数:
+        rows: 行字典的列表，每行必须包含 key_field
+        key_field: 自然键字段 (例如 image_path)，建议建立标量索引
+        old_fields / old_vector_field: 需要返回的旧行字段 (例如用于从派生数据中减去旧行)
+
+    返回:
+        UpsertReport
+    """
+    id_field, auto_id = _primary_key(client, collection_name)
+    report = UpsertReport()
+    previous = []
+    try:
+        for start in range(0, len(rows), batch_size):
+            unique = {row[key_field]: row for row in rows[start:start + batch_size]}
+            batch_rows = list(unique.values())
+            existing = read_all(client, collection_name, filter=key_filter(key_field, unique),
+                                output_fields=[key_field] + list(old_fields or []), vector_field=old_vector_field,
+                                id_field=id_field, consistency_level=STRONG)
+            existing_keys = set(existing.columns.get(key_field, []))
+            if auto_id:
+                _, token = insert_with_token(client, collection_name, batch_rows)
+                stale = existing.ids.tolist()
+            else:
+                _, token = upsert_with_token(client, collection_name, batch_rows)
+                kept = {row[id_field] for row in batch_rows}
+                stale = [pk for pk in existing.ids.tolist() if pk not in kept]
+                # 沿用主键的行由服务端在 upsert 时删除旧版本，同样留下待压缩的删除记录
+                _record_deleted(collection_name, len(existing) - len(stale))
+            if stale:
+                _, token = delete_with_token(client, collection_name, ids=stale)
+                _record_deleted(collection_name, len(stale))
+            if len(existing):
+                previous.append(existing)
+            report.replaced += len(existing_keys)
+            report.inserted += len(batch_rows) - len(existing_keys)
+            report.deleted += len(stale)
+            report.write_token = token.merge(report.write_token)
+    finally:
+        if report.write_token is not None:
+            bump_version(client, collection_name)
+    report.previous = concat_batches(previous) if previous else None
+    return report
+
+
+@dataclass
+class CollectionHealth:
+    """集合的删除与 segment 统计"""
+    collection_name: str
+    # get_collection_stats 的行数
+    stored_rows: int
+    # count(*) 的行数，集合未加载时为 None
+    live_rows: Optional[int]
+    # 已删除、尚未压缩的行数 (估算)
+    deleted_rows: int
+    # 已持久化的 segment 数量，服务端不支持时为 None
+    segments: Optional[int] = None
+    small_segments: Optional[int] = None
+    # 只包含删除记录的 L0 segment 数量
+    l0_segments: Optional[int] = None
+
+    @property
+    def deleted_ratio(self):
+        total = max(self.stored_rows, (self.live_rows or 0) + self.deleted_rows)
+        return self.deleted_rows / total if total else 0.0
+
+    def as_dict(self):
+        return {
+            "collection": self.collection_name, "stored_rows": self.stored_rows, "live_rows": self.live_rows,
+            "deleted_rows": self.deleted_rows, "deleted_ratio": round(self.deleted_ratio, 4),
+            "segments": self.segments, "small_segments": self.small_segments, "l0_segments": self.l0_segments,
+        }
+
+
+# 服务端不支持 list_persistent_segments 时不再重复请求 (每次失败 pymilvus 都会输出错误日志)
+_segments_unsupported = False
+
+
+def segment_counts(client, collection_name, small_segment_rows=SMALL_SEGMENT_ROWS):
+    """
+    统计已持久化的 segment
+
+    返回:
+        (segment 数量, 小 segment 数量, L0 segment 数量)，服务端不支持时为 (None, None, None)
+    """
+    global _segments_unsupported
+    if _segments_unsupported:
+        return None, None, None
+    try:
+        segments = client.list_persistent_segments(collection_name)
+    except Exception as e:
+        # 例如 Milvus Lite 返回 UNIMPLEMENTED
+        if "UNIMPLEMENTED" in str(e) or "not implemented" in str(e).lower():
+            _segments_unsupported = True
+            return None, None, None
+        raise
+    segments = [s for s in segments if s.state in (SegmentState.Flushed, SegmentState.Sealed)]
+    l0 = [s for s in segments if s.level_name == "L0"]
+    small = [s for s in segments if s.level_name != "L0" and s.num_rows < small_segment_rows]
+    return len(segments) - len(l0), len(small), len(l0)
+
+
+def collection_health(client, collection_name, small_segment_rows=SMALL_SEGMENT_ROWS):
+    """返回集合的 CollectionHealth (count(*) 使用 Strong 一致性，集合未加载时不统计)"""
+    stored = int(client.get_collection_stats(collection_name=collection_name)["row_count"])
+    live = None
+    if get_load_state(client, collection_name) == LoadState.Loaded:
+        result = client.query(collection_name=collection_name, filter="", output_fields=["count(*)"],
+                              consistency_level=STRONG)
+        live = int(result[0]["count(*)"])
+    with _deleted_lock:
+        local = _deleted_rows.get(collection_name, 0)
+    deleted = max(stored - live if live is not None else 0, local)
+    segments, small, l0 = segment_counts(client, collection_name, small_segment_rows)
+    return CollectionHealth(collection_name, stored, live, deleted, segments, small, l0)
+
+
+def compaction_reason(health, deleted_ratio=None, max_small_segments=None, min_deleted_rows=MIN_DELETED_ROWS):
+    """
+    判断是否需要压缩
+
+    返回:
+        "deleted_ratio" / "small_segments"，不需要时为 None
+    """
+    deleted_ratio = _env_float("MILVUS_COMPACTION_DELETED_RATIO", 0.2) if deleted_ratio is None else deleted_ratio
+    if max_small_segments is None:
+        max_small_segments = int(os.environ.get("MILVUS_COMPACTION_MAX_SMALL_SEGMENTS", 32))
+    if health.deleted_rows >= min_deleted_rows and health.deleted_ratio > deleted_ratio:
+        return "deleted_ratio"
+    if health.small_segments is not None and health.small_segments > max_small_segments:
+        return "small_segments"
+    return None
+
+
+def compaction_finished(client, job_id):
+    """压缩任务是否已结束 (服务端不再记录的任务也视为结束)"""
+    return client.get_compaction_state(job_id) != COMPACTION_EXECUTING
+
+
+def compact(client, collection_name, wait=False, timeout=DEFAULT_TIMEOUT):
+    """
+    触发一次压缩
+
+    参数:
+        wait: 是否等待压缩完成
+        timeout: 等待的截止时间 (秒)，None 表示一直等待
+
+    返回:
+        压缩任务 ID
+    """
+    job_id = client.compact(collection_name)
+    if wait:
+        poll_until(lambda: compaction_finished(client, job_id), timeout=timeout, max_delay=10.0,
+                   description=f"集合 {collection_name} 压缩")
+        _reset_deleted(collection_name)
+    return job_id
+
+
+def _last_compaction(client, collection_name):
+    properties = client.describe_collection(collection_name=collection_name).get("properties") or {}
+    try:
+        return float(properties.get(COMPACTION_PROPERTY, 0))
+    except ValueError:
+        return 0.0
+
+
+@dataclass
+class CompactionCheck:
+    """CompactionScheduler.check 中一个集合的检查结果"""
+    collection_name: str
+    health: Optional[CollectionHealth] = None
+    # 需要压缩的原因，不需要时为 None
+    reason: Optional[str] = None
+    # 本次触发或仍在执行的压缩任务 ID
+    job_id: Optional[int] = None
+    # triggered / running / completed / cooldown，没有动作时为 None
+    action: Optional[str] = None
+
+
+class CompactionScheduler:
+    """
+    定期检查集合，超过阈值时触发压缩 (线程安全，可以在 API 进程中长期运行)
+    - 同一集合的上一个压缩任务仍在执行时只跟踪进度，不重复触发
+    - 两次触发之间至少间隔 cooldown 秒 (其他进程触发的压缩同样计入)，服务端统计更新滞后时不会反复压缩
+    - 单个集合检查失败只记录日志，不影响其他集合和后续检查
+    """
+
+    def __init__(self, client, collections, interval=None, deleted_ratio=None, max_small_segments=None,
+                 cooldown=None, min_deleted_rows=MIN_DELETED_ROWS):
+        """
+        参数:
+            collections: 要维护的集合名称列表 (不存在的集合跳过)
+            interval: 后台检查间隔 (秒)，默认读取 MILVUS_COMPACTION_INTERVAL_S
+            deleted_ratio / max_small_segments: 触发压缩的阈值，默认读取对应的环境变量
+            cooldown: 同一集合两次压缩之间的最短间隔 (秒)，默认读取 MILVUS_COMPACTION_COOLDOWN_S
+        """
+        self.client = client
+        self.collections = list(collections)
+        self.interval = _env_float("MILVUS_COMPACTION_INTERVAL_S", 0) if interval is None else interval
+        self.deleted_ratio = deleted_ratio
+        self.max_small_segments = max_small_segments
+        self.cooldown = _env_float("MILVUS_COMPACTION_COOLDOWN_S", 3600) if cooldown is None else cooldown
+        self.min_deleted_rows = min_deleted_rows
+        # collection_name -> (job_id, 触发时间)
+        self._jobs = {}
+        # collection_name -> 上次检查时集合属性中的最近压缩时间
+        self._seen_compaction = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """
+        检查每个集合一次: 跟踪执行中的压缩，需要时触发新的压缩
+
+        返回:
+            CompactionCheck 列表
+        """
+        results = []
+        with self._lock:
+            for collection_name in self.collections:
+                try:
+                    if self.client.has_collection(collection_name):
+                        results.append(self._check_collection(collection_name))
+                except Exception as e:
+                    logger.warning("检查集合 %s 的压缩状态失败: %s", collection_name, e)
+                    results.append(CompactionCheck(collection_name))
+        return results
+
+    def _check_collection(self, collection_name):
+        result = CompactionCheck(collection_name)
+        if collection_name in self._jobs:
+            job_id, started = self._jobs[collection_name]
+            result.job_id = job_id
+            if not compaction_finished(self.client, job_id):
+                result.action = "running"
+                return result
+            del self._jobs[collection_name]
+            _reset_deleted(collection_name)
+            result.action = "completed"
+            logger.info("集合 %s 压缩完成 (任务 %s)，耗时 %.1fs", collection_name, job_id, time.time() - started)
+
+        last_compaction = _last_compaction(self.client, collection_name)
+        if self._seen_compaction.get(collection_name, last_compaction) != last_compaction:
+            # 其他进程触发了压缩，本进程记录的已删除行数已由那次压缩清理
+            _reset_deleted(collection_name)
+        self._seen_compaction[collection_name] = last_compaction
+
+        result.health = collection_health(self.client, collection_name)
+        COLLECTION_DELETED_RATIO.labels(collection=collection_name).set(result.health.deleted_ratio)
+        result.reason = compaction_reason(result.health, self.deleted_ratio, self.max_small_segments,
+                                          self.min_deleted_rows)
+        if result.reason is None:
+            return result
+        if time.time() - last_compaction < self.cooldown:
+            result.action = "cooldown"
+            return result
+
+        # 先写入触发时间，其他进程在 cooldown 内不再触发
+        now = time.time()
+        self.client.alter_collection_properties(collection_name=collection_name,
+                                                properties={COMPACTION_PROPERTY: str(now)})
+        self._seen_compaction[collection_name] = now
+        result.job_id = compact(self.client, collection_name)
+        result.action = "triggered"
+        self._jobs[collection_name] = (result.job_id, now)
+        COMPACTIONS.labels(collection=collection_name, reason=result.reason).inc()
+        logger.info("集合 %s 触发压缩 (任务 %s，原因 %s): %s", collection_name, result.job_id, result.reason,
+                    result.health.as_dict())
+        return result
+
+    def start(self):
+        """启动后台线程，每隔 interval 秒调用一次 check()；interval 为 0 时不启动"""
+        if self._thread is not None or not self.interval:
+            return
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self.check()
+
+        self._thread = threading.Thread(target=run, name="milvus-compaction", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止后台线程并等待正在进行的检查结束 (不取消执行中的压缩)，之后可以安全关闭连接"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    from milvus_connection import get_client, close_pool
+    from metrics import configure_logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", action="append", required=True, help="集合名称 (可重复)")
+    parser.add_argument("--status", action="store_true", help="只输出统计，不压缩")
+    parser.add_argument("--once", action="store_true", help="检查一次后退出")
+    parser.add_argument("--interval", type=float, help=f"检查间隔 (秒)，默认 MILVUS_COMPACTION_INTERVAL_S 或 {DEFAULT_INTERVAL:g}")
+    parser.add_argument("--deleted-ratio", type=float, help="触发压缩的已删除行比例")
+    parser.add_argument("--cooldown", type=float, help="同一集合两次压缩之间的最短间隔 (秒)")
+    args = parser.parse_args()
+
+    configure_logging()
+    client = get_client()
+    try:
+        if args.status:
+            for name in args.collection:
+                print(json.dumps(collection_health(client, name).as_dict(), ensure_ascii=False))
+            return
+        interval = args.interval or _env_float("MILVUS_COMPACTION_INTERVAL_S", 0) or DEFAULT_INTERVAL
+        scheduler = CompactionScheduler(client, args.collection, interval=interval, deleted_ratio=args.deleted_ratio,
+                                        cooldown=args.cooldown)
+        while True:
+            for result in scheduler.check():
+                health = result.health.as_dict() if result.health else None
+                print(json.dumps({"collection": result.collection_name, "action": result.action,
+                                  "reason": result.reason, "job_id": result.job_id, "health": health},
+                                 ensure_ascii=False))
+            if args.once:
+                break
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+范围搜索 (range search)
+按相似度阈值而不是固定的 top_k 返回结果: search_params 中设置 radius / range_filter，
+服务端只返回落在范围内的结果，密集的库不会截断匹配，稀疏的库也不会返回一堆不相关的结果。
+
+范围的含义取决于度量:
+- COSINE / IP: radius < 相似度 <= range_filter (radius 为下限)
+- L2:          range_filter <= 距离 < radius (radius 为上限)
+
+单次搜索的 offset + limit 不能超过 MAX_TOPK，range_search_all 在此范围内按页读取全部结果。
+"""
+
+from milvus_cache import plain_hit
+
+DEFAULT_PAGE_SIZE = 1000
+# 服务端允许的 offset + limit 上限
+MAX_TOPK = 16384
+
+# 相似度越大越相似的度量
+SIMILARITY_METRICS = ("COSINE", "IP")
+
+
+def range_search_params(metric_type, min_similarity=None, max_similarity=None, max_distance=None,
+                        min_distance=None, params=None):
+    """
+    构造范围搜索参数
+
+    参数:
+        metric_type: COSINE / IP / L2
+        min_similarity / max_similarity: COSINE / IP 的相似度下限 / 上限 (上限默认不限制)
+        max_distance / min_distance: L2 的距离上限 / 下限
+        params: 其他索引搜索参数 (例如 {"ef": 128})
+
+    返回:
+        search_params 字典
+    """
+    metric_type = metric_type.upper()
+    search = dict(params or {})
+    if metric_type in SIMILARITY_METRICS:
+        search["radius"] = float(min_similarity)
+        # COSINE 不要用 1.0 作上限: 浮点误差下完全相同的向量相似度可能略大于 1 而被排除
+        if max_similarity is not None:
+            search["range_filter"] = float(max_similarity)
+    else:
+        search["radius"] = float(max_distance)
+        if min_distance is not None:
+            search["range_filter"] = float(min_distance)
+    return {"metric_type": metric_type, "params": search}
+
+
+def range_search(client, collection_name, data, anns_field, search_params, limit=DEFAULT_PAGE_SIZE, offset=0,
+                 filter="", output_fields=None, **kwargs):
+    """
+    对一批查询向量执行一页范围搜索
+
+    参数:
+        data: 查询向量列表
+        search_params: range_search_params 的结果
+        limit / offset: 每个查询向量返回的结果数量和跳过的数量 (offset + limit <= MAX_TOPK)
+        kwargs: client.search 的其他参数 (例如 milvus_consistency.read_options 的一致性参数)
+
+    返回:
+        每个查询向量一个结果列表，每个结果为 {"id", "distance", "entity"}，按相似度从高到低排列
+    """
+    if offset + limit > MAX_TOPK:
+        raise ValueError(f"offset + limit 不能超过 {MAX_TOPK}")
+    results = client.search(
+        collection_name=collection_name,
+        data=data,
+        anns_field=anns_field,
+        search_params=search_params,
+        limit=limit,
+        offset=offset,
+        filter=filter,
+        output_fields=output_fields or [],
+        **kwargs,
+    )
+    return [[plain_hit(hit) for hit in hits] for hits in results]
+
+
+def range_search_all(client, collection_name, data, anns_field, search_params, page_size=DEFAULT_PAGE_SIZE,
+                     filter="", output_fields=None, **kwargs):
+    """
+    返回每个查询向量在范围内的全部结果 (最多 MAX_TOPK 条)
+    第一页对全部查询向量一次搜索，之后只对结果填满了一页的查询向量继续翻页
+
+    返回:
+        每个查询向量一个结果列表
+    """
+    results = range_search(client, collection_name, data, anns_field, search_params, limit=page_size,
+                           filter=filter, output_fields=output_fields, **kwargs)
+    for i, hits in enumerate(results):
+        page = hits
+        while len(page) == page_size and len(hits) + page_size <= MAX_TOPK:
+            page = range_search(client, collection_name, [data[i]], anns_field, search_params, limit=page_size,
+                                offset=len(hits), filter=filter, output_fields=output_fields, **kwargs)[0]
+            hits.extend(page)
+    return results
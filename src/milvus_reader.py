@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Milvus 流式读取模块
+基于 query_iterator / search_iterator 分批读取集合数据，每批转换为:
+- ids:      主键数组
+- vectors:  float32 向量矩阵 (n, dim)，不请求向量字段时为 None
+- columns:  其余标量字段 {字段名: 列表}
+
+不受 query 的 limit 和服务端单次结果大小限制，内存占用只与批大小有关。
+
+query_page() 按主键游标只读取一页，用于分页接口。
+fetch_by_ids() 按主键批量获取实体: ID 列表拆分为多个分片，在连接池的多个 channel 上并行 get，
+向量解码后直接写入预分配的 float32 矩阵。
+
+也可以作为脚本导出整个集合:
+    python src/milvus_reader.py --collection face_embeddings_collection --output export/
+输出 vectors.npy (float32) 和 rows.jsonl (主键与标量字段，与向量按行对应)。
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 1000
+# fetch_by_ids 每个分片的主键数量，分片过大时单次响应可能超过 gRPC 消息大小限制
+DEFAULT_FETCH_CHUNK_SIZE = 2000
+
+
+@dataclass
+class RecordBatch:
+    """一批读取结果"""
+    ids: np.ndarray
+    vectors: Optional[np.ndarray] = None
+    columns: Dict[str, List] = field(default_factory=dict)
+    # 仅搜索迭代器返回，与 ids 按行对应
+    distances: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def get_primary_field(client, collection_name):
+    """返回集合主键字段名"""
+    description = client.describe_collection(collection_name=collection_name)
+    return next(f["name"] for f in description["fields"] if f.get("is_primary"))
+
+
+def get_vector_dim(client, collection_name, vector_field):
+    """返回向量字段的维度"""
+    description = client.describe_collection(collection_name=collection_name)
+    field_info = next(f for f in description["fields"] if f["name"] == vector_field)
+    return int(field_info["params"]["dim"])
+
+
+def _to_batch(rows, id_field, vector_field, scalar_fields, distances=None):
+    ids = np.array([row[id_field] for row in rows])
+    vectors = None
+    if vector_field is not None:
+        vectors = np.empty((len(rows), len(rows[0][vector_field]) if rows else 0), dtype=np.float32)
+        for i, row in enumerate(rows):
+            vectors[i] = row[vector_field]
+    columns = {name: [row[name] for row in rows] for name in scalar_fields}
+    return RecordBatch(ids=ids, vectors=vectors, columns=columns, distances=distances)
+
+
+def iter_query_batches(client, collection_name, filter="", output_fields=None, vector_field=None,
+                       batch_size=DEFAULT_BATCH_SIZE, limit=-1, id_field=None, partition_names=None, **kwargs):
+    """
+    按过滤条件分批读取实体
+
+    参数:
+        client: MilvusClient
+        collection_name: 集合名称
+        filter: 过滤表达式，空字符串表示全部
+        output_fields: 需要的标量字段
+        vector_field: 需要的向量字段，None 表示不读取向量
+        batch_size: 每批实体数量
+        limit: 最多读取的实体数量，-1 表示不限制
+        id_field: 主键字段名，默认从集合 Schema 中获取
+        kwargs: query_iterator 的其他参数 (例如 consistency_level)
+
+    返回:
+        RecordBatch 的迭代器
+    """
+    id_field = id_field or get_primary_field(client, collection_name)
+    scalar_fields = [f for f in (output_fields or []) if f not in (id_field, vector_field)]
+    fields = scalar_fields + ([vector_field] if vector_field else [])
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        limit=limit,
+        filter=filter,
+        output_fields=fields,
+        partition_names=partition_names,
+        **kwargs,
+    )
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            yield _to_batch(rows, id_field, vector_field, scalar_fields)
+    finally:
+        iterator.close()
+
+
+def query_page(client, collection_name, after=None, limit=DEFAULT_BATCH_SIZE, filter="", output_fields=None,
+               vector_field=None, id_field=None, **kwargs):
+    """
+    按主键游标读取一页实体: 主键大于 after 的前 limit 个，按主键升序
+    只读取本页，不需要先读取全部主键 (主键必须是整数)
+
+    参数:
+        after: 上一页最后一个主键，None 表示第一页
+        limit: 每页实体数量
+        其余参数与 iter_query_batches 相同，kwargs 传给 client.query
+
+    返回:
+        (RecordBatch, 是否还有下一页)
+    """
+    id_field = id_field or get_primary_field(client, collection_name)
+    scalar_fields = [f for f in (output_fields or []) if f not in (id_field, vector_field)]
+    fields = [id_field] + scalar_fields + ([vector_field] if vector_field else [])
+    cursor = f"{id_field} > {int(after)}" if after is not None else ""
+    expr = " and ".join(f"({part})" for part in (filter, cursor) if part)
+    # iterator 模式 (与 query_iterator 相同) 下服务端按主键顺序归并，返回主键最小的 limit 行；
+    # 普通 query 按 segment / 分区顺序返回，不能作为游标。多取一行判断是否还有下一页
+    rows = client.query(collection_name=collection_name, filter=expr, limit=limit + 1, output_fields=fields,
+                        iterator="True", **kwargs)
+    rows = sorted(rows, key=lambda row: row[id_field])
+    return _to_batch(rows[:limit], id_field, vector_field, scalar_fields), len(rows) > limit
+
+
+def iter_search_batches(client, collection_name, query_vector, anns_field, search_params=None,
+                        filter=None, output_fields=None, batch_size=DEFAULT_BATCH_SIZE, limit=-1):
+    """
+    按相似度从高到低分批读取单个查询向量的搜索结果
+
+    返回:
+        RecordBatch 的迭代器，distances 为每个结果的距离/相似度
+    """
+    scalar_fields = list(output_fields or [])
+    iterator = client.search_iterator(
+        collection_name=collection_name,
+        data=[np.asarray(query_vector, dtype=np.float32).tolist()],
+        batch_size=batch_size,
+        filter=filter,
+        limit=limit,
+        output_fields=scalar_fields,
+        search_params=search_params,
+        anns_field=anns_field,
+    )
+    try:
+        while True:
+            hits = iterator.next()
+            if not hits:
+                break
+            ids = np.array([hit["id"] for hit in hits])
+            distances = np.array([hit["distance"] for hit in hits], dtype=np.float32)
+            columns = {name: [hit["entity"].get(name) for hit in hits] for name in scalar_fields}
+            yield RecordBatch(ids=ids, columns=columns, distances=distances)
+    finally:
+        iterator.close()
+
+
+def fetch_by_ids(client, collection_name, ids, output_fields=None, vector_field=None, id_field=None,
+                 chunk_size=DEFAULT_FETCH_CHUNK_SIZE, clients=None):
+    """
+    按主键批量获取实体
+
+    只请求调用方需要的字段: 不传 vector_field 时不会传输向量。
+    ID 列表去重后按 chunk_size 拆分，分片在多个连接上并行 get；
+    每个响应的向量只解码一次为 float32 数组，再直接复制到预分配的结果矩阵中，不生成 Python 列表。
+
+    参数:
+        client: MilvusClient，用于读取 Schema；clients 为 None 时也用于执行 get
+        collection_name: 集合名称
+        ids: 主键列表或数组 (例如搜索结果中的 ID，允许重复)
+        output_fields: 需要的标量字段
+        vector_field: 需要的向量字段，None 表示不读取向量
+        id_field: 主键字段名，默认从集合 Schema 中获取
+        chunk_size: 每个分片的主键数量
+        clients: 并行执行分片的 MilvusClient 列表，例如 get_pool().clients()
+
+    返回:
+        RecordBatch: 与 ids 顺序一致，集合中不存在的 ID 被跳过
+    """
+    id_field = id_field or get_primary_field(client, collection_name)
+    scalar_fields = [f for f in (output_fields or []) if f not in (id_field, vector_field)]
+    # output_fields 为空时服务端会返回全部字段，因此至少请求主键
+    fields = [id_field] + scalar_fields + ([vector_field] if vector_field else [])
+    clients = clients or [client]
+
+    unique_ids, inverse = np.unique(np.asarray(ids), return_inverse=True)
+    position = {key: i for i, key in enumerate(unique_ids.tolist())}
+    found = np.zeros(len(unique_ids), dtype=bool)
+    vectors = None
+    if vector_field is not None:
+        dim = get_vector_dim(client, collection_name, vector_field)
+        vectors = np.empty((len(unique_ids), dim), dtype=np.float32)
+    columns = {name: [None] * len(unique_ids) for name in scalar_fields}
+
+    def fetch(chunk_index):
+        chunk = unique_ids[chunk_index * chunk_size:(chunk_index + 1) * chunk_size].tolist()
+        rows = clients[chunk_index % len(clients)].get(
+            collection_name=collection_name,
+            ids=chunk,
+            output_fields=fields,
+            # 向量以 float32 numpy 数组返回，而不是 Python float 列表
+            strict_float32=True,
+        )
+        # 每个分片写入互不重叠的行，不需要加锁
+        for row in rows:
+            i = position[row[id_field]]
+            found[i] = True
+            if vectors is not None:
+                vectors[i] = row[vector_field]
+            for name in scalar_fields:
+                columns[name][i] = row[name]
+
+    num_chunks = (len(unique_ids) + chunk_size - 1) // chunk_size
+    if num_chunks > 1 and len(clients) > 1:
+        with ThreadPoolExecutor(max_workers=min(num_chunks, len(clients))) as executor:
+            list(executor.map(fetch, range(num_chunks)))
+    else:
+        for chunk_index in range(num_chunks):
+            fetch(chunk_index)
+
+    # 还原为调用方的顺序 (含重复 ID)，跳过不存在的 ID
+    order = inverse.reshape(-1)[found[inverse.reshape(-1)]]
+    return RecordBatch(
+        ids=unique_ids[order],
+        vectors=vectors[order] if vectors is not None else None,
+        columns={name: [values[i] for i in order] for name, values in columns.items()},
+    )
+
+
+def concat_batches(batches):
+    """
+    将多个批次合并为一个 RecordBatch (需要完整数据时使用，例如计算全量相似度)
+    向量直接拼接为一个 float32 矩阵
+    """
+    batches = list(batches)
+    if not batches:
+        return RecordBatch(ids=np.array([]))
+    vectors = None
+    if batches[0].vectors is not None:
+        vectors = np.concatenate([b.vectors for b in batches])
+    distances = None
+    if batches[0].distances is not None:
+        distances = np.concatenate([b.distances for b in batches])
+    columns = {name: [v for b in batches for v in b.columns[name]] for name in batches[0].columns}
+    return RecordBatch(ids=np.concatenate([b.ids for b in batches]), vectors=vectors,
+                       columns=columns, distances=distances)
+
+
+def read_all(client, collection_name, **kwargs):
+    """读取全部匹配的实体并合并为一个 RecordBatch，参数同 iter_query_batches"""
+    return concat_batches(iter_query_batches(client, collection_name, **kwargs))
+
+
+def count_rows(client, collection_name, filter=""):
+    """返回匹配过滤条件的实体数量"""
+    result = client.query(collection_name=collection_name, filter=filter, output_fields=["count(*)"])
+    return int(result[0]["count(*)"])
+
+
+def export_collection(client, collection_name, output_dir, vector_field, output_fields=None,
+                      filter="", batch_size=DEFAULT_BATCH_SIZE):
+    """
+    将集合导出为 vectors.npy + rows.jsonl，逐批写入磁盘，内存占用与集合大小无关
+
+    返回:
+        int: 导出的实体数量
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    total = count_rows(client, collection_name, filter)
+    vectors_out = None
+    written = 0
+    with open(os.path.join(output_dir, "rows.jsonl"), "w", encoding="utf-8") as rows_out:
+        for batch in iter_query_batches(client, collection_name, filter=filter, output_fields=output_fields,
+                                        vector_field=vector_field, batch_size=batch_size):
+            if vectors_out is None:
+                vectors_out = np.lib.format.open_memmap(
+                    os.path.join(output_dir, "vectors.npy"), mode="w+", dtype=np.float32,
+                    shape=(total, batch.vectors.shape[1]),
+                )
+            # 导出期间有新数据写入时，超出统计数量的部分不再写入
+            count = min(len(batch), total - written)
+            vectors_out[written:written + count] = batch.vectors[:count]
+            for i in range(count):
+                row = {"id": batch.ids[i].item()}
+                row.update({name: values[i] for name, values in batch.columns.items()})
+                rows_out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            written += count
+            if written >= total:
+                break
+    if vectors_out is None:
+        # 没有匹配的实体时同样写入 (0, dim) 的 vectors.npy，读取方不必区分空集合
+        np.save(os.path.join(output_dir, "vectors.npy"),
+                np.empty((0, get_vector_dim(client, collection_name, vector_field)), dtype=np.float32))
+    else:
+        vectors_out.flush()
+        if written < total:
+            # 导出期间有数据被删除: 按实际写入的行数重写 vectors.npy，与 rows.jsonl 对齐
+            del vectors_out
+            _truncate_npy(os.path.join(output_dir, "vectors.npy"), written, batch_size)
+    return written
+
+
+def _truncate_npy(path, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """把 .npy 文件截断为前 rows 行 (分块复制到新文件后替换，内存占用与文件大小无关)"""
+    source = np.load(path, mmap_mode="r")
+    tmp_path = path + ".tmp"
+    target = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=source.dtype, shape=(rows,) + source.shape[1:])
+    for start in range(0, rows, batch_size):
+        target[start:start + batch_size] = source[start:min(start + batch_size, rows)]
+    target.flush()
+    del source, target
+    os.replace(tmp_path, path)
+
+
+def main():
+    # 作为脚本运行时才需要连接模块
+    from milvus_connection import get_client, close_pool
+
+    parser = argparse.ArgumentParser(description="流式导出 Milvus 集合")
+    parser.add_argument("--collection", required=True, help="集合名称")
+    parser.add_argument("--output", required=True, help="输出目录")
+    parser.add_argument("--vector-field", default="embedding", help="向量字段名")
+    parser.add_argument("--fields", default="", help="逗号分隔的标量字段")
+    parser.add_argument("--filter", default="", help="过滤表达式")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    client = get_client()
+    try:
+        client.load_collection(collection_name=args.collection)
+        fields = [f for f in args.fields.split(",") if f]
+        count = export_collection(client, args.collection, args.output, args.vector_field,
+                                  output_fields=fields, filter=args.filter, batch_size=args.batch_size)
+        print(f"已导出 {count} 个实体到 {args.output}")
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+集合驻留管理
+每个租户一个人脸/文本集合时，全部加载会耗尽 Query Node 内存。ResidencyManager 负责:
+- 记录每个集合最近一次访问的时间，首次访问 (或被释放后再次访问) 时自动加载
+- 已加载集合的估算内存超过预算时，按 LRU 顺序释放最久未访问的集合
+- 被换出过的集合视为冷集合，再次加载前开启 mmap (mmap.enabled)，数据和索引放在页缓存中，常驻内存大幅减少
+- release_idle() / start_background_release() 释放空闲超过一定时间的集合
+- 已加载的状态最多缓存 STATE_RECHECK_SECONDS 秒，期间集合被其他进程释放时，run() / call() 收到
+  "集合未加载" (错误码 101) 后重新加载并重试一次
+
+用法:
+    manager = ResidencyManager(client, budget_bytes=8 << 30)
+    manager.ensure_loaded("faces_tenant_a")                 # 未加载时加载，并按预算换出其他集合
+    manager.call("faces_tenant_a", "search", data=[...])    # 集合被其他进程释放时自动重新加载并重试
+    manager.run(["faces", "identities"], lambda: ...)       # 多个集合的读取: 读取期间这些集合不会被换出
+
+内存只是按 行数 × 字段宽度 估算 (见 estimate_collection_bytes)，用于排序和预算控制，不是 Query Node 的实际占用。
+
+环境变量:
+    MILVUS_MEMORY_BUDGET_MB  已加载集合的估算内存预算 (MB)，0 表示不限制 (默认)
+    MILVUS_IDLE_RELEASE_S    空闲超过该时间 (秒) 的集合由 release_idle() 释放，0 表示不按空闲时间释放 (默认)
+    MILVUS_MMAP_COLD         为 0 时冷集合不开启 mmap
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from pymilvus import DataType
+from pymilvus.client.types import LoadState
+from pymilvus.exceptions import MilvusException
+
+from milvus_wait import get_load_state, wait_for_loaded, wait_for_released
+
+logger = logging.getLogger(__name__)
+
+MMAP_PROPERTY = "mmap.enabled"
+# 服务端返回的 "集合未加载" 错误码
+COLLECTION_NOT_LOADED = 101
+# 已加载的集合每隔该时间 (秒) 向服务端确认一次加载状态 (可能被其他进程释放)
+STATE_RECHECK_SECONDS = 30.0
+
+# 开启 mmap 后估算的常驻内存比例 (其余部分按需从页缓存读取)
+MMAP_RESIDENT_FRACTION = 0.1
+# 向量索引 (HNSW 图等) 相对原始向量的额外内存估算
+INDEX_OVERHEAD_FRACTION = 0.3
+# VARCHAR / JSON 字段每行的平均字节数估算 (取 max_length 与该值中的较小值)
+VARCHAR_ESTIMATE_BYTES = 64
+
+_SCALAR_BYTES = {
+    DataType.BOOL: 1, DataType.INT8: 1, DataType.INT16: 2, DataType.INT32: 4, DataType.INT64: 8,
+    DataType.FLOAT: 4, DataType.DOUBLE: 8,
+}
+
+
+def estimate_collection_bytes(client, collection_name):
+    """
+    按 Schema 和行数估算集合加载后的内存
+
+    返回:
+        int: 估算的字节数
+    """
+    description = client.describe_collection(collection_name=collection_name)
+    row_bytes = 0
+    for field in description["fields"]:
+        dtype = field.get("type")
+        params = field.get("params") or {}
+        if dtype == DataType.FLOAT_VECTOR:
+            row_bytes += int(params["dim"]) * 4 * (1 + INDEX_OVERHEAD_FRACTION)
+        elif dtype in (DataType.FLOAT16_VECTOR, DataType.BFLOAT16_VECTOR):
+            row_bytes += int(params["dim"]) * 2 * (1 + INDEX_OVERHEAD_FRACTION)
+        elif dtype == DataType.BINARY_VECTOR:
+            row_bytes += int(params["dim"]) // 8 * (1 + INDEX_OVERHEAD_FRACTION)
+        elif dtype in (DataType.VARCHAR, DataType.JSON):
+            row_bytes += min(int(params.get("max_length", VARCHAR_ESTIMATE_BYTES)), VARCHAR_ESTIMATE_BYTES)
+        else:
+            row_bytes += _SCALAR_BYTES.get(dtype, 8)
+    row_count = int(client.get_collection_stats(collection_name=collection_name)["row_count"])
+    return int(row_count * row_bytes)
+
+
+@dataclass
+class Residency:
+    """一个集合的驻留状态"""
+    name: str
+    estimated_bytes: int = 0
+    last_access: float = 0.0
+    loaded: bool = False
+    mmap: bool = False
+    evictions: int = 0
+    # 最近一次向服务端确认加载状态的时间
+    checked_at: float = 0.0
+    # 正在加载 (预算已预留)
+    loading: bool = False
+    # 同一集合同时只有一个线程加载或释放
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def resident_bytes(self):
+        """计入预算的内存 (开启 mmap 的集合只计常驻部分)"""
+        return int(self.estimated_bytes * (MMAP_RESIDENT_FRACTION if self.mmap else 1))
+
+    @property
+    def counted(self):
+        """是否计入预算 (已加载或正在加载)"""
+        return self.loaded or self.loading
+
+
+class ResidencyManager:
+    """按 LRU 和内存预算管理集合的加载与释放 (线程安全)"""
+
+    def __init__(self, client, budget_bytes=None, idle_seconds=None, mmap_cold=None, pinned=()):
+        """
+        参数:
+            client: MilvusClient
+            budget_bytes: 已加载集合的估算内存预算，默认读取 MILVUS_MEMORY_BUDGET_MB，0 / None 表示不限制
+            idle_seconds: release_idle() 的空闲阈值，默认读取 MILVUS_IDLE_RELEASE_S
+            mmap_cold: 冷集合再次加载前是否开启 mmap，默认读取 MILVUS_MMAP_COLD (默认开启)
+            pinned: 不会被释放的集合名称
+        """
+        self.client = client
+        if budget_bytes is None:
+            budget_bytes = int(float(os.environ.get("MILVUS_MEMORY_BUDGET_MB", 0)) * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = float(os.environ.get("MILVUS_IDLE_RELEASE_S", 0)) if idle_seconds is None else idle_seconds
+        self.mmap_cold = os.environ.get("MILVUS_MMAP_COLD", "1") != "0" if mmap_cold is None else mmap_cold
+        self.pinned = set(pinned)
+        self._entries = {}
+        # 正在被请求使用的集合 (见 pin)，计数大于 0 时不会被释放
+        self._in_use = Counter()
+        self._synced = False
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _entry(self, collection_name):
+        entry = self._entries.get(collection_name)
+        if entry is None:
+            properties = self.client.describe_collection(collection_name=collection_name).get("properties") or {}
+            entry = self._entries[collection_name] = Residency(collection_name)
+            entry.mmap = str(properties.get(MMAP_PROPERTY, "")).lower() == "true"
+        return entry
+
+    def sync(self):
+        """
+        从服务端读取所有集合的加载状态
+        其他进程加载的集合也纳入预算，最近访问时间记为 0，预算不足时最先被释放
+        """
+        with self._lock:
+            for name in self.client.list_collections():
+                loaded = get_load_state(self.client, name) == LoadState.Loaded
+                entry = self._entries.get(name)
+                if entry is None and not loaded:
+                    continue
+                entry = entry or self._entry(name)
+                if loaded and not entry.estimated_bytes:
+                    entry.estimated_bytes = estimate_collection_bytes(self.client, name)
+                entry.loaded = loaded
+                entry.checked_at = time.monotonic()
+            self._synced = True
+
+    def resident_bytes(self):
+        """已加载集合的估算内存总和"""
+        with self._lock:
+            return sum(entry.resident_bytes for entry in self._entries.values() if entry.counted)
+
+    def ensure_loaded(self, collection_name):
+        """
+        确保集合已加载并记录一次访问；加载前按预算释放最久未访问的集合
+        加载、释放 (包括等待完成) 和修改 mmap 属性只持有对应集合自己的锁，不阻塞其他集合的请求
+
+        返回:
+            Residency
+        """
+        with self._lock:
+            if not self._synced:
+                self.sync()
+            entry = self._entry(collection_name)
+            now = entry.last_access = time.monotonic()
+            fresh = entry.loaded and now - entry.checked_at < STATE_RECHECK_SECONDS
+            victims = self._pick_victims(0, exclude=collection_name) if fresh else []
+        if fresh:
+            self._release_victims(victims)
+            return entry
+
+        with entry.lock:
+            now = time.monotonic()
+            if entry.loaded and now - entry.checked_at < STATE_RECHECK_SECONDS:
+                # 等待期间其他线程已加载或确认过
+                return entry
+            state = get_load_state(self.client, collection_name)
+            if state == LoadState.NotExist:
+                raise ValueError(f"集合 '{collection_name}' 不存在")
+            estimated_bytes = entry.estimated_bytes
+            if not (entry.loaded and state == LoadState.Loaded):
+                estimated_bytes = estimate_collection_bytes(self.client, collection_name)
+            if state != LoadState.Loaded and self.mmap_cold and entry.evictions and not entry.mmap:
+                # 集合处于释放状态，持有本集合的锁修改属性，不阻塞其他集合
+                self._set_mmap(entry, True)
+            with self._lock:
+                entry.estimated_bytes = estimated_bytes
+                entry.checked_at = now
+                if state == LoadState.Loaded:
+                    entry.loaded = True
+                    victims = self._pick_victims(0, exclude=collection_name)
+                else:
+                    entry.loaded = False
+                    victims = self._pick_victims(entry.resident_bytes, exclude=collection_name)
+                    # 加载期间占用的预算也计入 resident_bytes，避免并发加载超出预算
+                    entry.loading = True
+            self._release_victims(victims)
+            if state == LoadState.Loaded:
+                return entry
+            try:
+                start = time.perf_counter()
+                self.client.load_collection(collection_name=collection_name)
+                wait_for_loaded(self.client, collection_name)
+                logger.info("已加载集合 '%s' (估算 %.1f MB%s)，耗时 %.2fs", collection_name,
+                            entry.resident_bytes / 1024 / 1024, "，mmap" if entry.mmap else "",
+                            time.perf_counter() - start)
+            finally:
+                with self._lock:
+                    entry.loading = False
+            with self._lock:
+                entry.loaded = True
+                entry.checked_at = time.monotonic()
+            return entry
+
+    def touch(self, collection_name):
+        """只记录一次访问 (调用方已确认集合已加载)"""
+        with self._lock:
+            entry = self._entries.get(collection_name)
+            if entry is not None:
+                entry.last_access = time.monotonic()
+
+    def invalidate(self, collection_name):
+        """标记集合需要向服务端重新确认加载状态 (例如收到 "集合未加载" 错误后)"""
+        with self._lock:
+            entry = self._entries.get(collection_name)
+            if entry is not None:
+                entry.loaded = False
+                entry.checked_at = 0.0
+
+    @contextmanager
+    def pin(self, *collection_names):
+        """
+        with 块内这些集合不会被换出: 一个请求先后加载多个集合时，
+        后加载的集合 (例如身份索引或其他分片) 不会因预算不足挤掉前面已加载、正在使用的集合
+        """
+        with self._lock:
+            self._in_use.update(collection_names)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use.subtract(collection_names)
+                self._in_use += Counter()
+
+    def run(self, collection_names, func):
+        """
+        确保集合已加载后调用 func()，调用期间这些集合不会被换出；
+        集合在确认加载状态之后被其他进程释放 (错误码 101) 时重新加载并重试一次
+
+        参数:
+            collection_names: func 读取的集合名称
+            func: 无参数的读取函数
+
+        返回:
+            func() 的返回值
+        """
+        with self.pin(*collection_names):
+            for name in collection_names:
+                self.ensure_loaded(name)
+            try:
+                return func()
+            except MilvusException as e:
+                if e.code != COLLECTION_NOT_LOADED:
+                    raise
+                logger.info("集合 %s 已被释放，重新加载后重试", ", ".join(collection_names))
+            for name in collection_names:
+                self.invalidate(name)
+                self.ensure_loaded(name)
+            return func()
+
+    def call(self, collection_name, method, **kwargs):
+        """
+        在集合上调用 MilvusClient 的方法: 先确保已加载，集合在两次调用之间被释放时重新加载并重试一次
+
+        例如:
+            manager.call("faces", "search", data=[vector], limit=10)
+        """
+        return self.run([collection_name],
+                        lambda: getattr(self.client, method)(collection_name=collection_name, **kwargs))
+
+    def release(self, collection_name):
+        """释放集合；被释放过的集合下次加载时按冷集合处理"""
+        with self._lock:
+            entry = self._entry(collection_name)
+        with entry.lock:
+            self._release(entry)
+
+    def _release(self, entry):
+        """释放集合 (调用方持有 entry.lock，不持有管理器的锁: 等待释放完成可能需要几十秒)"""
+        self.client.release_collection(collection_name=entry.name)
+        wait_for_released(self.client, entry.name)
+        with self._lock:
+            entry.loaded = False
+            entry.evictions += 1
+        logger.info("已释放集合 '%s' (估算 %.1f MB)", entry.name, entry.resident_bytes / 1024 / 1024)
+
+    def release_idle(self, idle_seconds=None):
+        """
+        释放空闲超过 idle_seconds 的集合
+
+        返回:
+            被释放的集合名称列表
+        """
+        idle_seconds = self.idle_seconds if idle_seconds is None else idle_seconds
+        if not idle_seconds:
+            return []
+        with self._lock:
+            deadline = time.monotonic() - idle_seconds
+            victims = [entry for entry in sorted(self._entries.values(), key=lambda e: e.last_access)
+                       if entry.loaded and not self._is_pinned(entry.name) and entry.last_access < deadline]
+            for entry in victims:
+                entry.loaded = False
+        return self._release_victims(victims)
+
+    def _pick_victims(self, needed, exclude):
+        """
+        按 LRU 顺序选出要释放的集合，直到已加载集合加上 needed 不超过预算 (调用方持有管理器的锁)
+        选中的集合立即标记为未加载，由调用方在释放锁之后调用 _release_victims
+
+        返回:
+            Residency 列表
+        """
+        if not self.budget_bytes or self.resident_bytes() + needed <= self.budget_bytes:
+            return []
+        candidates = sorted(
+            (e for e in self._entries.values() if e.loaded and e.name != exclude and not self._is_pinned(e.name)),
+            key=lambda e: e.last_access,
+        )
+        victims = []
+        for entry in candidates:
+            if self.resident_bytes() + needed <= self.budget_bytes:
+                break
+            entry.loaded = False
+            victims.append(entry)
+        if self.resident_bytes() + needed > self.budget_bytes:
+            logger.warning("已加载集合的估算内存 %.1f MB 超过预算 %.1f MB，没有可以释放的集合",
+                           (self.resident_bytes() + needed) / 1024 / 1024, self.budget_bytes / 1024 / 1024)
+        return victims
+
+    def _release_victims(self, victims):
+        """
+        释放 _pick_victims 选出的集合 (不持有管理器的锁)
+
+        返回:
+            实际释放的集合名称列表
+        """
+        released = []
+        for entry in victims:
+            # 其他线程正在加载或确认该集合时跳过，由它重新确认状态；不等待也避免两个加载互相等待对方的集合
+            if not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                with self._lock:
+                    if entry.loaded or self._is_pinned(entry.name):
+                        # 选中之后被重新加载，或开始被请求使用
+                        entry.loaded = True
+                        continue
+                self._release(entry)
+                released.append(entry.name)
+            finally:
+                entry.lock.release()
+        return released
+
+    def _is_pinned(self, collection_name):
+        return collection_name in self.pinned or self._in_use[collection_name] > 0
+
+    def _set_mmap(self, entry, enabled):
+        """修改集合的 mmap 属性 (集合必须处于释放状态，调用方持有 entry.lock)"""
+        try:
+            self.client.alter_collection_properties(
+                collection_name=entry.name, properties={MMAP_PROPERTY: enabled})
+            entry.mmap = enabled
+        except MilvusException as e:
+            logger.warning("无法为集合 '%s' 开启 mmap: %s", entry.name, e)
+
+    def status(self):
+        """
+        返回所有跟踪中的集合状态 (按最近访问时间从新到旧)
+
+        返回:
+            [{"name", "loaded", "mmap", "estimated_mb", "idle_seconds", "evictions"}]
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "name": e.name,
+                "loaded": e.loaded,
+                "mmap": e.mmap,
+                "estimated_mb": round(e.resident_bytes / 1024 / 1024, 2),
+                "idle_seconds": round(now - e.last_access, 1) if e.last_access else None,
+                "evictions": e.evictions,
+            } for e in sorted(self._entries.values(), key=lambda e: -e.last_access)]
+
+    def start_background_release(self, interval=60.0):
+        """启动后台线程，每隔 interval 秒调用一次 release_idle()"""
+        if self._thread is not None or not self.idle_seconds:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.release_idle()
+                except Exception as e:
+                    logger.warning("释放空闲集合失败: %s", e)
+
+        self._thread = threading.Thread(target=run, name="milvus-residency", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止后台线程 (不释放集合)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
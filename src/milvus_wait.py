@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Milvus 状态等待工具
+用按指数退避轮询服务端状态的方式替代固定的 time.sleep:
+状态一旦达到立即返回，负载高时也不会因为等待时间不够而出错。
+超过截止时间仍未达到目标状态时抛出 TimeoutError。
+"""
+
+import time
+
+from pymilvus.client.types import LoadState
+
+DEFAULT_TIMEOUT = 60.0
+INITIAL_DELAY = 0.05
+MAX_DELAY = 2.0
+BACKOFF_FACTOR = 2.0
+
+
+def poll_until(check, timeout=DEFAULT_TIMEOUT, initial_delay=INITIAL_DELAY,
+               max_delay=MAX_DELAY, factor=BACKOFF_FACTOR, description="condition"):
+    """
+    反复调用 check()，直到其返回真值
+
+    参数:
+        check: 无参函数，返回真值表示目标状态已达到
+        timeout: 截止时间 (秒)，None 表示一直等待
+        initial_delay: 第一次重新检查前的等待时间 (秒)
+        max_delay: 两次检查之间的最大等待时间 (秒)
+        factor: 每次等待时间的增长倍数
+        description: 超时异常中使用的描述
+
+    返回:
+        check() 的第一个真值结果
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        result = check()
+        if result:
+            return result
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"等待 {description} 超时 ({timeout}s)")
+            delay = min(delay, remaining)
+        time.sleep(delay)
+        delay = min(delay * factor, max_delay)
+
+
+def get_load_state(client, collection_name):
+    """返回集合的加载状态 (LoadState 枚举)"""
+    return client.get_load_state(collection_name=collection_name)["state"]
+
+
+def wait_for_server(client, timeout=DEFAULT_TIMEOUT):
+    """等待 Milvus 服务可以响应请求 (刚启动的服务可能暂时无法响应)"""
+    def ready():
+        try:
+            client.list_collections()
+        except Exception:
+            return False
+        return True
+
+    poll_until(ready, timeout=timeout, description="Milvus 服务就绪")
+
+
+def wait_for_loaded(client, collection_name, timeout=DEFAULT_TIMEOUT):
+    """等待集合加载到内存 (LoadState.Loaded)"""
+    def loaded():
+        state = get_load_state(client, collection_name)
+        if state == LoadState.NotExist:
+            raise ValueError(f"集合 '{collection_name}' 不存在")
+        return state == LoadState.Loaded
+
+    poll_until(loaded, timeout=timeout, description=f"集合 '{collection_name}' 加载完成")
+
+
+def wait_for_released(client, collection_name, timeout=DEFAULT_TIMEOUT):
+    """等待集合从内存中释放"""
+    poll_until(
+        lambda: get_load_state(client, collection_name) in (LoadState.NotLoad, LoadState.NotExist),
+        timeout=timeout,
+        description=f"集合 '{collection_name}' 释放完成",
+    )
+
+
+def wait_for_flush(client, collection_name, expected_rows, timeout=DEFAULT_TIMEOUT):
+    """
+    等待已刷新的数据在集合统计信息中可见
+
+    参数:
+        expected_rows: 期望的最少实体数量 (插入前的数量 + 本次插入数量)
+
+    返回:
+        int: 当前的实体数量
+    """
+    row_count = None
+
+    def flushed():
+        nonlocal row_count
+        row_count = int(client.get_collection_stats(collection_name=collection_name)["row_count"])
+        # 返回 True 而不是行数: expected_rows 为 0 时行数 0 也表示已完成
+        return row_count >= expected_rows
+
+    poll_until(flushed, timeout=timeout, description=f"集合 '{collection_name}' 刷新完成")
+    return row_count
+
+
+def wait_for_index_built(client, collection_name, index_name, expected_rows=None, timeout=DEFAULT_TIMEOUT):
+    """
+    等待索引构建完成 (state 为 Finished 且没有待索引的数据)
+
+    参数:
+        expected_rows: 期望的已索引行数 (通常为插入的行数)；数据刚 flush 时 state 可能已是 Finished 而
+                       新 segment 还未计入 total_rows，指定后还要等 indexed_rows 达到该数量
+
+    返回:
+        dict: 最终的 describe_index 结果
+    """
+    def built():
+        info = client.describe_index(collection_name=collection_name, index_name=index_name)
+        if info.get("state") == "Failed":
+            raise RuntimeError(f"索引 '{index_name}' 构建失败: {info.get('index_state_fail_reason')}")
+        if info.get("state") == "Finished" and not info.get("pending_index_rows"):
+            if expected_rows is None or int(info.get("indexed_rows", 0) or 0) >= expected_rows:
+                return info
+        return None
+
+    return poll_until(built, timeout=timeout, description=f"索引 '{index_name}' 构建完成")
+
+
+def wait_for_dropped(client, collection_name, timeout=DEFAULT_TIMEOUT):
+    """等待集合删除完成"""
+    poll_until(
+        lambda: not client.has_collection(collection_name=collection_name),
+        timeout=timeout,
+        description=f"集合 '{collection_name}' 删除完成",
+    )
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+性能分析模块
+不修改代码即可为一次运行或一个请求记录性能分析结果，由环境变量或命令行参数开启:
+
+    PROFILE=cprofile python face_vectorization.py
+    python demo_05_load_collection_and_vector_search.py --profile=sample
+    PROFILE=sample python main.py          # API 的每个请求各输出一份结果
+
+模式:
+- cprofile: 确定性分析，输出 .prof (pstats 格式，可用 snakeviz / flameprof 查看) 和按累计耗时排序的 .txt
+- sample:   采样分析 (默认每 5ms 采样一次调用栈)，开销小，输出 collapsed stacks (.collapsed，
+            可直接交给 flamegraph.pl 或 speedscope 生成火焰图) 和按采样次数排序的 .txt
+
+两种模式默认同时用 tracemalloc 记录内存分配，输出运行期间新增内存最多的前 N 个分配位置 (.alloc.txt)。
+
+环境变量:
+    PROFILE              cprofile / sample (1 / true 等同于 cprofile)，不设置或 off 时关闭
+    PROFILE_DIR          结果目录，默认 profiles
+    PROFILE_TOP          .txt 和 .alloc.txt 中列出的条目数，默认 25
+    PROFILE_MEMORY       设为 0 时不使用 tracemalloc (tracemalloc 会明显拖慢分配密集的代码)
+    PROFILE_INTERVAL_MS  sample 模式的采样间隔 (毫秒)，默认 5
+
+同一时间只运行一个分析会话 (cProfile 和 tracemalloc 都是进程级的)，
+会话进行中再开始的会话 (例如并发的请求) 直接跳过。
+"""
+
+import atexit
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENV = "PROFILE"
+PROFILE_DIR_ENV = "PROFILE_DIR"
+PROFILE_TOP_ENV = "PROFILE_TOP"
+PROFILE_MEMORY_ENV = "PROFILE_MEMORY"
+PROFILE_INTERVAL_ENV = "PROFILE_INTERVAL_MS"
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+MODES = (MODE_CPROFILE, MODE_SAMPLE)
+
+DEFAULT_DIR = "profiles"
+DEFAULT_TOP = 25
+DEFAULT_INTERVAL_MS = 5.0
+# tracemalloc 为每个分配保存的栈帧数
+TRACEMALLOC_FRAMES = 10
+
+_session_lock = threading.Lock()
+
+
+def profile_mode(mode=None):
+    """
+    解析分析模式
+
+    参数:
+        mode: 显式指定的模式；为 None 时读取环境变量 PROFILE
+
+    返回:
+        cprofile / sample，关闭时返回 None
+    """
+    if mode is None:
+        mode = os.environ.get(PROFILE_ENV, "")
+    mode = str(mode).strip().lower()
+    if mode in ("", "0", "off", "false", "no", "none"):
+        return None
+    if mode in ("1", "on", "true", "yes"):
+        return MODE_CPROFILE
+    if mode not in MODES:
+        raise ValueError(f"不支持的分析模式: {mode} (可选 {', '.join(MODES)})")
+    return mode
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    采样分析器: 后台线程按固定间隔读取目标线程的调用栈并计数
+    不需要跟踪每次函数调用，开销基本只取决于采样间隔
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL_MS / 1000, thread_id=None):
+        """
+        参数:
+            interval: 采样间隔 (秒)
+            thread_id: 采样的线程，默认为调用 start() 的线程
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            # collapsed stacks 从根到叶
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def write_collapsed(self, path):
+        """按 collapsed stacks 格式写出 (每行 "根;...;叶 次数")"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def format_top(self, top):
+        """按包含该函数的采样次数 (总耗时) 和位于栈顶的采样次数 (自身耗时) 列出前 top 个函数"""
+        total = sum(self.stacks.values())
+        inclusive, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            for label in set(stack):
+                inclusive[label] += count
+            own[stack[-1]] += count
+        lines = [f"采样 {total} 次，间隔 {self.interval * 1000:.1f}ms", "",
+                 f"{'总计':>8} {'自身':>8}  函数"]
+        for label, count in inclusive.most_common(top):
+            lines.append(f"{count / total:>8.1%} {own[label] / total:>8.1%}  {label}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfileSession:
+    """一次分析会话: start() 开始记录，stop() 结束并写出结果文件"""
+
+    def __init__(self, name, mode, out_dir=None, top=None, memory=None, interval_ms=None):
+        """
+        参数:
+            name: 结果文件名前缀 (例如 process_images、request_face-graph)
+            mode: cprofile / sample
+            out_dir: 结果目录，默认读取环境变量 PROFILE_DIR
+            top: 列出的条目数，默认读取环境变量 PROFILE_TOP
+            memory: 是否用 tracemalloc 记录内存分配，默认读取环境变量 PROFILE_MEMORY
+            interval_ms: sample 模式的采样间隔，默认读取环境变量 PROFILE_INTERVAL_MS
+        """
+        self.name = re.sub(r"[^\w.-]+", "_", name).strip("_") or "run"
+        self.mode = mode
+        self.out_dir = out_dir or os.environ.get(PROFILE_DIR_ENV, DEFAULT_DIR)
+        self.top = top or int(os.environ.get(PROFILE_TOP_ENV, DEFAULT_TOP))
+        self.memory = memory if memory is not None else os.environ.get(PROFILE_MEMORY_ENV, "1") != "0"
+        self.interval = (interval_ms or float(os.environ.get(PROFILE_INTERVAL_ENV, DEFAULT_INTERVAL_MS))) / 1000
+        self._profiler = None
+        self._sampler = None
+        self._snapshot = None
+        self._started_tracemalloc = False
+        self._started = None
+
+    def start(self):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracemalloc = True
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.mode == MODE_CPROFILE:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = SamplingProfiler(self.interval)
+            self._sampler.start()
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """
+        结束记录并写出结果
+
+        返回:
+            写出的文件路径列表
+        """
+        elapsed = time.perf_counter() - self._started
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        snapshot = tracemalloc.take_snapshot() if self._snapshot is not None else None
+        peak = tracemalloc.get_traced_memory()[1] if snapshot is not None else 0
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}-{os.getpid()}"
+        base = os.path.join(self.out_dir, f"{self.name}-{stamp}")
+        paths = []
+        header = f"{self.name} ({self.mode}) 耗时 {elapsed:.3f}s\n\n"
+
+        if self._profiler is not None:
+            self._profiler.dump_stats(base + ".prof")
+            text = io.StringIO()
+            pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(self.top)
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(header + text.getvalue())
+            paths += [base + ".prof", base + ".txt"]
+        if self._sampler is not None:
+            self._sampler.write_collapsed(base + ".collapsed")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(header + self._sampler.format_top(self.top))
+            paths += [base + ".collapsed", base + ".txt"]
+        if snapshot is not None:
+            self._write_allocations(base + ".alloc.txt", snapshot, peak)
+            paths.append(base + ".alloc.txt")
+        return paths
+
+    def _write_allocations(self, path, snapshot, peak):
+        """写出运行期间新增内存最多的分配位置"""
+        # 排除 tracemalloc 自身和本模块的分配
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = snapshot.filter_traces(filters).compare_to(self._snapshot.filter_traces(filters), "lineno")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{self.name} 内存峰值 {peak / 1024 / 1024:.1f} MiB，"
+                    f"运行期间新增内存最多的 {self.top} 个分配位置:\n\n")
+            for stat in stats[:self.top]:
+                frame = stat.traceback[0]
+                f.write(f"{stat.size_diff / 1024:>10.1f} KiB {stat.count_diff:>+8d} 块  "
+                        f"{frame.filename}:{frame.lineno}\n")
+
+
+@contextmanager
+def profile_run(name, mode=None, **kwargs):
+    """
+    在分析会话中执行一段代码；未开启分析或已有会话在进行时不做任何事
+
+    参数:
+        name: 结果文件名前缀
+        mode: cprofile / sample / off，默认读取环境变量 PROFILE
+        kwargs: 传给 ProfileSession
+
+    用法:
+        with profile_run("process_images"):
+            ...
+    """
+    mode = profile_mode(mode)
+    if mode is None or not _session_lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        session = ProfileSession(name, mode, **kwargs)
+        session.start()
+        try:
+            yield session
+        finally:
+            paths = session.stop()
+            logger.info("性能分析结果已写入: %s", ", ".join(paths))
+    finally:
+        _session_lock.release()
+
+
+def _pop_profile_flag(argv):
+    """从参数列表中取出 --profile / --profile=<mode>，返回模式 (没有该参数时为 None)"""
+    for i, arg in enumerate(argv):
+        if arg == "--profile":
+            del argv[i]
+            return MODE_CPROFILE
+        if arg.startswith("--profile="):
+            del argv[i]
+            return arg.split("=", 1)[1]
+    return None
+
+
+def install_profiling(name=None, argv=None):
+    """
+    为整个脚本开启分析 (用于 demo 等没有命令行解析的脚本)
+    命令行带 --profile[=模式] 或设置了环境变量 PROFILE 时开始记录，进程退出时写出结果
+
+    参数:
+        name: 结果文件名前缀，默认为脚本文件名
+        argv: 命令行参数列表，默认为 sys.argv (会从中移除 --profile 参数)
+
+    返回:
+        ProfileSession，未开启分析时返回 None
+    """
+    argv = sys.argv if argv is None else argv
+    mode = profile_mode(_pop_profile_flag(argv))
+    if mode is None or not _session_lock.acquire(blocking=False):
+        return None
+    name = name or os.path.splitext(os.path.basename(argv[0] if argv else "run"))[0]
+    session = ProfileSession(name, mode)
+    session.start()
+
+    def finish():
+        try:
+            print(f"性能分析结果已写入: {', '.join(session.stop())}")
+        finally:
+            _session_lock.release()
+
+    atexit.register(finish)
+    return session
@@ -1,14 +1,23 @@
-from pymilvus import MilvusClient, DataType, FieldSchema, CollectionSchema
+import os
+import sys
+from pymilvus import DataType, FieldSchema, CollectionSchema
+from pymilvus import AnnSearchRequest, RRFRanker, WeightedRanker
 from pymilvus import model
-import time
+from pymilvus.model.sparse import BM25EmbeddingFunction
+from pymilvus.model.sparse.bm25.tokenizers import build_default_analyzer
+
+# 共享的 Milvus 连接模块位于上级目录 src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from milvus_connection import get_client, get_config, close_pool
+from milvus_wait import wait_for_dropped, wait_for_loaded
+from milvus_consistency import insert_with_token, read_options
 
 # --- 0. 配置参数 ---
-MILVUS_HOST = "localhost"
-MILVUS_PORT = "19379"
 COLLECTION_NAME = "sentence_transformer_demo_collection"
 ID_FIELD_NAME = "id"
 TEXT_FIELD_NAME = "original_text" # 存储原始文本，方便查看结果
 EMBEDDING_FIELD_NAME = "embedding"
+SPARSE_FIELD_NAME = "sparse_embedding" # BM25 稀疏向量，用于关键词 (词法) 匹配
 
 # Sentence Transformers 模型
 # MODEL_NAME = 'all-MiniLM-L6-v2' # 这是一个常用且效果不错的模型 (维度 384)
@@ -16,11 +25,20 @@ EMBEDDING_FIELD_NAME = "embedding"
 MODEL_NAME = 'BAAI/bge-large-zh-v1.5' # 中文特训模型
 DEVICE = 'cpu' # Specify the device to use, e.g., 'cpu' or 'cuda:0'
 
+# BM25 稀疏编码器 (本地计算，中文分词依赖 jieba: pip install jieba)
+BM25_LANGUAGE = "zh"
+BM25_PARAMS_PATH = "bm25_params.json" # 语料统计 (IDF 等) 保存路径，查询端需使用同一份参数
+
+# 混合检索融合方式: "rrf" (Reciprocal Rank Fusion) 或 "weighted" (按分数加权)
+HYBRID_RANKER = "rrf"
+RRF_K = 60                   # RRF 平滑参数，越大排名靠后的结果影响越大
+HYBRID_WEIGHTS = (0.7, 0.3)  # weighted 模式下 (稠密, 稀疏) 的权重
+
 # --- 1. 连接 Milvus ---
 client = None
 try:
-    print(f"正在连接 Milvus ({MILVUS_HOST}:{MILVUS_PORT})...")
-    client = MilvusClient(host=MILVUS_HOST, port=MILVUS_PORT)
+    print(f"正在连接 Milvus ({get_config().uri})...")
+    client = get_client()
     print("Milvus 连接成功!")
 except Exception as e:
     print(f"Milvus 连接失败: {e}")
@@ -35,6 +53,9 @@ model = model.dense.SentenceTransformerEmbeddingFunction(
 EMBEDDING_DIM = model.dim
 print(f"模型加载完毕。嵌入维度 (dim): {EMBEDDING_DIM}")
 
+# BM25 编码器需要先在语料上 fit (统计词频与 IDF)，见第 5 步
+bm25_ef = BM25EmbeddingFunction(build_default_analyzer(language=BM25_LANGUAGE))
+
 # --- 3. 定义 Schema ---
 # 主键字段 (自动生成 ID)
 field_id = FieldSchema(
@@ -58,10 +79,16 @@ field_embedding = FieldSchema(
     dim=EMBEDDING_DIM, # **dim 是必传的**
     description="Float vector embeddings from Sentence Transformers"
 )
+# 稀疏向量字段 (BM25)，不需要指定 dim
+field_sparse = FieldSchema(
+    name=SPARSE_FIELD_NAME,
+    dtype=DataType.SPARSE_FLOAT_VECTOR,
+    description="Sparse BM25 vectors for lexical matching"
+)
 
 # 创建 Schema
 schema = CollectionSchema(
-    fields=[field_id, field_text, field_embedding],
+    fields=[field_id, field_text, field_embedding, field_sparse],
     description="Collection for storing sentence embeddings",
     enable_dynamic_field=False # 通常对于结构化数据设为 False
 )
@@ -72,7 +99,7 @@ print("Schema 定义完成。")
 if client.has_collection(collection_name=COLLECTION_NAME):
     print(f"集合 '{COLLECTION_NAME}' 已存在，将删除后重建。")
     client.drop_collection(collection_name=COLLECTION_NAME)
-    time.sleep(1) # 等待删除操作完成
+    wait_for_dropped(client, COLLECTION_NAME) # 等待删除操作完成
 
 try:
     client.create_collection(
@@ -100,13 +127,29 @@ sentences_to_insert = [
 embeddings = model.encode_documents(sentences_to_insert)
 # embeddings 是一个 numpy 数组，每一行是一个句子的嵌入
 
+# 在待插入语料上 fit BM25，并保存参数供之后的查询使用
+bm25_ef.fit(sentences_to_insert)
+bm25_ef.save(BM25_PARAMS_PATH)
+sparse_embeddings = bm25_ef.encode_documents(sentences_to_insert)
+# sparse_embeddings 是一个 scipy 稀疏矩阵，每一行是一个句子的 BM25 向量
+
+
+def sparse_row_to_dict(sparse_matrix, row):
+    """将稀疏矩阵的一行转换为 Milvus 接受的 {维度下标: 权重} 格式"""
+    start, end = sparse_matrix.indptr[row], sparse_matrix.indptr[row + 1]
+    return {
+        int(index): float(value)
+        for index, value in zip(sparse_matrix.indices[start:end], sparse_matrix.data[start:end])
+    }
+
 # 准备插入 Milvus 的数据
 # MilvusClient 的插入方法需要字典格式的数据
 data_to_insert_milvus = []
 for i in range(len(sentences_to_insert)):
     data_to_insert_milvus.append({
         TEXT_FIELD_NAME: sentences_to_insert[i], 
-        EMBEDDING_FIELD_NAME: embeddings[i].tolist()
+        EMBEDDING_FIELD_NAME: embeddings[i].tolist(),
+        SPARSE_FIELD_NAME: sparse_row_to_dict(sparse_embeddings, i)
     })
 
 print(f"生成了 {len(data_to_insert_milvus)} 条嵌入数据。")
@@ -114,22 +157,10 @@ print(f"生成了 {len(data_to_insert_milvus)} 条嵌入数据。")
 # 插入数据
 try:
     print("正在向 Milvus 插入数据...")
-    insert_result = client.insert(
-        collection_name=COLLECTION_NAME,
-        data=data_to_insert_milvus
-    )
+    # 同时得到这次写入的令牌，之后的检索带上令牌即可读到这些数据，不需要 flush
+    insert_result, write_token = insert_with_token(client, COLLECTION_NAME, data_to_insert_milvus)
     print(f"数据插入成功!")
     print(f"成功插入 {len(data_to_insert_milvus)} 条实体。")
-
-    # 刷新数据，使其可被搜索和查询
-    # 在 Milvus 中，插入的数据首先进入内存缓冲区，flush 操作将其持久化并使其可查询
-    print("\nFlushing data...")
-    client.flush(collection_name=COLLECTION_NAME)
-    print("Flush complete.")
-    
-    # 获取集合实体数量
-    stats = client.get_collection_stats(collection_name=COLLECTION_NAME)
-    print(f"当前集合实体数量: {stats['row_count']}")
 except Exception as e:
     print(f"数据插入失败: {e}")
     exit()
@@ -161,6 +192,15 @@ try:
         params={"M": 16, "efConstruction": 200},
         index_name="sentence_transformer_demo_index"
     )
+    # 稀疏向量使用倒排索引，BM25 分数对应内积 (IP)
+    # 短查询的每个词都很重要，这里不设置 drop_ratio_build，保留全部权重
+    index_params.add_index(
+        field_name=SPARSE_FIELD_NAME,
+        index_type="SPARSE_INVERTED_INDEX",
+        metric_type="IP",
+        params={},
+        index_name="sentence_transformer_demo_sparse_index"
+    )
     client.create_index(
         collection_name=COLLECTION_NAME,
         index_params=index_params
@@ -171,6 +211,9 @@ try:
     indexes = client.describe_index(collection_name=COLLECTION_NAME, index_name="sentence_transformer_demo_index")
     for index in indexes:
         print(f"  字段: {index}: {indexes.get(index)}")
+    sparse_index = client.describe_index(collection_name=COLLECTION_NAME, index_name="sentence_transformer_demo_sparse_index")
+    for index in sparse_index:
+        print(f"  字段: {index}: {sparse_index.get(index)}")
 
 except Exception as e:
     print(f"索引创建失败: {e}")
@@ -181,32 +224,56 @@ except Exception as e:
 try:
     print("正在加载集合到内存...")
     client.load_collection(collection_name=COLLECTION_NAME)
-    time.sleep(2)
+    wait_for_loaded(client, COLLECTION_NAME)
     print("集合加载完成!")
 except Exception as e:
     print(f"集合加载失败: {e}")
     exit()
 
 
-# --- 8. 执行向量相似度搜索 ---
+# --- 8. 执行混合检索 (稠密 + 稀疏) ---
 query_sentence = "什么是向量数据库?"
 print(f"\n准备查询: \"{query_sentence}\"")
 
-# 1. 将查询语句转换为向量
+# 1. 将查询语句分别转换为稠密向量和 BM25 稀疏向量
 query_embedding = model.encode_queries([query_sentence])[0].tolist() # model.encode 返回一个列表的列表或numpy数组
+query_bm25 = BM25EmbeddingFunction(build_default_analyzer(language=BM25_LANGUAGE))
+query_bm25.load(BM25_PARAMS_PATH) # 使用与文档相同的语料统计
+query_sparse = sparse_row_to_dict(query_bm25.encode_queries([query_sentence]), 0)
 
 # 2. 定义搜索参数
 TOP_K = 3 # 返回最相似的 top_k 个结果
+CANDIDATE_K = 10 # 每一路召回的候选数量，融合前的候选越多，融合结果越稳定
+
+# 每一路检索对应一个 AnnSearchRequest，两路在服务端一次请求内完成召回与融合
+dense_request = AnnSearchRequest(
+    data=[query_embedding],
+    anns_field=EMBEDDING_FIELD_NAME,
+    param={"metric_type": INDEX_METRIC_TYPE, "params": {"ef": 128}}, # HNSW 搜索时的探索范围，ef >= top_k
+    limit=CANDIDATE_K
+)
+sparse_request = AnnSearchRequest(
+    data=[query_sparse],
+    anns_field=SPARSE_FIELD_NAME,
+    param={"metric_type": "IP", "params": {}},
+    limit=CANDIDATE_K
+)
+
+# RRF 只看排名，不受两路分数量纲不同的影响；weighted 按权重合并归一化后的分数
+if HYBRID_RANKER == "weighted":
+    ranker = WeightedRanker(*HYBRID_WEIGHTS)
+else:
+    ranker = RRFRanker(RRF_K)
 
-print(f"正在执行搜索 (Top K={TOP_K})...")
+print(f"正在执行混合检索 (Top K={TOP_K}, ranker={HYBRID_RANKER})...")
 try:
-    search_results = client.search(
+    search_results = client.hybrid_search(
         collection_name=COLLECTION_NAME,
-        data=[query_embedding],             # 查询向量，可以批量查询，所以是列表
-        anns_field=EMBEDDING_FIELD_NAME,    # 要搜索的向量字段名
-        params={"ef": 128},                  # HNSW 搜索时的探索范围，ef >= top_k，通常比 top_k 大很多           
-        limit=TOP_K,                        # 返回结果数量
-        output_fields=[TEXT_FIELD_NAME]     # 希望返回的字段，除了距离和主键ID
+        reqs=[dense_request, sparse_request], # 稠密与稀疏两路召回
+        ranker=ranker,                        # 服务端融合，客户端无需合并两份结果
+        limit=TOP_K,                          # 返回结果数量
+        output_fields=[TEXT_FIELD_NAME],      # 希望返回的字段，除了距离和主键ID
+        **read_options(token=write_token)     # 等到上面插入的数据可见后再检索
     )
 
     # 3. 处理并打印搜索结果
@@ -231,7 +298,7 @@ except Exception as e:
 
 # 关闭客户端连接
 if client:
-    client.close()
+    close_pool()
     print("客户端连接已关闭。")
 
 print("\nDemo 执行完毕。") 
\ No newline at end of file
@@ -1,11 +1,11 @@
 # test_milvus.py
-from pymilvus import connections, utility
+from milvus_connection import get_client, get_config, close_pool
 
 try:
-    print("准备连接到 Milvus Lite...")
-    connections.connect(alias="default", host="localhost", port="19530")
-    print("成功连接到 Milvus Lite!")
-    print("服务器版本:", utility.get_server_version())
-    connections.disconnect(alias="default")
+    print(f"准备连接到 Milvus ({get_config().uri})...")
+    client = get_client()
+    print("成功连接到 Milvus!")
+    print("服务器版本:", client.get_server_version())
+    close_pool()
 except Exception as e:
-    print(f"连接失败: {e}")
\ No newline at end of file
+    print(f"连接失败: {e}")
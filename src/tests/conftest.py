@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+"""单元测试的公共设置: 与各入口脚本一样把 src/、src/face/ 和 src/benchmarks/ 加入 sys.path"""
+
+import os
+import sys
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (SRC_DIR, os.path.join(SRC_DIR, "face"), os.path.join(SRC_DIR, "benchmarks")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+"""face_graph: 边的分页游标与按数据版本缓存的人脸库快照"""
+
+import numpy as np
+
+from face_config import COLLECTION_NAME, EMBEDDING_FIELD_NAME, ID_FIELD_NAME, NAME_FIELD_NAME, PATH_FIELD_NAME
+from face_graph import Gallery, edge_cursor, get_gallery, iter_edges, normalize, parse_edge_cursor
+from fake_milvus import FakeMilvusClient
+from milvus_cache import bump_version
+
+DIM = 8
+
+
+def make_gallery(ids, seed=0):
+    rng = np.random.default_rng(seed)
+    # 两组相近的向量，组内相似度都超过阈值
+    centers = rng.standard_normal((2, DIM)).astype(np.float32)
+    vectors = np.stack([centers[i % 2] + 0.01 * rng.standard_normal(DIM) for i in range(len(ids))]).astype(np.float32)
+    return Gallery(ids=np.array(ids, dtype=np.int64), names=[str(i) for i in ids],
+                   image_paths=[f"{i}.jpg" for i in ids], vectors=vectors,
+                   unit_vectors=normalize(vectors).astype(np.float32))
+
+
+def paged_edges(gallery, threshold, limit):
+    """按 face_api 的 /face-graph/edges 逐页读取全部边"""
+    edges, cursor = [], None
+    while True:
+        page = []
+        for edge in iter_edges(gallery, threshold, start=parse_edge_cursor(gallery, cursor)):
+            if len(page) == limit:
+                cursor = edge_cursor(gallery, edge[3], edge[4])
+                break
+            page.append(edge)
+        else:
+            cursor = None
+        edges += page
+        if cursor is None:
+            return edges
+
+
+def test_pages_cover_all_edges_once():
+    gallery = make_gallery([3, 5, 8, 13, 21, 34, 55])
+    expected = list(iter_edges(gallery, 0.0))
+    assert len(expected) == 9
+    for limit in (1, 2, 4, 100):
+        assert paged_edges(gallery, 0.0, limit) == expected
+
+
+def test_cursor_uses_primary_keys():
+    gallery = make_gallery([3, 5, 8, 13])
+    assert edge_cursor(gallery, 1, 3) == "5:13"
+    assert parse_edge_cursor(gallery, "5:13") == (1, 3)
+    assert parse_edge_cursor(gallery, None) == (0, 0)
+    # 列号越界表示该行已经结束，从下一行开始
+    assert edge_cursor(gallery, 1, 4) == "5:end"
+    assert parse_edge_cursor(gallery, "5:end") == (2, 0)
+
+
+def test_cursor_survives_deleted_source():
+    # 游标指向的人脸 5 在两次请求之间被删除，从下一个主键 8 的第一条边开始
+    gallery = make_gallery([3, 8, 13])
+    assert parse_edge_cursor(gallery, "5:13") == (1, 0)
+    assert parse_edge_cursor(gallery, "99:end") == (3, 0)
+
+
+class CountingClient(FakeMilvusClient):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def query_iterator(self, collection_name, **kwargs):
+        self.reads += 1
+        return super().query_iterator(collection_name, **kwargs)
+
+
+def test_gallery_snapshot_reused_until_version_changes():
+    client = CountingClient()
+    client.add_collection(COLLECTION_NAME, [
+        {ID_FIELD_NAME: i, EMBEDDING_FIELD_NAME: np.ones(DIM, dtype=np.float32), NAME_FIELD_NAME: str(i),
+         PATH_FIELD_NAME: f"{i}.jpg"} for i in range(5)
+    ], id_field=ID_FIELD_NAME, vector_field=EMBEDDING_FIELD_NAME, dim=DIM)
+    bump_version(client, COLLECTION_NAME)
+
+    first = get_gallery(client)
+    assert get_gallery(client) is first
+    assert client.reads == 1
+
+    bump_version(client, COLLECTION_NAME)
+    assert get_gallery(client) is not first
+    assert client.reads == 2
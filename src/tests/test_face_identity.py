@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""face_identity.update_identities: 连续两次增量更新不丢失第一次的写入"""
+
+import numpy as np
+
+from face_config import (
+    EMBEDDING_DIM, EMBEDDING_SUM_FIELD_NAME, IDENTITY_COLLECTION_NAME, NAME_FIELD_NAME, PHOTO_COUNT_FIELD_NAME,
+)
+from face_identity import update_identities
+from milvus_consistency import STRONG
+
+
+class StaleReadClient:
+    """只实现身份集合用到的接口: 非 Strong 的 get 读到上一次写入之前的数据 (模拟 Bounded 一致性)"""
+
+    def __init__(self):
+        self.rows = {}
+        self.previous = {}
+
+    def has_collection(self, collection_name, **kwargs):
+        return True
+
+    def _write(self):
+        self.previous = dict(self.rows)
+
+    def upsert(self, collection_name, data, **kwargs):
+        self._write()
+        for row in data:
+            self.rows[row[NAME_FIELD_NAME]] = row
+
+    def delete(self, collection_name, ids, **kwargs):
+        self._write()
+        for name in ids:
+            self.rows.pop(name, None)
+
+    def get(self, collection_name, ids, output_fields=None, consistency_level=None, **kwargs):
+        rows = self.rows if consistency_level == STRONG else self.previous
+        return [rows[name] for name in ids if name in rows]
+
+    def alter_collection_properties(self, collection_name, properties, **kwargs):
+        pass
+
+
+def vector(seed):
+    return np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+
+
+def test_back_to_back_updates_see_previous_write():
+    client = StaleReadClient()
+    update_identities(client, ["alice", "alice"], [vector(0), vector(1)])
+    update_identities(client, ["alice"], [vector(2)])
+    assert client.rows["alice"][PHOTO_COUNT_FIELD_NAME] == 3
+
+    # 替换照片: 先减去旧照片再加上新照片
+    update_identities(client, ["alice"], [vector(2)], remove=True)
+    update_identities(client, ["alice"], [vector(3)])
+    row = client.rows["alice"]
+    assert row[PHOTO_COUNT_FIELD_NAME] == 3
+    expected = sum(v / np.linalg.norm(v) for v in (vector(0), vector(1), vector(3)))
+    np.testing.assert_allclose(row[EMBEDDING_SUM_FIELD_NAME], expected, rtol=1e-5, atol=1e-5)
+
+
+def test_removing_last_photo_deletes_identity():
+    client = StaleReadClient()
+    update_identities(client, ["bob"], [vector(0)], collection_name=IDENTITY_COLLECTION_NAME)
+    update_identities(client, ["bob"], [vector(0)], remove=True)
+    assert "bob" not in client.rows
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""face_video: IoU、人脸轨迹，以及用模拟的 cv2 / face_recognition 运行 VideoIngest"""
+
+import numpy as np
+import pytest
+
+import face_video
+from face_config import END_MS_FIELD_NAME, START_MS_FIELD_NAME
+from face_video import FaceTracker, VideoIngest, iou
+
+# (top, right, bottom, left)
+BOX_A = (0, 100, 100, 0)
+BOX_B = (200, 300, 300, 200)
+
+
+def encode(to_encode, timestamp_ms=0):
+    """模拟 VideoIngest._encode: 为需要编码的轨迹写入特征向量和质量"""
+    for track, _, quality in to_encode:
+        track.encoding, track.quality, track.best_ms = np.zeros(4), quality, timestamp_ms
+        track.encodings += 1
+
+
+def shifted(box, dx):
+    top, right, bottom, left = box
+    return top, right + dx, bottom, left + dx
+
+
+def test_iou():
+    assert iou(BOX_A, BOX_A) == 1.0
+    assert iou(BOX_A, BOX_B) == 0.0
+    # 水平错开一半: 交集 50x100，并集 150x100
+    assert iou(BOX_A, shifted(BOX_A, 50)) == pytest.approx(1 / 3)
+    assert iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def test_new_detection_starts_track_and_is_encoded():
+    tracker = FaceTracker()
+    to_encode, finished = tracker.update([(BOX_A, 1.0)], 0)
+    assert finished == []
+    assert len(tracker.active) == 1
+    assert [(track.track_id, box) for track, box, _ in to_encode] == [(0, BOX_A)]
+
+
+def test_matched_detection_reencoded_only_on_quality_gain():
+    tracker = FaceTracker(quality_gain=0.2)
+    encode(tracker.update([(BOX_A, 1.0)], 0)[0])
+    track = tracker.active[0]
+
+    # 质量没有超过 (1 + quality_gain) 倍: 只更新位置，不重新编码
+    to_encode, _ = tracker.update([(shifted(BOX_A, 5), 1.2)], 100)
+    assert to_encode == []
+    assert track.hits == 2 and track.last_ms == 100 and track.box == shifted(BOX_A, 5)
+
+    to_encode, _ = tracker.update([(shifted(BOX_A, 10), 1.3)], 200)
+    assert [t for t, _, _ in to_encode] == [track]
+    encode(to_encode, 200)
+    assert track.encodings == 2 and track.best_ms == 200
+
+
+def test_greedy_matching_prefers_highest_iou():
+    tracker = FaceTracker(iou_threshold=0.3)
+    encode(tracker.update([(BOX_A, 1.0), (BOX_B, 1.0)], 0)[0])
+    first, second = tracker.active
+
+    # 检测顺序与轨迹顺序相反，仍按 IoU 匹配到各自的轨迹
+    to_encode, _ = tracker.update([(shifted(BOX_B, 10), 1.0), (shifted(BOX_A, 10), 1.0)], 100)
+    assert to_encode == []
+    assert first.box == shifted(BOX_A, 10)
+    assert second.box == shifted(BOX_B, 10)
+    assert len(tracker.active) == 2
+
+
+def test_detection_below_iou_threshold_starts_new_track():
+    tracker = FaceTracker(iou_threshold=0.5)
+    encode(tracker.update([(BOX_A, 1.0)], 0)[0])
+    # IoU 1/3 低于阈值
+    to_encode, _ = tracker.update([(shifted(BOX_A, 50), 1.0)], 100)
+    assert [track.track_id for track, _, _ in to_encode] == [1]
+    assert len(tracker.active) == 2
+
+
+def test_track_finishes_after_max_missed_frames():
+    tracker = FaceTracker(max_missed=2, min_hits=2)
+    encode(tracker.update([(BOX_A, 1.0)], 0)[0])
+    tracker.update([(BOX_A, 1.0)], 100)
+    assert tracker.update([], 200)[1] == []
+    assert tracker.update([], 300)[1] == []
+    _, finished = tracker.update([], 400)
+    assert [track.track_id for track in finished] == [0]
+    assert finished[0].first_ms == 0 and finished[0].last_ms == 100
+    assert tracker.active == []
+
+
+def test_min_hits_and_missing_encoding_are_filtered():
+    tracker = FaceTracker(max_missed=0, min_hits=2)
+    # 只出现一次的轨迹结束时被丢弃
+    encode(tracker.update([(BOX_A, 1.0)], 0)[0])
+    _, finished = tracker.update([], 100)
+    assert finished == []
+
+    # 出现两次但从未编码成功 (例如 face_encodings 没有返回结果) 的轨迹同样被丢弃
+    tracker.update([(BOX_B, 1.0)], 200)
+    tracker.update([(BOX_B, 1.0)], 300)
+    assert tracker.finish() == []
+
+
+def test_finish_returns_kept_active_tracks():
+    tracker = FaceTracker(min_hits=2)
+    encode(tracker.update([(BOX_A, 1.0), (BOX_B, 1.0)], 0)[0])
+    tracker.update([(BOX_A, 1.0)], 100)
+    finished = tracker.finish()
+    assert [track.track_id for track in finished] == [0]
+    assert tracker.active == []
+
+
+class FakeCapture:
+    """每帧都有同一张人脸的视频文件；read() 之后的 CAP_PROP_POS_MSEC 与 OpenCV 一样指向下一帧"""
+
+    def __init__(self, frames, fps):
+        self.frames, self.fps, self.position = frames, fps, 0
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return self.fps if prop == FakeCV2.CAP_PROP_FPS else self.position * 1000 / self.fps
+
+    def grab(self):
+        self.position += 1
+        return self.position <= self.frames
+
+    def read(self):
+        ok = self.grab()
+        return ok, np.zeros((20, 20, 3), dtype=np.uint8) if ok else None
+
+    def release(self):
+        pass
+
+
+class FakeCV2:
+    CAP_PROP_FPS, CAP_PROP_POS_MSEC, COLOR_BGR2RGB, COLOR_RGB2GRAY, CV_64F = range(5)
+
+    def __init__(self, capture):
+        self.VideoCapture = lambda source: capture
+
+    @staticmethod
+    def cvtColor(frame, code):
+        return frame[..., 0] if code == FakeCV2.COLOR_RGB2GRAY else frame
+
+    @staticmethod
+    def Laplacian(crop, depth):
+        return np.ones(crop.shape)
+
+
+class FakeFaceRecognition:
+    @staticmethod
+    def face_locations(rgb):
+        return [(0, 10, 10, 0)]
+
+    @staticmethod
+    def face_encodings(rgb, boxes):
+        return [np.zeros(8) for _ in boxes]
+
+
+@pytest.fixture
+def video(monkeypatch):
+    """替换解码、建集合、插入和 bump_version，返回 (插入的行, bump_version 调用的集合)"""
+    inserted, bumped = [], []
+    monkeypatch.setattr(face_video, "_load_vision", lambda: (FakeCV2(FakeCapture(frames=6, fps=10.0)),
+                                                             FakeFaceRecognition))
+    monkeypatch.setattr(face_video, "ensure_video_collection", lambda client, collection_name: None)
+    monkeypatch.setattr(face_video, "insert_with_token", lambda client, collection_name, rows: inserted.extend(rows))
+    monkeypatch.setattr(face_video, "bump_version", lambda client, collection_name: bumped.append(collection_name))
+    return inserted, bumped
+
+
+def test_file_timestamps_follow_frame_index(video):
+    inserted, bumped = video
+    report = VideoIngest(None, "clip.mp4", sample_fps=10.0, detect_scale=1, batch_size=1).run(replace=False)
+    assert report.frames == 6 and report.tracks == 1
+    assert (inserted[0][START_MS_FIELD_NAME], inserted[0][END_MS_FIELD_NAME]) == (0, 500)
+    # 没有缓存轨迹集合时不更新数据版本
+    assert bumped == []
+
+
+def test_cached_collection_is_bumped_once_per_run(video):
+    inserted, bumped = video
+    VideoIngest(None, "clip.mp4", sample_fps=10.0, detect_scale=1, batch_size=1, cached=True).run(replace=False)
+    assert bumped == [face_video.VIDEO_COLLECTION_NAME]
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+"""milvus_cache.SearchCache: 命中、失效与不缓存时的结果类型"""
+
+import numpy as np
+
+from fake_milvus import FakeMilvusClient
+from milvus_cache import SearchCache, bump_version, deferred_bumps, read_version
+
+DIM = 8
+
+
+class CountingClient(FakeMilvusClient):
+    """记录 search 调用次数和每次的查询向量数量"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def search(self, collection_name, data, **kwargs):
+        self.calls.append(len(data))
+        return super().search(collection_name, data, **kwargs)
+
+    def alter_collection_properties(self, collection_name, properties, **kwargs):
+        self.calls.append("alter")
+        return super().alter_collection_properties(collection_name, properties, **kwargs)
+
+
+def make_client():
+    rng = np.random.default_rng(0)
+    client = CountingClient()
+    client.add_collection("faces", [{"id": i, "embedding": rng.standard_normal(DIM).astype(np.float32), "name": str(i)}
+                                    for i in range(30)], dim=DIM)
+    return client
+
+
+def search(cache, client, data, **kwargs):
+    return cache.search(client, "faces", data, limit=3, anns_field="embedding",
+                        search_params={"metric_type": "COSINE"}, output_fields=["name"], **kwargs)
+
+
+def test_repeated_query_hits_cache():
+    client, cache = make_client(), SearchCache(max_entries=100, ttl=60)
+    query = [1.0] * DIM
+    first = search(cache, client, [query])
+    # 量化步长以内的差异共用结果
+    second = search(cache, client, [[1.0 + 1e-5] * DIM])
+    assert first == second
+    assert client.calls == [1]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_only_missing_vectors_are_searched():
+    client, cache = make_client(), SearchCache(max_entries=100, ttl=60)
+    search(cache, client, [[1.0] * DIM])
+    results = search(cache, client, [[1.0] * DIM, [-1.0] * DIM, [0.5] * DIM])
+    assert client.calls == [1, 2]
+    assert len(results) == 3
+
+
+def test_different_parameters_do_not_share_entries():
+    client, cache = make_client(), SearchCache(max_entries=100, ttl=60)
+    search(cache, client, [[1.0] * DIM])
+    search(cache, client, [[1.0] * DIM], filter="id > 3")
+    search(cache, client, [[1.0] * DIM], consistency_level="Strong")
+    assert client.calls == [1, 1, 1]
+
+
+def test_bump_version_invalidates():
+    client, cache = make_client(), SearchCache(max_entries=100, ttl=60)
+    search(cache, client, [[1.0] * DIM])
+    bump_version(client, "faces")
+    search(cache, client, [[1.0] * DIM])
+    assert client.calls == [1, "alter", 1]
+
+
+def test_deferred_bumps_write_the_version_once():
+    client, cache = make_client(), SearchCache(max_entries=100, ttl=60)
+    search(cache, client, [[1.0] * DIM])
+    before = read_version(client, "faces")
+    with deferred_bumps():
+        for _ in range(3):
+            bump_version(client, "faces")
+        with deferred_bumps():
+            bump_version(client, "faces")
+        # 尚未写入集合属性，本进程的缓存已经失效
+        assert read_version(client, "faces") == before
+        search(cache, client, [[1.0] * DIM])
+    assert client.calls == [1, 1, "alter"]
+    assert read_version(client, "faces") == cache.version(client, "faces") != before
+    search(cache, client, [[1.0] * DIM])
+    assert client.calls == [1, 1, "alter"]
+
+
+def test_lru_capacity():
+    client, cache = make_client(), SearchCache(max_entries=2, ttl=60)
+    for value in (1.0, 2.0, 3.0):
+        search(cache, client, [[value] + [0.0] * (DIM - 1)])
+    assert cache.stats()["entries"] == 2
+
+
+def test_disabled_cache_returns_plain_dicts():
+    client, cache = make_client(), SearchCache(max_entries=0)
+    cached = search(SearchCache(max_entries=100, ttl=60), client, [[1.0] * DIM])
+    bypass = search(cache, client, [[1.0] * DIM])
+    assert bypass == cached
+    assert set(bypass[0][0]) == {"id", "distance", "entity"}
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+"""milvus_consistency: 写入令牌的编码、合并与读参数"""
+
+import pytest
+
+from milvus_consistency import CUSTOMIZED, STRONG, WriteToken, read_options
+
+
+def test_token_round_trip():
+    token = WriteToken("faces@v2", 451234567890123456)
+    assert WriteToken.decode(token.encode()) == token
+
+
+@pytest.mark.parametrize("text", ["", "faces", "faces@", "@123", "faces@12x"])
+def test_decode_rejects_malformed_tokens(text):
+    with pytest.raises(ValueError):
+        WriteToken.decode(text)
+
+
+def test_merge_keeps_latest_write():
+    older, newer = WriteToken("faces", 10), WriteToken("faces", 20)
+    assert older.merge(newer) == newer
+    assert newer.merge(older) == newer
+    assert older.merge(None) == older
+    with pytest.raises(ValueError):
+        older.merge(WriteToken("identities", 30))
+
+
+def test_read_options_with_token():
+    assert read_options(token=WriteToken("faces", 42)) == {"consistency_level": CUSTOMIZED, "guarantee_timestamp": 42}
+    # 服务端不返回时间戳 (Milvus Lite) 时退化为 Strong
+    assert read_options(token=WriteToken("faces", 0)) == {"consistency_level": STRONG}
+    # 令牌优先于一致性级别
+    assert read_options("Eventually", WriteToken("faces", 42))["guarantee_timestamp"] == 42
+
+
+def test_read_options_levels(monkeypatch):
+    monkeypatch.delenv("MILVUS_READ_CONSISTENCY", raising=False)
+    assert read_options() == {}
+    assert read_options("bounded") == {"consistency_level": "Bounded"}
+    monkeypatch.setenv("MILVUS_READ_CONSISTENCY", "Session")
+    assert read_options() == {"consistency_level": "Session"}
+    with pytest.raises(ValueError):
+        read_options("Sometimes")
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+"""milvus_federated: top-k 归并与分片失败的处理"""
+
+import numpy as np
+import pytest
+
+from fake_milvus import FakeMilvusClient
+from milvus_federated import (
+    POLICY_ALL, STATUS_ERROR, STATUS_OK, FederatedSearchError, Shard, federated_search, merge_top_k,
+)
+
+
+def hits(*distances):
+    return [{"id": i, "distance": d, "entity": {}} for i, d in enumerate(distances)]
+
+
+def test_merge_top_k_similarity_descending():
+    merged = merge_top_k([hits(0.9, 0.5, 0.1), hits(0.8, 0.7)], 3)
+    assert [hit["distance"] for hit in merged] == [0.9, 0.8, 0.7]
+
+
+def test_merge_top_k_distance_ascending():
+    merged = merge_top_k([hits(0.1, 0.4), hits(0.2, 0.3, 0.9)], 4, higher_is_better=False)
+    assert [hit["distance"] for hit in merged] == [0.1, 0.2, 0.3, 0.4]
+
+
+def test_merge_top_k_fewer_results_than_limit():
+    assert [hit["distance"] for hit in merge_top_k([hits(0.5), []], 10)] == [0.5]
+
+
+def test_shard_parse():
+    assert Shard.parse("faces") == Shard("faces")
+    shard = Shard.parse("faces: p1, p2")
+    assert shard.partition_names == ("p1", "p2")
+    assert shard.label == "faces:p1,p2"
+
+
+def make_client(shards, rows_per_shard=20, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    client = FakeMilvusClient()
+    vectors = {}
+    for s, name in enumerate(shards):
+        rows = [{"id": s * 1000 + i, "embedding": rng.standard_normal(dim).astype(np.float32)}
+                for i in range(rows_per_shard)]
+        client.add_collection(name, rows, dim=dim)
+        vectors.update({row["id"]: row["embedding"] for row in rows})
+    return client, vectors
+
+
+def test_federated_search_equals_flat_search():
+    client, vectors = make_client(["a", "b", "c"])
+    query = np.ones(8, dtype=np.float32)
+    result = federated_search(["a", "b", "c"], [query.tolist()], "embedding", {"metric_type": "COSINE"},
+                              limit=5, clients=[client])
+    ids = np.array(list(vectors))
+    matrix = np.array(list(vectors.values()))
+    scores = matrix @ query / np.linalg.norm(matrix, axis=1) / np.linalg.norm(query)
+    assert [hit["id"] for hit in result.results[0]] == ids[np.argsort(-scores)[:5]].tolist()
+    assert not result.partial
+    assert all(report.status == STATUS_OK for report in result.shards)
+
+
+def test_failed_shard_reported_and_partial_results_returned():
+    client, _ = make_client(["a", "b"])
+    result = federated_search(["a", "missing"], [[1.0] * 8], "embedding", {"metric_type": "COSINE"},
+                              limit=3, clients=[client])
+    assert result.partial
+    assert [report.status for report in result.shards] == [STATUS_OK, STATUS_ERROR]
+    assert all(hit["shard"] == "a" for hit in result.results[0])
+
+
+def test_policy_all_raises_with_reports():
+    client, _ = make_client(["a"])
+    with pytest.raises(FederatedSearchError) as error:
+        federated_search(["a", "missing"], [[1.0] * 8], "embedding", {"metric_type": "COSINE"},
+                         clients=[client], policy=POLICY_ALL)
+    assert [report.shard for report in error.value.reports] == ["a", "missing"]
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""milvus_reader: query_page 按主键游标分页，export_collection 的输出文件"""
+
+import json
+import os
+
+import numpy as np
+
+from fake_milvus import FakeMilvusClient
+from milvus_reader import export_collection, query_page
+
+DIM = 4
+
+
+def make_client():
+    client = FakeMilvusClient()
+    # 主键不按插入顺序排列
+    ids = [7, 2, 11, 5, 3, 13, 1]
+    client.add_collection("faces", [{"id": i, "embedding": np.full(DIM, i, dtype=np.float32), "name": f"n{i}"}
+                                    for i in ids], dim=DIM)
+    return client
+
+
+def test_pages_in_primary_key_order():
+    client = make_client()
+    pages, after = [], None
+    while True:
+        page, has_more = query_page(client, "faces", after=after, limit=3, output_fields=["name"],
+                                    vector_field="embedding", id_field="id")
+        pages.append(page.ids.tolist())
+        assert page.columns["name"] == [f"n{i}" for i in page.ids]
+        assert page.vectors[:, 0].tolist() == page.ids.tolist()
+        if not has_more:
+            break
+        after = int(page.ids[-1])
+    assert pages == [[1, 2, 3], [5, 7, 11], [13]]
+
+
+def test_filter_and_exact_last_page():
+    client = make_client()
+    page, has_more = query_page(client, "faces", limit=3, filter="id > 4", id_field="id")
+    assert page.ids.tolist() == [5, 7, 11]
+    assert has_more
+    page, has_more = query_page(client, "faces", after=11, limit=1, filter="id > 4", id_field="id")
+    assert page.ids.tolist() == [13]
+    assert not has_more
+    assert page.vectors is None
+
+
+def test_export_writes_vectors_and_rows(tmp_path):
+    count = export_collection(make_client(), "faces", str(tmp_path), "embedding", output_fields=["name"],
+                              filter="id > 4", batch_size=2)
+    vectors = np.load(os.path.join(tmp_path, "vectors.npy"))
+    with open(os.path.join(tmp_path, "rows.jsonl"), encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert count == 4
+    assert sorted(row["id"] for row in rows) == [5, 7, 11, 13]
+    assert [row["id"] for row in rows] == vectors[:, 0].astype(int).tolist()
+
+
+def test_export_empty_result_writes_empty_vectors(tmp_path):
+    count = export_collection(make_client(), "faces", str(tmp_path), "embedding", filter="id > 100")
+    vectors = np.load(os.path.join(tmp_path, "vectors.npy"))
+    assert count == 0
+    assert vectors.shape == (0, DIM) and vectors.dtype == np.float32
+    assert os.path.getsize(os.path.join(tmp_path, "rows.jsonl")) == 0
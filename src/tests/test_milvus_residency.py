@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+"""milvus_residency.ResidencyManager: 被释放后重试、请求期间不换出正在使用的集合"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+from pymilvus.exceptions import MilvusException
+
+from fake_milvus import FakeMilvusClient
+from milvus_residency import COLLECTION_NOT_LOADED, ResidencyManager
+
+DIM = 8
+
+
+class ReleasingClient(FakeMilvusClient):
+    """未加载的集合上 query 返回错误码 101 (与 Milvus 服务端一致)"""
+
+    def query(self, collection_name, **kwargs):
+        if not self._get(collection_name).loaded:
+            raise MilvusException(code=COLLECTION_NOT_LOADED, message="collection not loaded")
+        return super().query(collection_name, **kwargs)
+
+
+def make_client(*names):
+    client = ReleasingClient()
+    for name in names:
+        client.add_collection(name, [{"id": i, "embedding": np.zeros(DIM, dtype=np.float32)} for i in range(100)],
+                              dim=DIM)
+    return client
+
+
+def test_call_reloads_collection_released_by_other_process():
+    client = make_client("faces")
+    manager = ResidencyManager(client, budget_bytes=0)
+    manager.ensure_loaded("faces")
+    # 其他进程释放了集合，管理器缓存的状态仍为已加载
+    client.release_collection("faces")
+
+    result = manager.call("faces", "query", filter="id < 3", output_fields=["id"])
+
+    assert [row["id"] for row in result] == [0, 1, 2]
+    assert client.get_load_state("faces")["state"].name == "Loaded"
+
+
+def test_other_errors_are_not_retried():
+    client = make_client("faces")
+    manager = ResidencyManager(client, budget_bytes=0)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise MilvusException(code=1, message="boom")
+
+    with pytest.raises(MilvusException):
+        manager.run(["faces"], failing)
+    assert len(calls) == 1
+
+
+def test_pinned_collection_is_not_evicted_by_second_load():
+    client = make_client("faces", "identities")
+    manager = ResidencyManager(client, budget_bytes=1)
+    manager.sync()
+
+    with manager.pin("faces", "identities"):
+        manager.ensure_loaded("faces")
+        manager.ensure_loaded("identities")
+        assert client.get_load_state("faces")["state"].name == "Loaded"
+
+    # 请求结束后超出预算的集合可以按 LRU 换出
+    manager.ensure_loaded("identities")
+    assert client.get_load_state("faces")["state"].name == "NotLoad"
+
+
+class BlockingReleaseClient(FakeMilvusClient):
+    """release_collection 阻塞到 unblock 被设置 (模拟等待 Query Node 释放)"""
+
+    def __init__(self):
+        super().__init__()
+        self.releasing = threading.Event()
+        self.unblock = threading.Event()
+
+    def release_collection(self, collection_name, **kwargs):
+        self.releasing.set()
+        self.unblock.wait(5)
+        super().release_collection(collection_name, **kwargs)
+
+
+def test_slow_eviction_does_not_block_other_collections():
+    client = BlockingReleaseClient()
+    for name in ("a", "b", "c"):
+        client.add_collection(name, [{"id": i, "embedding": np.zeros(DIM, dtype=np.float32)} for i in range(100)],
+                              dim=DIM)
+    # 每个集合估算 1600 字节，预算只够两个
+    manager = ResidencyManager(client, budget_bytes=3200)
+    manager.ensure_loaded("a")
+    manager.ensure_loaded("c")
+
+    loader = threading.Thread(target=manager.ensure_loaded, args=("b",))
+    loader.start()
+    assert client.releasing.wait(5)
+    # 换出 a 的线程还在等待释放完成，已加载的 c 不受影响
+    start = time.monotonic()
+    manager.ensure_loaded("c")
+    assert time.monotonic() - start < 1
+    client.unblock.set()
+    loader.join(5)
+    assert client.get_load_state("a")["state"].name == "NotLoad"
+    assert client.get_load_state("b")["state"].name == "Loaded"
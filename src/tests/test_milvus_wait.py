@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+"""milvus_wait.wait_for_flush: 期望行数为 0 的空集合立即返回"""
+
+from fake_milvus import FakeMilvusClient
+from milvus_wait import wait_for_flush
+
+
+def test_wait_for_flush_empty_collection():
+    client = FakeMilvusClient()
+    client.add_collection("faces", [], dim=8)
+    assert wait_for_flush(client, "faces", expected_rows=0, timeout=1) == 0
+
+
+def test_wait_for_flush_returns_row_count():
+    client = FakeMilvusClient()
+    client.add_collection("faces", [{"id": i, "embedding": [0.0] * 8} for i in range(5)], dim=8)
+    assert wait_for_flush(client, "faces", expected_rows=3, timeout=1) == 5